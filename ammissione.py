@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Controllo di ammissione delle richieste di miglioramento.
+
+Un numero fisso di posti limita i miglioramenti eseguiti in parallelo; le
+altre richieste attendono in una coda limitata, ordinata per classe di
+priorità (le interattive prima delle batch) e, all'interno di ogni classe,
+a turno tra gli utenti, così chi invia molte richieste non blocca gli altri.
+Una richiesta che non potrebbe completarsi entro la propria scadenza viene
+rifiutata subito con `ServizioOccupato`, invece di occupare la coda fino
+al timeout.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from metriche import REGISTRO, cronometro
+
+# Classi di priorità, dalla più urgente
+CLASSI_PRIORITA = ("interattiva", "batch")
+
+RICHIESTE_RIFIUTATE = REGISTRO.contatore(
+    "prompt_perfezionatore_richieste_rifiutate_totale",
+    "Richieste rifiutate dal controllo di ammissione per classe e motivo",
+    ("classe", "motivo")
+)
+
+
+class ServizioOccupato(Exception):
+    """La richiesta è stata rifiutata perché il servizio è sovraccarico."""
+
+    def __init__(self, motivo: str, attesa_stimata: Optional[float] = None):
+        self.motivo = motivo
+        self.attesa_stimata = attesa_stimata
+        super().__init__(motivo if attesa_stimata is None else f"{motivo} (attesa stimata {attesa_stimata:.1f} s)")
+
+
+class _Attesa:
+    """Una richiesta in coda, svegliata da un thread o da un event loop."""
+
+    def __init__(self, utente: str, classe: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.utente = utente
+        self.classe = classe
+        self.ammessa = False
+        self.loop = loop
+        self.evento = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def ammetti(self) -> bool:
+        """Assegna il posto alla richiesta; False se il suo event loop non esiste più."""
+        if self.loop is None:
+            self.ammessa = True
+            self.evento.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(_completa_se_in_attesa, self.future)
+        except RuntimeError:
+            return False
+        self.ammessa = True
+        return True
+
+
+def _completa_se_in_attesa(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class PianificatoreRichieste:
+    """
+    Coda a priorità con posti limitati, utilizzabile da thread e coroutine.
+
+    Uso:
+        with pianificatore.turno(utente, "batch"):
+            perfezionatore.migliora_e_analizza(prompt)
+
+        async with pianificatore.turno_async(utente):
+            await perfezionatore.migliora_e_analizza_async(prompt)
+    """
+
+    def __init__(self, posti: int, capacita_coda: int, scadenze: Dict[str, float], peso_media: float = 0.2):
+        """
+        Args:
+            posti (int): Richieste eseguite in parallelo.
+            capacita_coda (int): Richieste in attesa oltre le quali le nuove vengono rifiutate.
+            scadenze (dict): Per ogni classe di `CLASSI_PRIORITA`, i secondi entro cui
+                una richiesta deve completarsi, attesa in coda compresa.
+            peso_media (float): Peso delle nuove durate nella media mobile del tempo di servizio.
+        """
+        self.posti = max(1, posti)
+        self.capacita_coda = capacita_coda
+        self.scadenze = dict(scadenze)
+        self.peso_media = peso_media
+        self.tempo_medio: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._in_corso = 0
+        self._in_coda = 0
+        # Per classe: utente -> richieste in attesa; l'ordine delle chiavi è il turno
+        self._code: Dict[str, "OrderedDict[str, Deque[_Attesa]]"] = {
+            classe: OrderedDict() for classe in CLASSI_PRIORITA
+        }
+
+    def _stima_attesa(self, classe: str) -> Optional[float]:
+        """Attesa prevista per una nuova richiesta della classe, se c'è già una stima del tempo di servizio."""
+        if self.tempo_medio is None:
+            return None
+        priorita = CLASSI_PRIORITA.index(classe)
+        davanti = sum(
+            len(richieste)
+            for altra in CLASSI_PRIORITA[:priorita + 1]
+            for richieste in self._code[altra].values()
+        )
+        # In media il posto più vicino a liberarsi è a metà del proprio servizio
+        return (davanti / self.posti + 0.5) * self.tempo_medio
+
+    def _entra(self, utente: str, classe: str, scadenza: Optional[float],
+               loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Attesa]:
+        """
+        Ammette subito la richiesta o la mette in coda.
+
+        Returns:
+            _Attesa | None: None se la richiesta ha già un posto, altrimenti l'attesa da completare.
+
+        Raises:
+            ServizioOccupato: Se la coda è piena o la scadenza non può essere rispettata.
+        """
+        if classe not in CLASSI_PRIORITA:
+            raise ValueError(f"Classe di priorità non valida: {classe}. Valori ammessi: {', '.join(CLASSI_PRIORITA)}")
+        with self._lock:
+            # Con un posto libero la coda è vuota: i posti liberati passano subito a chi attende
+            if self._in_corso < self.posti:
+                self._in_corso += 1
+                return None
+            if self._in_coda >= self.capacita_coda:
+                RICHIESTE_RIFIUTATE.incrementa(classe=classe, motivo="coda_piena")
+                raise ServizioOccupato("coda piena", self._stima_attesa(classe))
+            stima = self._stima_attesa(classe)
+            if stima is not None and scadenza is not None and stima + self.tempo_medio > scadenza:
+                RICHIESTE_RIFIUTATE.incrementa(classe=classe, motivo="scadenza")
+                raise ServizioOccupato("scadenza non rispettabile", stima)
+
+            attesa = _Attesa(utente, classe, loop)
+            self._code[classe].setdefault(utente, deque()).append(attesa)
+            self._in_coda += 1
+            return attesa
+
+    def _rimuovi(self, attesa: _Attesa) -> bool:
+        """Toglie dalla coda una richiesta non ancora ammessa. Va chiamata con il lock."""
+        if attesa.ammessa:
+            return False
+        richieste = self._code[attesa.classe].get(attesa.utente)
+        if richieste is not None and attesa in richieste:
+            richieste.remove(attesa)
+            if not richieste:
+                del self._code[attesa.classe][attesa.utente]
+            self._in_coda -= 1
+        return True
+
+    def _esci(self, durata: Optional[float]) -> None:
+        """Libera un posto e lo passa alla prossima richiesta in coda."""
+        with self._lock:
+            if durata is not None:
+                if self.tempo_medio is None:
+                    self.tempo_medio = durata
+                else:
+                    self.tempo_medio += self.peso_media * (durata - self.tempo_medio)
+
+            for classe in CLASSI_PRIORITA:
+                code = self._code[classe]
+                while code:
+                    # Turno tra gli utenti: il primo utente passa in fondo se ha altre richieste
+                    utente, richieste = next(iter(code.items()))
+                    attesa = richieste.popleft()
+                    if richieste:
+                        code.move_to_end(utente)
+                    else:
+                        del code[utente]
+                    self._in_coda -= 1
+                    if attesa.ammetti():
+                        return
+            self._in_corso -= 1
+
+    def _attesa_massima(self, scadenza: Optional[float]) -> Optional[float]:
+        """Tempo massimo in coda: oltre, la richiesta non finirebbe comunque in tempo."""
+        if scadenza is None:
+            return None
+        return max(0.0, scadenza - (self.tempo_medio or 0.0))
+
+    def _scadenza(self, classe: str, scadenza: Optional[float]) -> Optional[float]:
+        return self.scadenze.get(classe) if scadenza is None else scadenza
+
+    @contextmanager
+    def turno(self, utente: str, classe: str = "interattiva", scadenza: Optional[float] = None) -> Iterator[None]:
+        """
+        Attende, bloccando il thread, un posto per eseguire la richiesta.
+
+        Args:
+            utente (str): L'identificativo dell'utente, per il turno tra utenti.
+            classe (str): La classe di priorità. Default: "interattiva".
+            scadenza (float, optional): Secondi entro cui la richiesta deve completarsi.
+                Default: quella configurata per la classe.
+
+        Raises:
+            ServizioOccupato: Se la richiesta non può essere servita in tempo.
+        """
+        scadenza = self._scadenza(classe, scadenza)
+        with cronometro("coda"):
+            attesa = self._entra(utente, classe, scadenza)
+            if attesa is not None and not attesa.evento.wait(self._attesa_massima(scadenza)):
+                with self._lock:
+                    scaduta = self._rimuovi(attesa)
+                if scaduta:
+                    RICHIESTE_RIFIUTATE.incrementa(classe=classe, motivo="attesa_scaduta")
+                    raise ServizioOccupato("attesa in coda scaduta")
+        inizio = time.monotonic()
+        try:
+            yield
+        finally:
+            self._esci(time.monotonic() - inizio)
+
+    @asynccontextmanager
+    async def turno_async(self, utente: str, classe: str = "interattiva",
+                          scadenza: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Versione asincrona di `turno`: l'attesa in coda non blocca l'event loop.
+
+        Args:
+            utente (str): L'identificativo dell'utente, per il turno tra utenti.
+            classe (str): La classe di priorità. Default: "interattiva".
+            scadenza (float, optional): Secondi entro cui la richiesta deve completarsi.
+
+        Raises:
+            ServizioOccupato: Se la richiesta non può essere servita in tempo.
+        """
+        scadenza = self._scadenza(classe, scadenza)
+        with cronometro("coda"):
+            attesa = self._entra(utente, classe, scadenza, asyncio.get_running_loop())
+            if attesa is not None:
+                try:
+                    await asyncio.wait({attesa.future}, timeout=self._attesa_massima(scadenza))
+                except BaseException:
+                    with self._lock:
+                        in_coda = self._rimuovi(attesa)
+                    if not in_coda:
+                        # Annullata dopo aver ricevuto il posto: va restituito
+                        self._esci(None)
+                    raise
+                with self._lock:
+                    in_coda = self._rimuovi(attesa)
+                if in_coda:
+                    RICHIESTE_RIFIUTATE.incrementa(classe=classe, motivo="attesa_scaduta")
+                    raise ServizioOccupato("attesa in coda scaduta")
+        inizio = time.monotonic()
+        try:
+            yield
+        finally:
+            self._esci(time.monotonic() - inizio)
+
+    def statistiche(self) -> Dict[str, Any]:
+        """Restituisce posti occupati, richieste in coda per classe e tempo medio di servizio."""
+        with self._lock:
+            return {
+                "in_corso": self._in_corso,
+                "in_coda": {classe: sum(map(len, code.values())) for classe, code in self._code.items()},
+                "tempo_medio_servizio": None if self.tempo_medio is None else round(self.tempo_medio, 3)
+            }
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parsing spaCy incrementale per i prompt modificati più volte.
+
+Il testo viene diviso in blocchi (paragrafi; righe e frasi per i paragrafi
+molto lunghi) e il documento spaCy di ogni blocco viene memorizzato in base
+al digest del suo contenuto. A ogni nuova versione del prompt vengono
+analizzati solo i blocchi cambiati; il documento completo viene ricomposto
+con `Doc.from_docs` e gli analizzatori calcolano punteggi e aggregati
+(Gulpease, complessità, ripetizioni, frasi lunghe) sul documento ricomposto.
+"""
+
+import hashlib
+import re
+import threading
+from typing import Dict, Iterable, List
+
+from cachetools import LRUCache
+
+# I tagli cadono all'inizio di una sequenza di spazi preceduta da testo:
+# il blocco successivo inizia con gli spazi, come nel parsing del testo intero
+_RE_PARAGRAFO = re.compile(r"(?<=\S)[ \t]*\n[ \t]*\n\s*")
+_RE_RIGA = re.compile(r"(?<=\S)[ \t]*\n")
+# Tra le frasi il taglio cade invece dopo gli spazi
+_RE_FINE_FRASE = re.compile(r"(?<=[.!?])\s+(?=\S)")
+
+
+def _dividi(testo: str, regex: re.Pattern, dopo_gli_spazi: bool = False) -> List[str]:
+    """Divide il testo nei punti trovati da `regex`, senza perdere caratteri."""
+    tagli = [0]
+    for match in regex.finditer(testo):
+        if dopo_gli_spazi:
+            taglio = match.end()
+        else:
+            taglio = match.start()
+            # spaCy attacca un singolo spazio al token precedente
+            if testo.startswith(" ", taglio):
+                taglio += 1
+        if tagli[-1] < taglio < len(testo):
+            tagli.append(taglio)
+    tagli.append(len(testo))
+    return [testo[inizio:fine] for inizio, fine in zip(tagli, tagli[1:]) if fine > inizio]
+
+
+def dividi_in_blocchi(testo: str, dimensione_massima: int) -> List[str]:
+    """
+    Divide il testo in blocchi la cui concatenazione restituisce il testo originale.
+
+    Args:
+        testo (str): Il testo da dividere.
+        dimensione_massima (int): Oltre questa lunghezza un paragrafo viene diviso
+            in righe e, se serve, in frasi.
+
+    Returns:
+        list: I blocchi, nell'ordine del testo.
+    """
+    blocchi = []
+    for paragrafo in _dividi(testo, _RE_PARAGRAFO):
+        if len(paragrafo) <= dimensione_massima:
+            blocchi.append(paragrafo)
+            continue
+        for riga in _dividi(paragrafo, _RE_RIGA):
+            if len(riga) <= dimensione_massima:
+                blocchi.append(riga)
+            else:
+                blocchi.extend(_dividi(riga, _RE_FINE_FRASE, dopo_gli_spazi=True))
+    return blocchi
+
+
+class AnalizzatoreIncrementale:
+    """
+    Cache dei documenti spaCy per blocco di testo, condivisa tra thread.
+
+    La tokenizzazione del documento ricomposto coincide con quella del
+    testo intero; i confini di frase possono differire solo dove un
+    paragrafo non termina con la punteggiatura, che qui chiude comunque
+    la frase.
+    """
+
+    def __init__(self, max_blocchi: int, dimensione_massima_blocco: int = 1000):
+        """
+        Inizializza la cache.
+
+        Args:
+            max_blocchi (int): Numero massimo di blocchi memorizzati.
+            dimensione_massima_blocco (int): Lunghezza oltre la quale un paragrafo viene diviso.
+        """
+        self.dimensione_massima_blocco = dimensione_massima_blocco
+        self._cache = LRUCache(maxsize=max_blocchi)
+        self._lock = threading.Lock()
+        self.blocchi_riutilizzati = 0
+        self.blocchi_analizzati = 0
+
+    def documento(self, testo: str, modello, disabilitati: Iterable[str] = ()) -> "Doc":
+        """
+        Restituisce il documento spaCy del testo, analizzando solo i blocchi nuovi.
+
+        Args:
+            testo (str): Il testo da analizzare.
+            modello (spacy.Language): Il modello spaCy.
+            disabilitati (iterable): I componenti da saltare, come in `nlp(testo, disable=...)`.
+
+        Returns:
+            spacy.Doc: Il documento del testo completo.
+        """
+        disabilitati = tuple(disabilitati)
+        blocchi = dividi_in_blocchi(testo, self.dimensione_massima_blocco)
+        # Modello e componenti attivi fanno parte della chiave: cambiano il risultato del parsing
+        prefisso = (id(modello), disabilitati)
+        chiavi = [
+            prefisso + (hashlib.blake2b(blocco.encode("utf-8"), digest_size=16).digest(),)
+            for blocco in blocchi
+        ]
+
+        with self._lock:
+            documenti = [self._cache.get(chiave) for chiave in chiavi]
+        mancanti = [indice for indice, documento in enumerate(documenti) if documento is None]
+
+        if mancanti:
+            # I blocchi nuovi vengono analizzati insieme, in un'unica chiamata a nlp.pipe
+            nuovi = modello.pipe((blocchi[indice] for indice in mancanti), disable=list(disabilitati))
+            for indice, documento in zip(mancanti, nuovi):
+                documenti[indice] = documento
+            with self._lock:
+                for indice in mancanti:
+                    self._cache[chiavi[indice]] = documenti[indice]
+
+        with self._lock:
+            self.blocchi_analizzati += len(mancanti)
+            self.blocchi_riutilizzati += len(blocchi) - len(mancanti)
+
+        if len(documenti) == 1:
+            return documenti[0]
+        # Import locale: il modulo non deve caricare spaCy all'import
+        from spacy.tokens import Doc
+        return Doc.from_docs(documenti, ensure_whitespace=False)
+
+    def statistiche(self) -> Dict[str, int]:
+        """Restituisce i blocchi analizzati, quelli riutilizzati e quelli in cache."""
+        with self._lock:
+            return {
+                "blocchi_analizzati": self.blocchi_analizzati,
+                "blocchi_riutilizzati": self.blocchi_riutilizzati,
+                "blocchi_in_cache": len(self._cache)
+            }
@@ -1,30 +1,133 @@
+import asyncio
 import gradio as gr
 import json
-from prompt_perfezionatore import PromptPerfezionatore
+import time
+from ammissione import PianificatoreRichieste, ServizioOccupato
+from concorrenza import DebounceAsync, RichiestaSuperata
+from metriche import avvia_server_metriche
+from prompt_perfezionatore import PromptPerfezionatore, RisultatoErrore, settings, setup_logging, warmup
 
 # Inizializza il perfezionatore
 perfezionatore = PromptPerfezionatore()
 
-def migliora_e_analizza(prompt_utente):
-    """Funzione wrapper per l'integrazione con Gradio."""
-    risultati = perfezionatore.migliora_prompt(prompt_utente)
-    analisi = perfezionatore.analizza_prompt(prompt_utente)
-    return risultati[0], risultati[1], risultati[2], json.dumps(analisi, indent=4, ensure_ascii=False)
+# Analisi durante la digitazione: per ogni sessione conta solo l'ultima battuta
+debounce_analisi_live = DebounceAsync(settings.live_analysis_debounce)
 
-# Creazione dell'interfaccia Gradio
-app = gr.Interface(
-    fn=migliora_e_analizza,
-    inputs=gr.Textbox(lines=5, placeholder="Inserisci il prompt da migliorare..."),
-    outputs=[
-        gr.Textbox(lines=5, label="Prompt Migliorato"),
-        gr.Textbox(lines=5, label="Suggerimenti"),
-        gr.Textbox(lines=5, label="Spiegazione Modifiche"),
-        gr.Textbox(lines=10, label="Analisi Prompt")
-    ],
-    title="Prompt Perfezionatore",
-    description="Inserisci un prompt e ottieni una versione migliorata, suggerimenti e analisi dettagliata."
+# Controllo di ammissione: sotto sovraccarico le richieste che non finirebbero in tempo
+# ricevono subito una risposta "occupato" invece di attendere fino al timeout
+pianificatore = PianificatoreRichieste(
+    settings.admission_slots,
+    settings.admission_queue_size,
+    {"interattiva": settings.admission_deadline_interactive, "batch": settings.admission_deadline_batch}
 )
 
+def _formatta_risultato(risultato):
+    """Converte un risultato del perfezionatore negli output dell'interfaccia."""
+    prompt_migliorato, suggerimenti, spiegazione, analisi = risultato
+    return prompt_migliorato, list(suggerimenti), spiegazione, json.dumps(analisi, indent=4, ensure_ascii=False)
+
+def _utente(request: gr.Request) -> str:
+    """Identifica l'utente per il turno nella coda: il nome se autenticato, altrimenti la sessione."""
+    return request.username or request.session_hash
+
+def _risultato_occupato(errore: ServizioOccupato) -> RisultatoErrore:
+    """Risposta immediata per le richieste rifiutate dal controllo di ammissione."""
+    attesa = f" Attesa stimata: {errore.attesa_stimata:.1f} secondi." if errore.attesa_stimata else ""
+    return RisultatoErrore(
+        "Il servizio è al momento occupato: riprova tra qualche istante.",
+        ("Riprova tra qualche istante",),
+        f"Richiesta non accettata: {errore.motivo}.{attesa}",
+        {}
+    )
+
+async def migliora_e_analizza(prompt_utente, request: gr.Request):
+    """Funzione wrapper asincrona per l'integrazione con Gradio."""
+    # I risultati in cache non occupano posti e non vengono mai rifiutati
+    risultato = perfezionatore.cerca_in_cache(prompt_utente)
+    if risultato is None:
+        try:
+            async with pianificatore.turno_async(_utente(request)):
+                risultato = await perfezionatore.migliora_e_analizza_async(prompt_utente)
+        except ServizioOccupato as e:
+            risultato = _risultato_occupato(e)
+    return _formatta_risultato(risultato)
+
+async def migliora_e_analizza_stream(prompt_utente, request: gr.Request):
+    """Funzione wrapper in streaming: aggiorna il prompt migliorato man mano che arriva."""
+    risultato = perfezionatore.cerca_in_cache(prompt_utente)
+    if risultato is not None:
+        yield _formatta_risultato(risultato)
+        return
+    try:
+        async with pianificatore.turno_async(_utente(request)):
+            async for risultato in perfezionatore.migliora_e_analizza_stream_async(prompt_utente):
+                yield _formatta_risultato(risultato)
+    except ServizioOccupato as e:
+        yield _formatta_risultato(_risultato_occupato(e))
+
+async def _metriche_entro_budget(prompt_utente):
+    """Metriche rapide del prompt, entro il budget di latenza dell'analisi live."""
+    return await asyncio.wait_for(
+        perfezionatore.analizza_metriche_async(prompt_utente), settings.live_analysis_budget
+    )
+
+async def analisi_live(prompt_utente, request: gr.Request):
+    """
+    Metriche rapide mentre l'utente scrive, senza chiamare DeepSeek.
+
+    Le analisi superate da una battuta più recente vengono scartate, e non
+    partono se sono ancora in coda; quelle che superano il budget di latenza
+    lasciano invariate le metriche mostrate. Un'analisi spaCy già avviata non
+    si interrompe, ma gira in un thread riservato all'analisi live.
+    """
+    try:
+        return await debounce_analisi_live.esegui(request.session_hash, _metriche_entro_budget, prompt_utente)
+    except (RichiestaSuperata, asyncio.TimeoutError):
+        return gr.update()
+
+# Creazione dell'interfaccia Gradio
+with gr.Blocks(title="Prompt Perfezionatore") as app:
+    gr.Markdown(
+        "# Prompt Perfezionatore\n"
+        "Inserisci un prompt e ottieni una versione migliorata, suggerimenti e analisi dettagliata."
+    )
+    with gr.Row():
+        with gr.Column():
+            prompt_utente = gr.Textbox(lines=5, label="Prompt", placeholder="Inserisci il prompt da migliorare...")
+            pulsante_migliora = gr.Button("Migliora", variant="primary")
+        metriche_live = gr.JSON(label="Analisi in tempo reale")
+    prompt_migliorato = gr.Textbox(lines=5, label="Prompt Migliorato")
+    suggerimenti = gr.Textbox(lines=5, label="Suggerimenti")
+    spiegazione = gr.Textbox(lines=5, label="Spiegazione Modifiche")
+    analisi_prompt = gr.Textbox(lines=10, label="Analisi Prompt")
+
+    # Fuori dalla coda: le attese del debounce non occupano i posti delle richieste a DeepSeek
+    prompt_utente.change(
+        analisi_live, inputs=prompt_utente, outputs=metriche_live, queue=False, show_progress="hidden"
+    )
+    pulsante_migliora.click(
+        migliora_e_analizza_stream if settings.deepseek_streaming else migliora_e_analizza,
+        inputs=prompt_utente,
+        outputs=[prompt_migliorato, suggerimenti, spiegazione, analisi_prompt]
+    )
+
 # Questo codice viene eseguito solo quando si esegue lo script direttamente (non quando importato)
 if __name__ == "__main__":
-    app.launch()
\ No newline at end of file
+    setup_logging()
+    # Modello e dizionario vengono caricati prima di accettare richieste
+    warmup()
+    if settings.metrics_port:
+        # Endpoint /metrics in formato Prometheus, raggiungibile solo in locale
+        avvia_server_metriche(settings.metrics_port)
+    # La coda è necessaria per inviare all'interfaccia i risultati parziali in streaming;
+    # il perfezionatore non ha stato per richiesta, quindi più richieste possono procedere in parallelo
+    app.queue(concurrency_count=settings.gradio_concurrency).launch(prevent_thread_lock=True)
+    try:
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Il client HTTP asincrono si chiude nell'event loop del server, quindi prima di fermarlo
+        perfezionatore.chiudi()
+        app.close()
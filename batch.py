@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Elaborazione batch dei prompt da riga di comando.
+
+Legge i prompt da un file JSONL, uno per riga, e scrive i risultati in un
+altro file JSONL nello stesso ordine. L'analisi locale gira in un pool di
+processi, le chiamate a DeepSeek in un numero limitato di thread, e ogni
+prompt passa dalla cache dei risultati. Con `--solo-analisi` i prompt
+vengono solo analizzati, in blocco con `nlp.pipe`. Il file di output fa anche da
+checkpoint: rilanciando il comando si riprende dai prompt non ancora elaborati.
+I prompt non riusciti sono scritti con `"errore": true` e ripetuti alla
+ripresa, in coda al file: per ogni id vale l'ultimo record.
+
+Uso:
+    python batch.py migliora prompt.jsonl risultati.jsonl --processi 8 --concorrenza 16
+    python batch.py migliora requests.jsonl risultati.jsonl --campo-testo body --campo-id request_id
+    python batch.py migliora libreria.jsonl punteggi.jsonl --solo-analisi --processi 16
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, Set, TextIO, Tuple
+
+import typer
+
+from prompt_perfezionatore import PromptPerfezionatore, RisultatoErrore, setup_logging
+
+app = typer.Typer(help="Elaborazione batch dei prompt da file JSONL.")
+logger = logging.getLogger(__name__)
+
+# Perfezionatore dei processi di analisi, creato dall'initializer del pool
+_perfezionatore_worker = None
+
+
+def _inizializza_worker() -> None:
+    global _perfezionatore_worker
+    _perfezionatore_worker = PromptPerfezionatore()
+
+
+def _analizza_in_worker(testo: str) -> Dict[str, Any]:
+    return _perfezionatore_worker.analizza_prompt(testo)
+
+
+def leggi_prompt(percorso: Path, campo_testo: str, campo_id: str) -> Iterator[Tuple[str, str]]:
+    """
+    Legge i prompt dal file JSONL senza caricarlo interamente in memoria.
+
+    Args:
+        percorso (Path): Il file di input.
+        campo_testo (str): Il campo che contiene il prompt.
+        campo_id (str): Il campo che identifica il prompt; se manca si usa il numero di riga.
+
+    Yields:
+        tuple: (id, prompt)
+    """
+    with open(percorso, encoding="utf-8") as file:
+        for numero, riga in enumerate(file, 1):
+            riga = riga.strip()
+            if not riga:
+                continue
+            try:
+                record = json.loads(riga)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Riga {numero} ignorata: JSON non valido ({str(e)})")
+                continue
+            testo = record.get(campo_testo)
+            if not isinstance(testo, str):
+                logger.warning(f"Riga {numero} ignorata: campo '{campo_testo}' assente o non testuale")
+                continue
+            yield str(record.get(campo_id, numero)), testo
+
+
+def carica_checkpoint(percorso: Path) -> Set[str]:
+    """
+    Restituisce gli id già elaborati con successo nel file di output.
+
+    Un'eventuale ultima riga incompleta, lasciata da un'interruzione, viene
+    rimossa. I record con `"errore": true` non contano, salvo che lo stesso
+    id compaia più avanti senza errore: alla ripresa quei prompt vengono ripetuti.
+
+    Args:
+        percorso (Path): Il file di output.
+
+    Returns:
+        set: Gli id dei prompt già elaborati.
+    """
+    if not percorso.exists():
+        return set()
+
+    with open(percorso, "rb+") as file:
+        file.seek(0, os.SEEK_END)
+        dimensione = file.tell()
+        if dimensione:
+            file.seek(dimensione - 1)
+            if file.read(1) != b"\n":
+                # Tronca fino all'ultimo a capo completo
+                posizione = dimensione - 1
+                while posizione > 0:
+                    file.seek(posizione - 1)
+                    if file.read(1) == b"\n":
+                        break
+                    posizione -= 1
+                file.truncate(posizione)
+                logger.warning("Rimossa l'ultima riga incompleta del file di output")
+
+    completati = set()
+    with open(percorso, encoding="utf-8") as file:
+        for riga in file:
+            try:
+                record = json.loads(riga)
+                id_prompt = str(record["id"])
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+            if record.get("errore"):
+                completati.discard(id_prompt)
+            else:
+                completati.add(id_prompt)
+    return completati
+
+
+def scrivi_record(output: TextIO, record: Dict[str, Any]) -> None:
+    """Scrive un record come riga JSONL e la rende subito persistente per il checkpoint."""
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output.flush()
+
+
+def analizza_in_blocco(prompt: Iterator[Tuple[str, str]], output: TextIO,
+                       processi: int, batch_size: int) -> int:
+    """
+    Analizza i prompt senza chiamare DeepSeek, usando `analizza_prompts`.
+
+    Args:
+        prompt (iterator): Le coppie (id, prompt) da analizzare.
+        output: Il file di output, aperto in scrittura testuale.
+        processi (int): Processi per il parsing spaCy.
+        batch_size (int): Testi per batch di `nlp.pipe`.
+
+    Returns:
+        int: Il numero di prompt analizzati.
+    """
+    perfezionatore = PromptPerfezionatore()
+    # Gli id letti ma non ancora analizzati: le analisi arrivano nello stesso ordine
+    id_in_attesa = deque()
+
+    def testi():
+        for id_prompt, testo in prompt:
+            id_in_attesa.append(id_prompt)
+            yield testo
+
+    elaborati = 0
+    try:
+        for analisi in perfezionatore.analizza_prompts(testi(), batch_size=batch_size, n_process=processi):
+            scrivi_record(output, {"id": id_in_attesa.popleft(), "analisi": analisi})
+            elaborati += 1
+            if elaborati % 1000 == 0:
+                logger.info(f"Prompt analizzati: {elaborati}")
+    finally:
+        perfezionatore.chiudi()
+    return elaborati
+
+
+class ElaboratoreBatch:
+    """
+    Elabora i prompt combinando un pool di processi per l'analisi e un pool
+    di thread, di dimensione limitata, per le chiamate a DeepSeek.
+    """
+
+    def __init__(self, processi: int, concorrenza: int):
+        """
+        Inizializza i pool.
+
+        Args:
+            processi (int): Processi dedicati all'analisi locale.
+            concorrenza (int): Numero massimo di prompt in elaborazione, e quindi di chiamate API, contemporanee.
+        """
+        self.concorrenza = concorrenza
+        self.perfezionatore = PromptPerfezionatore()
+        # "spawn" evita di duplicare con fork i lock dei thread già attivi
+        self.pool_analisi = ProcessPoolExecutor(
+            max_workers=processi,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inizializza_worker
+        )
+        self.pool_richieste = ThreadPoolExecutor(max_workers=concorrenza, thread_name_prefix="batch")
+
+    def elabora(self, id_prompt: str, testo: str) -> Dict[str, Any]:
+        """
+        Elabora un singolo prompt: cache, analisi nel pool di processi, poi DeepSeek.
+
+        Args:
+            id_prompt (str): L'identificativo del prompt.
+            testo (str): Il prompt.
+
+        Returns:
+            dict: Il record da scrivere nel file di output, con `"errore": true`
+            se il miglioramento non è riuscito.
+        """
+        risultato = self.perfezionatore.cerca_in_cache(testo)
+        if risultato is None:
+            analisi = self.pool_analisi.submit(_analizza_in_worker, testo).result()
+            risultato = self.perfezionatore.migliora_e_analizza(testo, analisi=analisi)
+        return {"id": id_prompt, **risultato._asdict(), "errore": isinstance(risultato, RisultatoErrore)}
+
+    def esegui(self, prompt: Iterator[Tuple[str, str]], output: TextIO) -> int:
+        """
+        Elabora tutti i prompt e scrive i risultati nell'ordine di input.
+
+        Al massimo `4 * concorrenza` prompt sono in memoria contemporaneamente,
+        così l'uso di memoria resta costante anche con file molto grandi.
+
+        Args:
+            prompt (iterator): Le coppie (id, prompt) da elaborare.
+            output: Il file di output, aperto in scrittura testuale.
+
+        Returns:
+            int: Il numero di prompt elaborati.
+        """
+        in_corso = deque()
+        elaborati = 0
+
+        def scrivi_primo():
+            scrivi_record(output, in_corso.popleft().result())
+
+        for id_prompt, testo in prompt:
+            in_corso.append(self.pool_richieste.submit(self.elabora, id_prompt, testo))
+            if len(in_corso) >= 4 * self.concorrenza:
+                scrivi_primo()
+                elaborati += 1
+                if elaborati % 100 == 0:
+                    logger.info(f"Prompt elaborati: {elaborati}")
+
+        while in_corso:
+            scrivi_primo()
+            elaborati += 1
+        return elaborati
+
+    def chiudi(self) -> None:
+        """Termina i pool e rilascia le connessioni."""
+        self.pool_richieste.shutdown()
+        self.pool_analisi.shutdown()
+        self.perfezionatore.chiudi()
+
+
+@app.callback()
+def principale() -> None:
+    """Elaborazione batch dei prompt da file JSONL."""
+    setup_logging()
+
+
+@app.command()
+def migliora(
+    input: Path = typer.Argument(..., exists=True, dir_okay=False, help="File JSONL con i prompt"),
+    output: Path = typer.Argument(..., dir_okay=False, help="File JSONL dei risultati, usato anche come checkpoint"),
+    campo_testo: str = typer.Option("prompt", help="Campo del record che contiene il prompt"),
+    campo_id: str = typer.Option("id", help="Campo del record che identifica il prompt"),
+    processi: int = typer.Option(os.cpu_count() or 1, min=1, help="Processi per l'analisi locale"),
+    concorrenza: int = typer.Option(8, min=1, help="Chiamate DeepSeek contemporanee"),
+    batch_size: int = typer.Option(64, min=1, help="Testi per batch di nlp.pipe, con --solo-analisi"),
+    riprendi: bool = typer.Option(True, help="Salta i prompt già presenti nel file di output"),
+    solo_analisi: bool = typer.Option(False, help="Calcola solo l'analisi locale, senza chiamare DeepSeek"),
+) -> None:
+    """Migliora e analizza i prompt di un file JSONL."""
+    completati = carica_checkpoint(output) if riprendi else set()
+    if completati:
+        typer.echo(f"Ripresa dal checkpoint: {len(completati)} prompt già elaborati")
+
+    da_elaborare = (
+        (id_prompt, testo)
+        for id_prompt, testo in leggi_prompt(input, campo_testo, campo_id)
+        if id_prompt not in completati
+    )
+
+    with open(output, "a" if riprendi else "w", encoding="utf-8") as file:
+        if solo_analisi:
+            elaborati = analizza_in_blocco(da_elaborare, file, processi, batch_size)
+            typer.echo(f"Prompt analizzati: {elaborati}")
+            return
+
+        elaboratore = ElaboratoreBatch(processi, concorrenza)
+        try:
+            elaborati = elaboratore.esegui(da_elaborare, file)
+        finally:
+            elaboratore.chiudi()
+
+    typer.echo(f"Prompt elaborati: {elaborati}")
+    typer.echo(f"Statistiche cache: {elaboratore.perfezionatore.statistiche_cache()}")
+
+
+if __name__ == "__main__":
+    app()
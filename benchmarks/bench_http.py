@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del client HTTP verso DeepSeek.
+
+Misura la latenza per chiamata contro uno stub locale, confrontando
+`requests.post` (nuova connessione a ogni richiesta, come in precedenza)
+con la sessione persistente di `PromptPerfezionatore`.
+
+Uso:
+    python benchmarks/bench_http.py --chiamate 500
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from benchmarks.stub_deepseek import StubDeepSeek
+from prompt_perfezionatore import PromptPerfezionatore, settings
+
+SYSTEM_PROMPT = "Sei un esperto di prompt engineering."
+MESSAGGIO = "Prompt originale: scrivi una email al cliente."
+
+
+def chiamata_senza_pool(perfezionatore):
+    """Riproduce la chiamata precedente: header ricostruiti e nuova connessione ogni volta."""
+    headers = {
+        "Authorization": f"Bearer {settings.deepseek_api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": settings.deepseek_model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": MESSAGGIO}
+        ],
+        "temperature": settings.deepseek_temperature,
+        "max_tokens": settings.deepseek_max_tokens
+    }
+    response = requests.post(settings.deepseek_api_url, headers=headers, json=data, timeout=settings.api_timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def chiamata_con_pool(perfezionatore):
+    return perfezionatore._chiama_api_deepseek(SYSTEM_PROMPT, MESSAGGIO)
+
+
+def misura(funzione, perfezionatore, chiamate):
+    latenze = []
+    for _ in range(chiamate):
+        inizio = time.perf_counter()
+        funzione(perfezionatore)
+        latenze.append((time.perf_counter() - inizio) * 1000)
+    return latenze
+
+
+def riepilogo(nome, latenze):
+    latenze = sorted(latenze)
+    p95 = latenze[int(len(latenze) * 0.95) - 1]
+    print(f"{nome:<12} media {statistics.mean(latenze):7.3f} ms   "
+          f"p50 {statistics.median(latenze):7.3f} ms   p95 {p95:7.3f} ms")
+    return statistics.median(latenze)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chiamate", type=int, default=500, help="Numero di chiamate per variante")
+    args = parser.parse_args()
+
+    # I log per chiamata coprirebbero la differenza da misurare
+    logging.disable(logging.INFO)
+
+    with StubDeepSeek() as stub:
+        settings.deepseek_api_url = stub.url
+        settings.deepseek_api_key = settings.deepseek_api_key or "chiave-di-test"
+        perfezionatore = PromptPerfezionatore()
+
+        print(f"Stub: {stub.url}, {args.chiamate} chiamate per variante")
+        prima = riepilogo("senza pool", misura(chiamata_senza_pool, perfezionatore, args.chiamate))
+        dopo = riepilogo("con pool", misura(chiamata_con_pool, perfezionatore, args.chiamate))
+        print(f"Risparmio p50 per chiamata: {prima - dopo:.3f} ms")
+        perfezionatore.chiudi()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark dell'avvio del modulo `prompt_perfezionatore`.
+
+Ogni ripetizione gira in un interprete nuovo e misura tempo e memoria
+residente massima dopo l'import, dopo la creazione del perfezionatore e
+dopo la prima analisi (che carica spaCy e il dizionario). Con `--warmup`
+misura invece `warmup()` prima della prima analisi.
+
+Uso:
+    python benchmarks/bench_import.py --ripetizioni 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Eseguito in un processo separato: stampa una riga JSON con le misure
+MISURA = """
+import json, resource, sys, time
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+misure = {}
+inizio = time.perf_counter()
+import prompt_perfezionatore
+misure["import"] = (time.perf_counter() - inizio, rss_mb())
+
+inizio = time.perf_counter()
+perfezionatore = prompt_perfezionatore.PromptPerfezionatore()
+misure["costruttore"] = (time.perf_counter() - inizio, rss_mb())
+
+if sys.argv[1] == "1":
+    inizio = time.perf_counter()
+    prompt_perfezionatore.warmup()
+    misure["warmup"] = (time.perf_counter() - inizio, rss_mb())
+
+inizio = time.perf_counter()
+perfezionatore.analizza_prompt("Scrivi una email al cliente per confermare l'ordine.")
+misure["prima_analisi"] = (time.perf_counter() - inizio, rss_mb())
+
+print(json.dumps({"moduli_gradio": "gradio" in sys.modules, "moduli_spacy": "spacy" in sys.modules, **misure}))
+"""
+
+
+def esegui_misura(warmup: bool) -> dict:
+    """Avvia un interprete nuovo e restituisce le misure della singola esecuzione."""
+    risultato = subprocess.run(
+        [sys.executable, "-c", MISURA, "1" if warmup else "0"],
+        cwd=RADICE, capture_output=True, text=True, check=True
+    )
+    return json.loads(risultato.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="Chiama warmup() prima della prima analisi")
+    args = parser.parse_args()
+
+    esecuzioni = [esegui_misura(args.warmup) for _ in range(args.ripetizioni)]
+
+    print(f"gradio importato: {esecuzioni[0]['moduli_gradio']}, "
+          f"spaCy importato dopo la prima analisi: {esecuzioni[0]['moduli_spacy']}")
+    print(f"{'fase':<14}{'mediana (ms)':>14}{'RSS max (MB)':>14}")
+    for fase in ("import", "costruttore", "warmup", "prima_analisi"):
+        if fase not in esecuzioni[0]:
+            continue
+        tempi = [esecuzione[fase][0] * 1000 for esecuzione in esecuzioni]
+        rss = max(esecuzione[fase][1] for esecuzione in esecuzioni)
+        print(f"{fase:<14}{statistics.median(tempi):>14.1f}{rss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark della verifica ortografica.
+
+Confronta la latenza per chiamata della vecchia implementazione, che
+costruiva un nuovo SpellChecker a ogni prompt, con il motore ortografico
+condiviso di `prompt_perfezionatore`. Il dizionario italiano è incluso
+in PySpellChecker dalla versione 0.8.0.
+
+Uso:
+    python benchmarks/bench_ortografia.py --lingua it --ripetizioni 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spellchecker import SpellChecker
+
+from benchmarks.corpus import PROMPT_REALISTICI
+from prompt_perfezionatore import LINGUA_ORTOGRAFIA, codice_dizionario, get_motore_ortografico, verifica_ortografia
+
+
+def verifica_ortografia_senza_motore(testo, lingua):
+    """Riproduce il comportamento precedente: dizionario e candidati ricalcolati a ogni chiamata."""
+    spell = SpellChecker(language=lingua)
+    parole = testo.split()
+    for parola in spell.unknown(parole):
+        spell.correction(parola)
+        spell.candidates(parola)
+
+
+def misura(funzione, testi, lingua, ripetizioni):
+    """Restituisce le latenze in millisecondi di ogni chiamata."""
+    latenze = []
+    for _ in range(ripetizioni):
+        for testo in testi:
+            inizio = time.perf_counter()
+            funzione(testo, lingua)
+            latenze.append((time.perf_counter() - inizio) * 1000)
+    return latenze
+
+
+def riepilogo(nome, latenze):
+    latenze = sorted(latenze)
+    p95 = latenze[int(len(latenze) * 0.95) - 1]
+    print(f"{nome:<12} media {statistics.mean(latenze):8.2f} ms   "
+          f"p50 {statistics.median(latenze):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lingua", default=LINGUA_ORTOGRAFIA, help="Codice della lingua del dizionario")
+    parser.add_argument("--ripetizioni", type=int, default=5, help="Passaggi sull'intero corpus")
+    args = parser.parse_args()
+
+    # Senza dizionario entrambe le versioni misurerebbero solo il caso di servizio non disponibile
+    lingua = codice_dizionario(args.lingua)
+    try:
+        get_motore_ortografico(lingua).spell
+    except ValueError:
+        sys.exit(f"Dizionario '{lingua}' non disponibile in PySpellChecker: installa le dipendenze di requirements.txt")
+
+    print(f"Corpus: {len(PROMPT_REALISTICI)} prompt, {args.ripetizioni} ripetizioni, lingua '{lingua}'")
+    riepilogo("prima", misura(verifica_ortografia_senza_motore, PROMPT_REALISTICI, lingua, args.ripetizioni))
+    riepilogo("dopo", misura(verifica_ortografia, PROMPT_REALISTICI, lingua, args.ripetizioni))
+
+
+if __name__ == "__main__":
+    main()
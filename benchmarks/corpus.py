@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Corpus di prompt realistici in italiano usato dai benchmark.
+
+Alcuni prompt contengono volutamente errori di battitura, per esercitare
+anche la generazione dei candidati ortografici. `genera_corpus` compone
+prompt sintetici di lunghezza controllata a partire da questi.
+"""
+
+import random
+from typing import List
+
+PROMPT_REALISTICI = [
+    "Scrivi una email formale al cliente per comunicare un ritardo nella consegna dell'ordine. "
+    "Il tono deve essere cortese ma deciso, e la mail non deve superare le 150 parole.",
+
+    "Riassumi il seguente articolo in cinque punti elenco, evidenziando i dati numerici "
+    "più importanti e le conclusioni dell'autore. Usa un linguaggio semplice.",
+
+    "Sei un esperto di marketing digitale. Proponi una strategia per lanciare un nuovo "
+    "prodotto cosmetico sui social network, indicando budget, tempistiche e indicatori di successo.",
+
+    "Traduci in inglese il testo seguente mantenendo il registro formale e la terminologia "
+    "giuridica. Segnala eventuali termini ambigui che richiedono una verifica da parte di un legale.",
+
+    "Crea un piano di studio di quattro settimane per preparare l'esame di analisi matematica, "
+    "con argomenti giornalieri, esercizi consigliati e momenti di ripasso.",
+
+    "Scrivi una funzione in Python che legga un file CSV, rimuova le righe duplicate e salvi "
+    "il risultato in un nuovo file. Commenta il codice e gestisci gli errori di lettura.",
+
+    "Fammi un elenco di idee per una festa di compleanno per bambini di otto anni, magari "
+    "con qualche gioco all'aperto e un menu più o meno economico.",
+
+    "Analizza i punti di forza e di debolezza di questa proposta commerciale e suggerisci "
+    "come migliorarla prima della presentazione al consiglio di amministrazione.",
+
+    "Scirvi un raconto breve ambientato in una citta di mare, con un protagnista che ritorna "
+    "dopo molti anni e scopre che tutto è cambiato.",
+
+    "Spiegami in modo semplice come funziona la fotosintesi, come se avessi dieci anni, e "
+    "aggiungi un piccolo esperimento da fare a casa con materiali comuni.",
+
+    "Prepara una scaletta per una presentazione aziendale sui risultati del trimestre: "
+    "introduzione, andamento delle vendite, criticità, obiettivi per il prossimo periodo.",
+
+    "Correggi gli errori grammaticali e ortografici di questo paragrafo e spiegami le "
+    "corezioni principali: ieri siamo andati al mare ma il tempo era brutto e abbiamo "
+    "deciso di tornare a casa prima del previsto perche pioveva.",
+]
+
+# Elementi con cui vengono composti i prompt sintetici lunghi
+_TITOLI = ["Contesto", "Obiettivo", "Vincoli", "Formato della risposta", "Esempi", "Pubblico", "Note"]
+_VOCI = [
+    "usa un tono professionale ma non troppo formale",
+    "indica sempre le fonti dei dati citati",
+    "evita il gergo tecnico se non è necessario",
+    "limita ogni sezione a un massimo di cento parole",
+    "segnala eventuali ipotesi che hai dovuto fare",
+    "magari aggiungi qualche esempio pratico",
+    "rispondi in italiano anche se il materiale è in inglese",
+]
+
+
+def _frasi(prompt: str) -> List[str]:
+    return [frase.strip() + "." for frase in prompt.split(".") if frase.strip()]
+
+
+def genera_prompt(caratteri: int, seme: int = 0) -> str:
+    """
+    Genera un prompt sintetico in italiano lungo circa `caratteri` caratteri.
+
+    I prompt brevi sono frasi del corpus realistico; quelli lunghi alternano
+    paragrafi, titoli Markdown ed elenchi, come i prompt strutturati reali.
+    Lo stesso seme produce sempre lo stesso testo.
+
+    Args:
+        caratteri (int): La lunghezza desiderata; il testo non la supera.
+        seme (int): Il seme del generatore casuale.
+
+    Returns:
+        str: Il prompt generato.
+    """
+    casuale = random.Random(seme)
+    frasi = [frase for prompt in PROMPT_REALISTICI for frase in _frasi(prompt)]
+    parti: List[str] = [casuale.choice(PROMPT_REALISTICI)]
+    lunghezza = len(parti[0])
+
+    while lunghezza < caratteri:
+        scelta = casuale.random()
+        if caratteri < 500 or scelta < 0.5:
+            parte = " ".join(casuale.sample(frasi, 3))
+        elif scelta < 0.7:
+            parte = f"## {casuale.choice(_TITOLI)}"
+        else:
+            parte = "\n".join(f"- {voce}" for voce in casuale.sample(_VOCI, 3))
+        parti.append(parte)
+        lunghezza += len(parte) + 2
+
+    testo = "\n\n".join(parti)
+    if len(testo) > caratteri:
+        # Taglio all'ultima parola intera
+        testo = testo[:caratteri].rsplit(" ", 1)[0] if " " in testo[:caratteri] else testo[:caratteri]
+    return testo
+
+
+def genera_corpus(caratteri: int, quanti: int, seme: int = 0) -> List[str]:
+    """
+    Genera `quanti` prompt sintetici distinti di circa `caratteri` caratteri.
+
+    I prompt sono tutti diversi tra loro, così nei benchmark non vengono
+    serviti dalla cache dei risultati.
+    """
+    return [f"[{indice}] {genera_prompt(caratteri - len(str(indice)) - 3, seme * 100003 + indice)}"
+            for indice in range(quanti)]
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+Server HTTP locale che imita l'endpoint chat-completions di DeepSeek.
+
+Usato dai benchmark per misurare il client senza dipendere dalla rete.
+Il server parla HTTP/1.1 con keep-alive, così le connessioni riutilizzate
+dal pool del client vengono effettivamente mantenute aperte. Le richieste
+con `"stream": true` ricevono la risposta come server-sent events, un
+piccolo frammento alla volta. Con `tasso_errori` una frazione delle
+richieste, scelta in modo riproducibile dal seme, riceve invece un errore.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RISPOSTA_PREDEFINITA = {
+    "prompt_migliorato": "Scrivi una email formale e cortese al cliente.",
+    "suggerimenti": ["Specifica il destinatario", "Indica la lunghezza desiderata"],
+    "spiegazione": "Il prompt è stato reso più specifico."
+}
+
+
+class _GestoreStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Header e corpo in un solo segmento: con Nagle attivo le connessioni
+    # keep-alive pagherebbero il ritardo dell'ACK ritardato a ogni risposta
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def do_POST(self):
+        lunghezza = int(self.headers.get("Content-Length", 0))
+        richiesta = json.loads(self.rfile.read(lunghezza) or b"{}")
+
+        if self.server.latenza:
+            time.sleep(self.server.latenza)
+
+        if self.server.estrai_errore():
+            corpo = json.dumps({"error": {"message": "Errore simulato dallo stub"}}).encode("utf-8")
+            self.send_response(self.server.stato_errore)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            if self.server.stato_errore == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(corpo)
+            return
+
+        contenuto = json.dumps(RISPOSTA_PREDEFINITA, ensure_ascii=False)
+        if richiesta.get("stream"):
+            self._invia_stream(contenuto)
+            return
+
+        corpo = json.dumps({
+            "choices": [{"message": {"content": contenuto}}]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _invia_stream(self, contenuto):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        for inizio in range(0, len(contenuto), self.server.dimensione_frammento):
+            evento = {"choices": [{"delta": {"content": contenuto[inizio:inizio + self.server.dimensione_frammento]}}]}
+            self.wfile.write(f"data: {json.dumps(evento)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.server.ritardo_frammento:
+                time.sleep(self.server.ritardo_frammento)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ServerStub(ThreadingHTTPServer):
+    # Coda di accept ampia per i benchmark con molte richieste concorrenti
+    request_queue_size = 512
+    daemon_threads = True
+
+    def estrai_errore(self) -> bool:
+        """Decide se la richiesta corrente deve fallire."""
+        if not self.tasso_errori:
+            return False
+        with self.lock_casuale:
+            return self.casuale.random() < self.tasso_errori
+
+
+class StubDeepSeek:
+    """
+    Stub DeepSeek in esecuzione su un thread in background.
+
+    Uso:
+        with StubDeepSeek(latenza=0.05, tasso_errori=0.01) as stub:
+            settings.deepseek_api_url = stub.url
+    """
+
+    def __init__(self, latenza: float = 0.0, ritardo_frammento: float = 0.0, dimensione_frammento: int = 4,
+                 tasso_errori: float = 0.0, stato_errore: int = 500, seme: int = 0):
+        self.server = _ServerStub(("127.0.0.1", 0), _GestoreStub)
+        self.server.latenza = latenza
+        self.server.ritardo_frammento = ritardo_frammento
+        self.server.dimensione_frammento = dimensione_frammento
+        self.server.tasso_errori = tasso_errori
+        self.server.stato_errore = stato_errore
+        self.server.casuale = random.Random(seme)
+        self.server.lock_casuale = threading.Lock()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, porta = self.server.server_address
+        return f"http://{host}:{porta}/v1/chat/completions"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
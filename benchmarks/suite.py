@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Suite di benchmark della pipeline di analisi e miglioramento.
+
+Per ogni fase e per ogni dimensione dei prompt avvia un interprete nuovo,
+così la memoria residente massima misurata appartiene a quella sola fase.
+Le fasi misurate sono:
+
+    grammatica_spacy   analisi_grammatica_spacy
+    ortografia         verifica_ortografia
+    grammar_checker    GrammarChecker.verifica_testo (spaCy + ortografia)
+    analisi            PromptPerfezionatore.analizza_prompt
+    end_to_end         PromptPerfezionatore.migliora_e_analizza contro uno stub DeepSeek locale
+
+I prompt sono sintetici, in italiano, riproducibili dal seme e tutti
+distinti, quindi nessuna richiesta viene servita dalla cache. Con un tasso
+di errori dello stub diverso da zero la latenza end-to-end comprende i
+tentativi ripetuti e le relative attese (salvo `--senza-attese`).
+
+I risultati vengono scritti in JSON; con `--confronta` vengono confrontati
+con quelli di una versione precedente e il comando termina con codice 1
+se una fase è peggiorata oltre la tolleranza.
+
+Uso:
+    python benchmarks/suite.py --output risultati.json
+    python benchmarks/suite.py --dimensioni 100 2000 --prompt 20 --tasso-errori 0.05 --senza-attese
+    python benchmarks/suite.py --output nuova.json --confronta precedente.json --tolleranza 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+
+FASI = ("grammatica_spacy", "ortografia", "grammar_checker", "analisi", "end_to_end")
+# Metriche per cui un valore più alto indica un peggioramento
+METRICHE_CONFRONTATE = ("p50_ms", "p95_ms", "rss_picco_mb")
+
+
+def rss_picco_mb() -> float:
+    """Memoria residente massima del processo, in MB (Linux riporta KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentili(latenze: List[float]) -> Dict[str, float]:
+    """Media e percentili 50/95/99 di una lista di latenze in millisecondi."""
+    if len(latenze) == 1:
+        return {"media_ms": latenze[0], "p50_ms": latenze[0], "p95_ms": latenze[0], "p99_ms": latenze[0]}
+    quantili = statistics.quantiles(latenze, n=100, method="inclusive")
+    return {
+        "media_ms": statistics.mean(latenze),
+        "p50_ms": quantili[49],
+        "p95_ms": quantili[94],
+        "p99_ms": quantili[98]
+    }
+
+
+def _prepara_fase(fase: str, args) -> tuple:
+    """
+    Restituisce la funzione da misurare per la fase e l'eventuale stub da chiudere.
+
+    Eseguita nel processo figlio: qui vengono importati i moduli dell'applicazione.
+    """
+    import prompt_perfezionatore
+    from prompt_perfezionatore import (
+        LINGUA_ORTOGRAFIA, GrammarChecker, PromptPerfezionatore, analisi_grammatica_spacy, get_motore_ortografico,
+        settings, verifica_ortografia
+    )
+
+    if fase in ("ortografia", "grammar_checker"):
+        # Senza dizionario si misurerebbe solo il caso di servizio non disponibile
+        try:
+            get_motore_ortografico(LINGUA_ORTOGRAFIA).spell
+        except ValueError:
+            sys.exit("Dizionario italiano non disponibile in PySpellChecker: installa le dipendenze di requirements.txt")
+
+    stub = None
+    if fase == "end_to_end":
+        from benchmarks.stub_deepseek import StubDeepSeek
+
+        stub = StubDeepSeek(latenza=args.latenza, tasso_errori=args.tasso_errori, seme=args.seme).__enter__()
+        settings.deepseek_api_url = stub.url
+        settings.deepseek_api_key = settings.deepseek_api_key or "chiave-di-test"
+        if args.senza_attese:
+            from tenacity import wait_none
+            prompt_perfezionatore.PromptPerfezionatore._chiama_api_deepseek.retry.wait = wait_none()
+
+    # Una cache persistente servirebbe i prompt delle esecuzioni precedenti
+    settings.cache_backend = "memoria"
+    # I prompt sintetici si somigliano: verrebbero serviti come quasi duplicati senza chiamare lo stub
+    settings.near_duplicate_threshold = 0
+    perfezionatore = PromptPerfezionatore()
+    # Le altre fasi ricevono il testo già sanitizzato, come nella pipeline reale
+    funzioni: Dict[str, Callable[[str], Any]] = {
+        "grammatica_spacy": lambda testo: analisi_grammatica_spacy(perfezionatore._sanitizza_input(testo)),
+        "ortografia": lambda testo: verifica_ortografia(perfezionatore._sanitizza_input(testo)),
+        "grammar_checker": lambda testo: GrammarChecker().verifica_testo(perfezionatore._sanitizza_input(testo)),
+        "analisi": perfezionatore.analizza_prompt,
+        "end_to_end": perfezionatore.migliora_e_analizza
+    }
+    return funzioni[fase], stub
+
+
+def esegui_fase(fase: str, caratteri: int, args) -> Dict[str, Any]:
+    """
+    Misura una fase su un corpus di prompt di una data dimensione (nel processo figlio).
+
+    Returns:
+        dict: Throughput, latenze, memoria ed eventuali errori della fase.
+    """
+    from benchmarks.corpus import genera_corpus
+    from prompt_perfezionatore import TENTATIVI_DEEPSEEK, RisultatoErrore, warmup
+
+    # I log per richiesta falserebbero le misure
+    logging.disable(logging.INFO)
+    corpus = genera_corpus(caratteri, args.prompt, args.seme)
+    # Il prompt di riscaldamento non fa parte del corpus misurato
+    riscaldamento = genera_corpus(caratteri, 1, args.seme + 1)[0]
+
+    rss_iniziale = rss_picco_mb()
+    funzione, stub = _prepara_fase(fase, args)
+    try:
+        warmup()
+        funzione(riscaldamento)
+        rss_pronto = rss_picco_mb()
+
+        latenze = []
+        errori = 0
+        tentativi_iniziali = TENTATIVI_DEEPSEEK.valore()
+        inizio_totale = time.perf_counter()
+        for testo in corpus:
+            inizio = time.perf_counter()
+            risultato = funzione(testo)
+            latenze.append((time.perf_counter() - inizio) * 1000)
+            # Comprende i miglioramenti per sezioni riusciti solo in parte
+            if isinstance(risultato, RisultatoErrore):
+                errori += 1
+        durata_totale = time.perf_counter() - inizio_totale
+    finally:
+        if stub is not None:
+            stub.__exit__(None, None, None)
+
+    return {
+        "fase": fase,
+        "caratteri": caratteri,
+        "prompt": len(corpus),
+        "throughput_prompt_al_secondo": len(corpus) / durata_totale,
+        **percentili(latenze),
+        "rss_iniziale_mb": rss_iniziale,
+        "rss_dopo_riscaldamento_mb": rss_pronto,
+        "rss_picco_mb": rss_picco_mb(),
+        "errori": errori,
+        "tentativi_ripetuti": TENTATIVI_DEEPSEEK.valore() - tentativi_iniziali
+    }
+
+
+def misura_in_processo(fase: str, caratteri: int, args) -> Dict[str, Any]:
+    """Avvia un interprete nuovo per la fase e restituisce le sue misure."""
+    comando = [
+        sys.executable, os.path.abspath(__file__), "--fase-interna", fase,
+        "--dimensioni", str(caratteri), "--prompt", str(args.prompt), "--seme", str(args.seme),
+        "--latenza", str(args.latenza), "--tasso-errori", str(args.tasso_errori)
+    ]
+    if args.senza_attese:
+        comando.append("--senza-attese")
+    risultato = subprocess.run(comando, cwd=RADICE, capture_output=True, text=True)
+    if risultato.returncode != 0:
+        raise RuntimeError(f"Fase {fase} ({caratteri} caratteri) fallita:\n{risultato.stderr}")
+    return json.loads(risultato.stdout.strip().splitlines()[-1])
+
+
+def informazioni_ambiente() -> Dict[str, Any]:
+    """Versioni e piattaforma, per confrontare solo risultati comparabili."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RADICE, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "piattaforma": platform.platform(),
+        "processori": os.cpu_count()
+    }
+
+
+def confronta(attuali: List[Dict[str, Any]], precedenti: List[Dict[str, Any]], tolleranza: float) -> List[str]:
+    """
+    Confronta due esecuzioni della suite.
+
+    Returns:
+        list: Le descrizioni delle regressioni oltre la tolleranza (ad esempio 0.2 = +20%).
+    """
+    indice = {(misura["fase"], misura["caratteri"]): misura for misura in precedenti}
+    regressioni = []
+    for misura in attuali:
+        precedente = indice.get((misura["fase"], misura["caratteri"]))
+        if precedente is None:
+            continue
+        for metrica in METRICHE_CONFRONTATE:
+            if precedente[metrica] > 0 and misura[metrica] > precedente[metrica] * (1 + tolleranza):
+                regressioni.append(
+                    f"{misura['fase']} ({misura['caratteri']} caratteri): {metrica} "
+                    f"{precedente[metrica]:.2f} -> {misura[metrica]:.2f}"
+                )
+        throughput = "throughput_prompt_al_secondo"
+        if misura[throughput] < precedente[throughput] * (1 - tolleranza):
+            regressioni.append(
+                f"{misura['fase']} ({misura['caratteri']} caratteri): {throughput} "
+                f"{precedente[throughput]:.2f} -> {misura[throughput]:.2f}"
+            )
+    return regressioni
+
+
+def stampa_tabella(misure: List[Dict[str, Any]]) -> None:
+    print(f"{'fase':<18}{'caratteri':>10}{'prompt/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'RSS MB':>9}{'errori':>8}{'ritentate':>10}")
+    for misura in misure:
+        print(f"{misura['fase']:<18}{misura['caratteri']:>10}{misura['throughput_prompt_al_secondo']:>10.1f}"
+              f"{misura['p50_ms']:>10.2f}{misura['p95_ms']:>10.2f}{misura['p99_ms']:>10.2f}"
+              f"{misura['rss_picco_mb']:>9.1f}{misura['errori']:>8}{misura['tentativi_ripetuti']:>10.0f}")
+
+
+def main():
+    from prompt_perfezionatore import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fasi", nargs="+", choices=FASI, default=list(FASI))
+    parser.add_argument("--dimensioni", nargs="+", type=int,
+                        default=[100, 1000, 5000, settings.max_input_length],
+                        help="Lunghezze dei prompt in caratteri")
+    parser.add_argument("--prompt", type=int, default=50, help="Prompt misurati per fase e dimensione")
+    parser.add_argument("--seme", type=int, default=0, help="Seme del corpus e degli errori dello stub")
+    parser.add_argument("--latenza", type=float, default=0.05, help="Latenza dello stub DeepSeek, in secondi")
+    parser.add_argument("--tasso-errori", type=float, default=0.0, help="Frazione di risposte con errore dello stub")
+    parser.add_argument("--senza-attese", action="store_true", help="Ritenta subito, senza le attese tra i tentativi")
+    parser.add_argument("--output", help="File JSON in cui scrivere i risultati")
+    parser.add_argument("--confronta", help="File JSON di un'esecuzione precedente")
+    parser.add_argument("--tolleranza", type=float, default=0.2, help="Peggioramento relativo ammesso")
+    parser.add_argument("--fase-interna", choices=FASI, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.fase_interna:
+        print(json.dumps(esegui_fase(args.fase_interna, args.dimensioni[0], args)))
+        return
+
+    misure = []
+    for fase in args.fasi:
+        for caratteri in args.dimensioni:
+            misure.append(misura_in_processo(fase, caratteri, args))
+            print(f"  {fase} ({caratteri} caratteri) completata", file=sys.stderr)
+
+    risultati = {
+        "ambiente": informazioni_ambiente(),
+        "parametri": {
+            "prompt": args.prompt,
+            "seme": args.seme,
+            "latenza_stub": args.latenza,
+            "tasso_errori_stub": args.tasso_errori,
+            "senza_attese": args.senza_attese,
+            "spacy_model": settings.spacy_model,
+            "analysis_profile": settings.analysis_profile
+        },
+        "misure": misure
+    }
+    stampa_tabella(misure)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(risultati, file, indent=2, ensure_ascii=False)
+
+    if args.confronta:
+        with open(args.confronta, encoding="utf-8") as file:
+            precedenti = json.load(file)["misure"]
+        regressioni = confronta(misure, precedenti, args.tolleranza)
+        for regressione in regressioni:
+            print(f"REGRESSIONE {regressione}")
+        if regressioni:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Backend di cache per i risultati del Prompt Perfezionatore.
+
+Il backend in memoria mantiene il comportamento storico (TTLCache per
+processo); il backend SQLite è persistente, condiviso tra processi diversi
+sulla stessa macchina e limitato per numero di voci e dimensione totale.
+"""
+
+import abc
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from cachetools import Cache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class StatisticheCache:
+    """
+    Contatori di hit, miss ed evizioni di una cache, aggiornabili da più thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hit = 0
+        self.miss = 0
+        self.evizioni = 0
+
+    def incrementa(self, contatore: str, quantita: int = 1) -> None:
+        """Incrementa uno dei contatori ("hit", "miss", "evizioni")."""
+        if quantita:
+            with self._lock:
+                setattr(self, contatore, getattr(self, contatore) + quantita)
+
+    def come_dict(self) -> Dict[str, Any]:
+        """Restituisce una fotografia coerente dei contatori."""
+        with self._lock:
+            richieste = self.hit + self.miss
+            return {
+                "hit": self.hit,
+                "miss": self.miss,
+                "evizioni": self.evizioni,
+                "hit_ratio": round(self.hit / richieste, 4) if richieste else 0.0
+            }
+
+
+class BackendCache(abc.ABC):
+    """
+    Interfaccia comune dei backend di cache.
+
+    I valori devono essere serializzabili in JSON: le tuple vengono
+    restituite come liste dai backend persistenti. Le sottoclassi
+    implementano `_leggi` e `_scrivi`; i contatori di hit e miss sono
+    aggiornati qui, quelli di evizione dal backend.
+    """
+
+    def __init__(self):
+        self.contatori = StatisticheCache()
+
+    def get(self, chiave: str, default: Any = None, conta: bool = True) -> Any:
+        """
+        Restituisce il valore associato alla chiave, o `default` se assente o scaduto.
+
+        Con `conta=False` la lettura non aggiorna hit e miss: serve per le
+        letture interne che non corrispondono a una richiesta di un utente.
+        """
+        valore = self._leggi(chiave)
+        if not conta:
+            return default if valore is None else valore
+        if valore is None:
+            self.contatori.incrementa("miss")
+            return default
+        self.contatori.incrementa("hit")
+        return valore
+
+    def set(self, chiave: str, valore: Any) -> None:
+        """Memorizza un valore, applicando le politiche di scadenza e di evizione."""
+        self._scrivi(chiave, valore)
+
+    def statistiche(self) -> Dict[str, Any]:
+        """
+        Restituisce i contatori della cache e il numero di voci presenti.
+
+        I contatori sono relativi al processo corrente, anche per i backend condivisi.
+        """
+        statistiche = self.contatori.come_dict()
+        statistiche["voci"] = len(self)
+        return statistiche
+
+    @abc.abstractmethod
+    def _leggi(self, chiave: str) -> Any:
+        """Restituisce il valore della chiave, o None se assente o scaduto, senza aggiornare hit e miss."""
+
+    @abc.abstractmethod
+    def _scrivi(self, chiave: str, valore: Any) -> None:
+        """Memorizza il valore ed esegue l'evizione necessaria."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Svuota la cache."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Restituisce il numero di voci non scadute."""
+
+    def __contains__(self, chiave: str) -> bool:
+        return self.get(chiave) is not None
+
+    def __getitem__(self, chiave: str) -> Any:
+        valore = self.get(chiave)
+        if valore is None:
+            raise KeyError(chiave)
+        return valore
+
+    def __setitem__(self, chiave: str, valore: Any) -> None:
+        self.set(chiave, valore)
+
+
+class _TTLCacheConContatori(TTLCache):
+    """TTLCache che conta le voci rimosse per scadenza o per mancanza di spazio."""
+
+    def __init__(self, maxsize: int, ttl: int, contatori: StatisticheCache):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._contatori = contatori
+
+    def expire(self, time=None):
+        # Cache.__len__ non rimuove le voci scadute, a differenza di TTLCache.__len__
+        prima = Cache.__len__(self)
+        risultato = super().expire(time)
+        self._contatori.incrementa("evizioni", prima - Cache.__len__(self))
+        return risultato
+
+    def popitem(self):
+        voce = super().popitem()
+        self._contatori.incrementa("evizioni")
+        return voce
+
+
+class CacheMemoriaTTL(BackendCache):
+    """
+    Cache in memoria con scadenza, locale al processo.
+
+    TTLCache non è thread-safe: ogni accesso avviene sotto lock. I valori
+    vengono copiati in scrittura e in lettura, come accade con il backend
+    SQLite, così una richiesta non può modificare il risultato visto da un'altra.
+    """
+
+    def __init__(self, max_voci: int, ttl: int):
+        """
+        Inizializza la cache.
+
+        Args:
+            max_voci (int): Numero massimo di voci.
+            ttl (int): Durata di una voce in secondi.
+        """
+        super().__init__()
+        self._lock = threading.Lock()
+        self._cache = _TTLCacheConContatori(max_voci, ttl, self.contatori)
+
+    def _leggi(self, chiave: str) -> Any:
+        with self._lock:
+            valore = self._cache.get(chiave)
+        return copy.deepcopy(valore)
+
+    def _scrivi(self, chiave: str, valore: Any) -> None:
+        valore = copy.deepcopy(valore)
+        with self._lock:
+            self._cache[chiave] = valore
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+
+class CacheSQLite(BackendCache):
+    """
+    Cache persistente su SQLite in modalità WAL.
+
+    Più processi possono usare lo stesso file: le letture non bloccano le
+    scritture e ogni scrittura, insieme all'evizione, avviene in una
+    transazione esclusiva. Quando si superano `max_voci` o `max_byte`
+    vengono rimosse le voci usate meno di recente. L'istante dell'ultimo
+    accesso è aggiornato al più ogni decimo del TTL: una lettura ravvicinata
+    della stessa voce non prende il lock di scrittura.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS risultati (
+            chiave TEXT PRIMARY KEY,
+            valore TEXT NOT NULL,
+            dimensione INTEGER NOT NULL,
+            scadenza REAL NOT NULL,
+            ultimo_accesso REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_risultati_accesso ON risultati (ultimo_accesso);
+    """
+
+    def __init__(self, percorso: str, max_voci: int, ttl: int, max_byte: Optional[int] = None):
+        """
+        Inizializza la cache, creando il database se necessario.
+
+        Args:
+            percorso (str): Il percorso del file SQLite.
+            max_voci (int): Numero massimo di voci.
+            ttl (int): Durata di una voce in secondi.
+            max_byte (int, optional): Dimensione massima complessiva dei valori serializzati.
+        """
+        super().__init__()
+        self.percorso = percorso
+        self.max_voci = max_voci
+        self.ttl = ttl
+        self.max_byte = max_byte
+        # Intervallo minimo tra due aggiornamenti di `ultimo_accesso` della stessa voce
+        self.intervallo_accesso = ttl / 10
+        self._locale = threading.local()
+
+        cartella = os.path.dirname(os.path.abspath(percorso))
+        os.makedirs(cartella, exist_ok=True)
+        self._connessione().executescript(self._SCHEMA)
+
+    def _connessione(self) -> sqlite3.Connection:
+        """
+        Restituisce la connessione del thread corrente.
+
+        Le connessioni SQLite non si condividono tra thread: ognuno ne apre una propria.
+        """
+        connessione = getattr(self._locale, "connessione", None)
+        if connessione is None:
+            connessione = sqlite3.connect(self.percorso, timeout=30, isolation_level=None)
+            connessione.execute("PRAGMA journal_mode=WAL")
+            connessione.execute("PRAGMA synchronous=NORMAL")
+            self._locale.connessione = connessione
+        return connessione
+
+    def _leggi(self, chiave: str) -> Any:
+        connessione = self._connessione()
+        adesso = time.time()
+        riga = connessione.execute(
+            "SELECT valore, ultimo_accesso FROM risultati WHERE chiave = ? AND scadenza > ?", (chiave, adesso)
+        ).fetchone()
+        if riga is None:
+            return None
+        if adesso - riga[1] >= self.intervallo_accesso:
+            connessione.execute(
+                "UPDATE risultati SET ultimo_accesso = ? WHERE chiave = ? AND ultimo_accesso < ?",
+                (adesso, chiave, adesso - self.intervallo_accesso)
+            )
+        return json.loads(riga[0])
+
+    def _scrivi(self, chiave: str, valore: Any) -> None:
+        serializzato = json.dumps(valore, ensure_ascii=False)
+        adesso = time.time()
+        connessione = self._connessione()
+        connessione.execute("BEGIN IMMEDIATE")
+        try:
+            connessione.execute(
+                "INSERT OR REPLACE INTO risultati (chiave, valore, dimensione, scadenza, ultimo_accesso) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (chiave, serializzato, len(serializzato.encode("utf-8")), adesso + self.ttl, adesso)
+            )
+            self._evizione(connessione, adesso)
+            connessione.execute("COMMIT")
+        except Exception:
+            connessione.execute("ROLLBACK")
+            raise
+
+    def _evizione(self, connessione: sqlite3.Connection, adesso: float) -> None:
+        """Rimuove le voci scadute e, se servono, quelle usate meno di recente."""
+        rimosse = connessione.execute("DELETE FROM risultati WHERE scadenza <= ?", (adesso,)).rowcount
+
+        in_eccesso = connessione.execute("SELECT COUNT(*) FROM risultati").fetchone()[0] - self.max_voci
+        if in_eccesso > 0:
+            rimosse += connessione.execute(
+                "DELETE FROM risultati WHERE chiave IN "
+                "(SELECT chiave FROM risultati ORDER BY ultimo_accesso LIMIT ?)",
+                (in_eccesso,)
+            ).rowcount
+
+        if self.max_byte:
+            # Mantiene le voci più recenti finché la dimensione cumulata resta nel limite
+            rimosse += connessione.execute(
+                "DELETE FROM risultati WHERE chiave IN ("
+                "  SELECT chiave FROM ("
+                "    SELECT chiave, SUM(dimensione) OVER (ORDER BY ultimo_accesso DESC) AS cumulata"
+                "    FROM risultati"
+                "  ) WHERE cumulata > ?"
+                ")",
+                (self.max_byte,)
+            ).rowcount
+
+        self.contatori.incrementa("evizioni", rimosse)
+
+    def clear(self) -> None:
+        self._connessione().execute("DELETE FROM risultati")
+
+    def __len__(self) -> int:
+        return self._connessione().execute(
+            "SELECT COUNT(*) FROM risultati WHERE scadenza > ?", (time.time(),)
+        ).fetchone()[0]
+
+
+def crea_backend_cache(tipo: str, max_voci: int, ttl: int,
+                       percorso_sqlite: Optional[str] = None, max_byte: Optional[int] = None) -> BackendCache:
+    """
+    Crea il backend di cache indicato.
+
+    Args:
+        tipo (str): "memoria" oppure "sqlite".
+        max_voci (int): Numero massimo di voci.
+        ttl (int): Durata di una voce in secondi.
+        percorso_sqlite (str, optional): Il file del database, per il backend "sqlite".
+        max_byte (int, optional): Dimensione massima dei valori, per il backend "sqlite".
+
+    Returns:
+        BackendCache: Il backend configurato.
+
+    Raises:
+        ValueError: Se il tipo di backend non è supportato.
+    """
+    if tipo == "memoria":
+        return CacheMemoriaTTL(max_voci, ttl)
+    if tipo == "sqlite":
+        logger.info(f"Cache persistente SQLite: {percorso_sqlite}")
+        return CacheSQLite(percorso_sqlite, max_voci, ttl, max_byte)
+    raise ValueError(f"Backend di cache non supportato: {tipo}")
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Primitive di concorrenza del Prompt Perfezionatore.
+
+Funzionano sia con i thread del percorso sincrono sia con asyncio.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class RichiestaSuperata(Exception):
+    """La richiesta è stata sostituita da una più recente con la stessa chiave."""
+
+
+class PermessoNonDisponibile(TimeoutError):
+    """Il permesso del limitatore non può essere ottenuto entro il tempo concesso."""
+
+
+class SingleFlight:
+    """
+    Deduplica le chiamate concorrenti con la stessa chiave.
+
+    Il primo chiamante esegue il lavoro; quelli che arrivano mentre è in
+    corso attendono il suo risultato invece di ripeterlo. Il risultato
+    è condiviso tramite un `concurrent.futures.Future`, quindi un thread
+    può attendere il lavoro avviato da una coroutine e viceversa.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_corso: Dict[Hashable, Future] = {}
+        self.duplicati = 0
+
+    def apri(self, chiave: Hashable) -> Tuple[Future, bool]:
+        """
+        Registra una chiamata per la chiave o si unisce a quella in corso.
+
+        Args:
+            chiave: La chiave che identifica il lavoro.
+
+        Returns:
+            tuple: (future, guida). Se `guida` è True il chiamante deve eseguire
+            il lavoro e poi chiamare `completa`; altrimenti deve attendere `future`.
+        """
+        with self._lock:
+            future = self._in_corso.get(chiave)
+            if future is not None:
+                self.duplicati += 1
+                return future, False
+            future = Future()
+            # Un future "in esecuzione" non può essere annullato da chi lo attende
+            future.set_running_or_notify_cancel()
+            self._in_corso[chiave] = future
+            return future, True
+
+    def completa(self, chiave: Hashable, future: Future, risultato: Any = None,
+                 errore: BaseException = None) -> None:
+        """
+        Pubblica il risultato (o l'errore) di una chiamata guida.
+
+        Args:
+            chiave: La chiave passata ad `apri`.
+            future (Future): Il future restituito da `apri`.
+            risultato: Il risultato da condividere.
+            errore (BaseException, optional): L'errore da propagare ai chiamanti in attesa.
+        """
+        with self._lock:
+            if self._in_corso.get(chiave) is future:
+                del self._in_corso[chiave]
+        if future.done():
+            return
+        if errore is not None:
+            future.set_exception(errore)
+        else:
+            future.set_result(risultato)
+
+    def esegui(self, chiave: Hashable, funzione: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Esegue `funzione` una sola volta per tutte le chiamate concorrenti con la stessa chiave.
+
+        Args:
+            chiave: La chiave che identifica il lavoro.
+            funzione (callable): La funzione da eseguire.
+
+        Returns:
+            Il risultato della funzione, condiviso tra i chiamanti.
+        """
+        future, guida = self.apri(chiave)
+        if not guida:
+            return future.result()
+        try:
+            risultato = funzione(*args, **kwargs)
+        except BaseException as e:
+            self.completa(chiave, future, errore=e)
+            raise
+        self.completa(chiave, future, risultato)
+        return risultato
+
+    async def esegui_async(self, chiave: Hashable, funzione_async: Callable[..., Awaitable[Any]],
+                           *args, **kwargs) -> Any:
+        """
+        Versione asincrona di `esegui`.
+
+        Il lavoro viene avviato in un task separato: se il chiamante che lo ha
+        avviato viene annullato, gli altri in attesa ricevono comunque il risultato.
+
+        Args:
+            chiave: La chiave che identifica il lavoro.
+            funzione_async (callable): La coroutine function da eseguire.
+
+        Returns:
+            Il risultato della coroutine, condiviso tra i chiamanti.
+        """
+        future, guida = self.apri(chiave)
+        if guida:
+            task = asyncio.ensure_future(funzione_async(*args, **kwargs))
+            task.add_done_callback(lambda t: self._completa_da_task(chiave, future, t))
+        return await asyncio.wrap_future(future)
+
+    def _completa_da_task(self, chiave: Hashable, future: Future, task: asyncio.Task) -> None:
+        if task.cancelled():
+            self.completa(chiave, future, errore=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.completa(chiave, future, errore=task.exception())
+        else:
+            self.completa(chiave, future, task.result())
+
+
+class DebounceAsync:
+    """
+    Esegue solo l'ultima di una raffica di chiamate con la stessa chiave.
+
+    Ogni chiamata attende una breve pausa prima di avviare il lavoro; se nel
+    frattempo arriva una chiamata più recente con la stessa chiave, quella
+    precedente viene annullata, anche se il lavoro è già in corso, e solleva
+    `RichiestaSuperata`. L'annullamento interrompe la coroutine: il lavoro
+    già avviato in un executor prosegue fino alla fine e il suo risultato
+    viene scartato. Va usata da un unico event loop.
+    """
+
+    def __init__(self, attesa: float):
+        """
+        Args:
+            attesa (float): La pausa, in secondi, prima di avviare il lavoro.
+        """
+        self.attesa = attesa
+        self._in_corso: Dict[Hashable, asyncio.Task] = {}
+
+    async def esegui(self, chiave: Hashable, funzione_async: Callable[..., Awaitable[Any]],
+                     *args, **kwargs) -> Any:
+        """
+        Esegue `funzione_async` dopo la pausa, a meno che non arrivi una chiamata più recente.
+
+        Args:
+            chiave: La chiave che raggruppa le chiamate (ad esempio la sessione dell'utente).
+            funzione_async (callable): La coroutine function da eseguire.
+
+        Returns:
+            Il risultato della coroutine.
+
+        Raises:
+            RichiestaSuperata: Se una chiamata più recente con la stessa chiave l'ha sostituita.
+        """
+        precedente = self._in_corso.get(chiave)
+        if precedente is not None:
+            precedente.cancel()
+
+        task = asyncio.ensure_future(self._dopo_attesa(funzione_async, *args, **kwargs))
+        self._in_corso[chiave] = task
+        try:
+            # `wait` non propaga l'annullamento del task, solo quello del chiamante
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self._in_corso.get(chiave) is task:
+                del self._in_corso[chiave]
+
+        if task.cancelled():
+            raise RichiestaSuperata()
+        return task.result()
+
+    async def _dopo_attesa(self, funzione_async: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        await asyncio.sleep(self.attesa)
+        return await funzione_async(*args, **kwargs)
+
+
+class LimitatoreAdattivo:
+    """
+    Limita le richieste verso un servizio esterno, sia nel numero al secondo sia in quelle in corso.
+
+    Il ritmo è regolato da un token bucket (`richieste_al_secondo`, con
+    raffiche fino a `raffica` richieste). Il numero di richieste in corso
+    segue un controllo AIMD: ogni richiesta riuscita alza il limite di
+    1/limite (circa +1 ogni "giro" di richieste), ogni segnale di
+    sovraccarico lo dimezza, al più una volta per `intervallo_riduzione`
+    secondi perché una raffica di errori contemporanei conti come uno solo.
+    `sospendi` blocca tutte le nuove richieste, ad esempio per rispettare
+    un `Retry-After`. È condiviso tra thread e coroutine.
+    """
+
+    def __init__(self, richieste_al_secondo: float = 0.0, raffica: int = 1, concorrenza_iniziale: int = 8,
+                 concorrenza_massima: int = 32, concorrenza_minima: int = 1, intervallo_riduzione: float = 1.0):
+        """
+        Args:
+            richieste_al_secondo (float): Ritmo massimo; 0 per non limitarlo.
+            raffica (int): Richieste che possono partire insieme dopo una pausa.
+            concorrenza_iniziale (int): Richieste in corso ammesse all'avvio.
+            concorrenza_massima (int): Limite superiore della concorrenza adattiva.
+            concorrenza_minima (int): Limite inferiore della concorrenza adattiva.
+            intervallo_riduzione (float): Secondi minimi tra due dimezzamenti.
+        """
+        self.richieste_al_secondo = richieste_al_secondo
+        self.raffica = max(1, raffica)
+        self.concorrenza_minima = max(1, concorrenza_minima)
+        self.concorrenza_massima = max(self.concorrenza_minima, concorrenza_massima)
+        self.intervallo_riduzione = intervallo_riduzione
+        self.limite = float(min(max(concorrenza_iniziale, self.concorrenza_minima), self.concorrenza_massima))
+        self.in_corso = 0
+
+        self._condizione = threading.Condition()
+        self._gettoni = float(self.raffica)
+        self._ultimo_rifornimento = time.monotonic()
+        self._sospeso_fino = 0.0
+        self._ultima_riduzione = float("-inf")
+        # Coroutine in attesa di un posto: vengono svegliate dal loop a cui appartengono
+        self._attese_async: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+
+    def _prova_ad_acquisire(self) -> float:
+        """
+        Acquisisce un permesso, se possibile. Va chiamata con il lock.
+
+        Returns:
+            float: 0 se il permesso è stato acquisito, altrimenti i secondi da
+            attendere prima di riprovare (infinito se serve un posto libero).
+        """
+        adesso = time.monotonic()
+        if adesso < self._sospeso_fino:
+            return self._sospeso_fino - adesso
+        if self.in_corso >= int(self.limite):
+            return math.inf
+        if self.richieste_al_secondo:
+            trascorso = adesso - self._ultimo_rifornimento
+            self._gettoni = min(float(self.raffica), self._gettoni + trascorso * self.richieste_al_secondo)
+            self._ultimo_rifornimento = adesso
+            if self._gettoni < 1:
+                return (1 - self._gettoni) / self.richieste_al_secondo
+            self._gettoni -= 1
+        self.in_corso += 1
+        return 0.0
+
+    @staticmethod
+    def _attesa_entro(attesa: float, limite: Optional[float]) -> Optional[float]:
+        """
+        Secondi da attendere prima di riprovare, senza superare il limite.
+
+        Returns:
+            float | None: L'attesa; None per attendere senza limite un posto libero.
+
+        Raises:
+            PermessoNonDisponibile: Se il limite è già superato o l'attesa necessaria lo supera.
+        """
+        if limite is None:
+            return None if attesa == math.inf else attesa
+        residuo = limite - time.monotonic()
+        if residuo <= 0 or (attesa != math.inf and attesa > residuo):
+            raise PermessoNonDisponibile(f"Nessun permesso disponibile entro {max(0.0, residuo):.1f} s")
+        return min(attesa, residuo)
+
+    def acquisisci(self, timeout: Optional[float] = None) -> None:
+        """
+        Attende, bloccando il thread, un permesso per una nuova richiesta.
+
+        Args:
+            timeout (float, optional): Secondi massimi di attesa. Default: nessun limite.
+
+        Raises:
+            PermessoNonDisponibile: Appena è chiaro che il permesso non arriverà entro `timeout`,
+                ad esempio per una sospensione più lunga del tempo rimasto.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        if timeout is not None and timeout <= 0:
+            raise PermessoNonDisponibile("Tempo per la richiesta esaurito")
+        with self._condizione:
+            while True:
+                attesa = self._prova_ad_acquisire()
+                if not attesa:
+                    return
+                self._condizione.wait(self._attesa_entro(attesa, limite))
+
+    async def acquisisci_async(self, timeout: Optional[float] = None) -> None:
+        """Versione asincrona di `acquisisci`: l'attesa non blocca l'event loop."""
+        loop = asyncio.get_running_loop()
+        limite = None if timeout is None else time.monotonic() + timeout
+        if timeout is not None and timeout <= 0:
+            raise PermessoNonDisponibile("Tempo per la richiesta esaurito")
+        while True:
+            with self._condizione:
+                attesa = self._prova_ad_acquisire()
+                if not attesa:
+                    return
+                attesa = self._attesa_entro(attesa, limite)
+                future = loop.create_future()
+                attesa_async = (loop, future)
+                self._attese_async.add(attesa_async)
+            try:
+                await asyncio.wait({future}, timeout=attesa)
+            finally:
+                with self._condizione:
+                    self._attese_async.discard(attesa_async)
+
+    def rilascia(self, successo: bool = True, sovraccarico: bool = False, pausa: Optional[float] = None) -> None:
+        """
+        Restituisce il permesso e aggiorna il limite di concorrenza con l'esito della richiesta.
+
+        Args:
+            successo (bool): La richiesta è riuscita; alza il limite.
+            sovraccarico (bool): Il servizio ha segnalato sovraccarico (429, 503, timeout); dimezza il limite.
+            pausa (float, optional): Secondi durante i quali non devono partire nuove richieste.
+        """
+        with self._condizione:
+            self.in_corso -= 1
+            adesso = time.monotonic()
+            if sovraccarico:
+                if adesso - self._ultima_riduzione >= self.intervallo_riduzione:
+                    self.limite = max(float(self.concorrenza_minima), self.limite / 2)
+                    self._ultima_riduzione = adesso
+            elif successo:
+                self.limite = min(float(self.concorrenza_massima), self.limite + 1 / self.limite)
+            if pausa:
+                self._sospeso_fino = max(self._sospeso_fino, adesso + pausa)
+            self._sveglia()
+
+    def sospendi(self, secondi: float) -> None:
+        """Impedisce nuove richieste per `secondi` secondi."""
+        with self._condizione:
+            self._sospeso_fino = max(self._sospeso_fino, time.monotonic() + secondi)
+
+    def _sveglia(self) -> None:
+        """Sveglia thread e coroutine in attesa, che riproveranno ad acquisire. Va chiamata con il lock."""
+        self._condizione.notify_all()
+        for loop, future in self._attese_async:
+            try:
+                loop.call_soon_threadsafe(_completa_se_in_attesa, future)
+            except RuntimeError:
+                # Loop già chiuso: nessuno sta più attendendo
+                pass
+        self._attese_async.clear()
+
+    def statistiche(self) -> Dict[str, Any]:
+        """Restituisce il limite di concorrenza corrente, le richieste in corso e la pausa residua."""
+        with self._condizione:
+            return {
+                "limite_concorrenza": round(self.limite, 2),
+                "in_corso": self.in_corso,
+                "pausa_residua": max(0.0, round(self._sospeso_fino - time.monotonic(), 3))
+            }
+
+
+def _completa_se_in_attesa(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
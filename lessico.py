@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lessici usati dall'analisi della chiarezza dei prompt.
+
+I termini ambigui e le espressioni vaghe sono definiti in file JSON: quello
+incluso in `risorse/` più eventuali file aggiuntivi con termini di dominio.
+Il lessico viene compilato una sola volta in un'unica espressione regolare,
+strutturata ad albero di prefissi, così il costo della ricerca su un testo
+non cresce con il numero di termini.
+"""
+
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+PERCORSO_LESSICO_PREDEFINITO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "risorse", "lessico_chiarezza.json"
+)
+
+# Categorie di termini riconosciute nei file del lessico
+CATEGORIE = ("parole_ambigue", "espressioni_vaghe")
+
+# Apostrofo nel testo sanitizzato: `html.escape` lo converte in un'entità
+_APOSTROFO = r"(?:['’]|&\#x27;|&\#39;)"
+_RE_APOSTROFO = re.compile(r"['’]|&#x27;|&#39;")
+
+
+def normalizza_termine(termine: str) -> str:
+    """Forma canonica di un termine: minuscolo, apostrofo semplice, spazi singoli."""
+    return " ".join(_RE_APOSTROFO.sub("'", termine).lower().split())
+
+
+def _albero_in_regex(termini: Iterable[str]) -> str:
+    """
+    Compila i termini in un'alternativa annidata che condivide i prefissi comuni.
+
+    Ad esempio "si dice che" e "si suppone" diventano `si\\s+(?:dice\\s+che|suppone)`.
+    """
+    albero: Dict[str, dict] = {}
+    for termine in termini:
+        nodo = albero
+        for carattere in termine:
+            nodo = nodo.setdefault(carattere, {})
+        nodo[""] = {}
+
+    def simbolo(carattere: str) -> str:
+        if carattere == " ":
+            return r"\s+"
+        if carattere == "'":
+            return _APOSTROFO
+        return re.escape(carattere)
+
+    def visita(nodo: dict) -> str:
+        finale = "" in nodo
+        rami = [simbolo(carattere) + visita(figlio) for carattere, figlio in sorted(nodo.items()) if carattere]
+        if not rami:
+            return ""
+        if len(rami) == 1 and not finale:
+            return rami[0]
+        gruppo = "(?:" + "|".join(rami) + ")"
+        # Il quantificatore avido preferisce il termine più lungo
+        return gruppo + "?" if finale else gruppo
+
+    return visita(albero)
+
+
+class Corrispondenza(NamedTuple):
+    """Un termine del lessico trovato nel testo."""
+    termine: str
+    categoria: str
+    offset: int
+    lunghezza: int
+
+
+class LessicoChiarezza:
+    """
+    Lessico compilato di termini ambigui ed espressioni vaghe.
+
+    I termini sono confrontati a parole intere, senza distinzione tra
+    maiuscole e minuscole e indipendentemente dalla punteggiatura che li
+    circonda; gli spazi interni possono essere multipli e l'apostrofo può
+    essere già convertito in entità HTML.
+    """
+
+    def __init__(self, termini: Dict[str, Iterable[str]]):
+        """
+        Compila il lessico.
+
+        Args:
+            termini (dict): Per ogni categoria di `CATEGORIE`, l'elenco dei termini.
+
+        Raises:
+            ValueError: Se una categoria non è supportata.
+        """
+        categorie_sconosciute = set(termini) - set(CATEGORIE)
+        if categorie_sconosciute:
+            raise ValueError(f"Categorie del lessico non supportate: {', '.join(sorted(categorie_sconosciute))}")
+
+        self.categoria_per_termine: Dict[str, str] = {}
+        for categoria in CATEGORIE:
+            for termine in termini.get(categoria, ()):
+                normalizzato = normalizza_termine(termine)
+                if normalizzato:
+                    self.categoria_per_termine[normalizzato] = categoria
+
+        self.termini: Dict[str, frozenset] = {
+            categoria: frozenset(t for t, c in self.categoria_per_termine.items() if c == categoria)
+            for categoria in CATEGORIE
+        }
+        self.versione = hashlib.blake2b(
+            json.dumps(sorted(self.categoria_per_termine.items()), ensure_ascii=False).encode("utf-8"),
+            digest_size=8
+        ).hexdigest()
+
+        if self.categoria_per_termine:
+            albero = _albero_in_regex(self.categoria_per_termine)
+            self._regex = re.compile(rf"(?<!\w)(?:{albero})(?!\w)", re.IGNORECASE)
+        else:
+            self._regex = None
+
+    @classmethod
+    def da_file(cls, percorsi: Iterable[str]) -> "LessicoChiarezza":
+        """
+        Carica e unisce i lessici contenuti nei file JSON indicati.
+
+        Args:
+            percorsi (iterable): I file JSON, con una lista di termini per categoria.
+
+        Returns:
+            LessicoChiarezza: Il lessico compilato.
+        """
+        termini: Dict[str, List[str]] = {}
+        for percorso in percorsi:
+            with open(percorso, encoding="utf-8") as file:
+                for categoria, elenco in json.load(file).items():
+                    termini.setdefault(categoria, []).extend(elenco)
+        return cls(termini)
+
+    def cerca(self, testo: str) -> List[Corrispondenza]:
+        """
+        Trova tutte le occorrenze dei termini del lessico con un'unica scansione del testo.
+
+        Args:
+            testo (str): Il testo da esaminare.
+
+        Returns:
+            list: Le corrispondenze, in ordine di posizione.
+        """
+        if self._regex is None:
+            return []
+        corrispondenze = []
+        for match in self._regex.finditer(testo):
+            termine = normalizza_termine(match.group())
+            # Alcune lettere coincidono ignorando le maiuscole ma non una volta normalizzate
+            categoria = self.categoria_per_termine.get(termine)
+            if categoria is not None:
+                corrispondenze.append(Corrispondenza(termine, categoria, match.start(), match.end() - match.start()))
+        return corrispondenze
+
+    def conta(self, corrispondenze: Iterable[Corrispondenza]) -> Dict[str, int]:
+        """Restituisce il numero di occorrenze per categoria."""
+        conteggi = dict.fromkeys(CATEGORIE, 0)
+        for corrispondenza in corrispondenze:
+            conteggi[corrispondenza.categoria] += 1
+        return conteggi
+
+
+@lru_cache(maxsize=8)
+def carica_lessico_chiarezza(percorsi_aggiuntivi: Tuple[str, ...] = ()) -> LessicoChiarezza:
+    """
+    Restituisce il lessico predefinito esteso con i file aggiuntivi, compilato una volta per processo.
+
+    Args:
+        percorsi_aggiuntivi (tuple): File JSON con termini di dominio.
+
+    Returns:
+        LessicoChiarezza: Il lessico compilato e condiviso.
+    """
+    return LessicoChiarezza.da_file((PERCORSO_LESSICO_PREDEFINITO, *percorsi_aggiuntivi))
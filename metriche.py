@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Metriche del Prompt Perfezionatore in formato testuale Prometheus.
+
+Contatori e istogrammi sono aggiornati sotto lock, con un costo di pochi
+microsecondi per osservazione, e possono restare attivi in produzione.
+`cronometro` misura una fase dell'elaborazione e, se la richiesta corrente
+sta raccogliendo i propri tempi con `raccogli_tempi`, li registra anche lì.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Limiti superiori dei bucket degli istogrammi di durata, in secondi
+LIMITI_DURATA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_valore(valore: str) -> str:
+    return str(valore).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatta_etichette(nomi: Sequence[str], valori: Sequence[str], extra: str = "") -> str:
+    coppie = [f'{nome}="{_escape_valore(valore)}"' for nome, valore in zip(nomi, valori)]
+    if extra:
+        coppie.append(extra)
+    return "{" + ",".join(coppie) + "}" if coppie else ""
+
+
+class Contatore:
+    """Contatore monotono, con etichette opzionali."""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, descrizione: str, etichette: Sequence[str] = ()):
+        self.nome = nome
+        self.descrizione = descrizione
+        self.etichette = tuple(etichette)
+        self._lock = threading.Lock()
+        self._valori: Dict[Tuple[str, ...], float] = {}
+
+    def incrementa(self, quantita: float = 1, **etichette: str) -> None:
+        """Incrementa il contatore per la combinazione di etichette indicata."""
+        chiave = tuple(etichette.get(nome, "") for nome in self.etichette)
+        with self._lock:
+            self._valori[chiave] = self._valori.get(chiave, 0) + quantita
+
+    def valore(self, **etichette: str) -> float:
+        """Restituisce il valore corrente per la combinazione di etichette indicata."""
+        chiave = tuple(etichette.get(nome, "") for nome in self.etichette)
+        with self._lock:
+            return self._valori.get(chiave, 0)
+
+    def esporta(self) -> List[str]:
+        with self._lock:
+            valori = sorted(self._valori.items())
+        if not valori and not self.etichette:
+            # Un contatore senza etichette è esportato anche prima del primo incremento
+            valori = [((), 0)]
+        return [f"{self.nome}{_formatta_etichette(self.etichette, chiave)} {valore}" for chiave, valore in valori]
+
+
+class Istogramma:
+    """Istogramma a bucket fissi, con etichette opzionali."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descrizione: str, etichette: Sequence[str] = (),
+                 limiti: Sequence[float] = LIMITI_DURATA):
+        self.nome = nome
+        self.descrizione = descrizione
+        self.etichette = tuple(etichette)
+        self.limiti = tuple(sorted(limiti))
+        self._lock = threading.Lock()
+        # Per ogni combinazione di etichette: conteggi per bucket (l'ultimo è +Inf) e somma
+        self._serie: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def osserva(self, valore: float, **etichette: str) -> None:
+        """Registra un'osservazione."""
+        chiave = tuple(etichette.get(nome, "") for nome in self.etichette)
+        indice = bisect.bisect_left(self.limiti, valore)
+        with self._lock:
+            serie = self._serie.get(chiave)
+            if serie is None:
+                serie = self._serie[chiave] = ([0] * (len(self.limiti) + 1), [0.0])
+            serie[0][indice] += 1
+            serie[1][0] += valore
+
+    def esporta(self) -> List[str]:
+        with self._lock:
+            serie = sorted((chiave, list(conteggi), somma[0]) for chiave, (conteggi, somma) in self._serie.items())
+        righe = []
+        for chiave, conteggi, somma in serie:
+            cumulato = 0
+            for limite, conteggio in zip((*self.limiti, "+Inf"), conteggi):
+                cumulato += conteggio
+                etichette = _formatta_etichette(self.etichette, chiave, 'le="' + str(limite) + '"')
+                righe.append(f"{self.nome}_bucket{etichette} {cumulato}")
+            righe.append(f"{self.nome}_sum{_formatta_etichette(self.etichette, chiave)} {somma}")
+            righe.append(f"{self.nome}_count{_formatta_etichette(self.etichette, chiave)} {cumulato}")
+        return righe
+
+
+class RegistroMetriche:
+    """Insieme delle metriche esportate dal processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metriche: Dict[str, object] = {}
+
+    def _registra(self, metrica):
+        with self._lock:
+            return self._metriche.setdefault(metrica.nome, metrica)
+
+    def contatore(self, nome: str, descrizione: str, etichette: Sequence[str] = ()) -> Contatore:
+        """Restituisce il contatore con questo nome, creandolo se non esiste."""
+        return self._registra(Contatore(nome, descrizione, etichette))
+
+    def istogramma(self, nome: str, descrizione: str, etichette: Sequence[str] = (),
+                   limiti: Sequence[float] = LIMITI_DURATA) -> Istogramma:
+        """Restituisce l'istogramma con questo nome, creandolo se non esiste."""
+        return self._registra(Istogramma(nome, descrizione, etichette, limiti))
+
+    def esporta(self) -> str:
+        """Restituisce tutte le metriche nel formato testuale di Prometheus."""
+        with self._lock:
+            metriche = list(self._metriche.values())
+        righe = []
+        for metrica in metriche:
+            righe.append(f"# HELP {metrica.nome} {metrica.descrizione}")
+            righe.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            righe.extend(metrica.esporta())
+        return "\n".join(righe) + "\n"
+
+
+# Registro condiviso dal processo
+REGISTRO = RegistroMetriche()
+
+DURATA_FASI = REGISTRO.istogramma(
+    "prompt_perfezionatore_fase_secondi", "Durata delle fasi dell'elaborazione", ("fase",)
+)
+
+# Tempi per fase della richiesta corrente, se la richiesta li sta raccogliendo
+_tempi_richiesta: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "tempi_richiesta", default=None
+)
+# Più thread della stessa richiesta (ad esempio le sezioni di un prompt lungo) sommano nello stesso dizionario
+_lock_tempi = threading.Lock()
+
+
+@contextmanager
+def cronometro(fase: str) -> Iterator[None]:
+    """
+    Misura la durata del blocco e la registra come fase dell'elaborazione.
+
+    Args:
+        fase (str): Il nome della fase (ad esempio "spacy" o "deepseek").
+    """
+    inizio = time.perf_counter()
+    try:
+        yield
+    finally:
+        durata = time.perf_counter() - inizio
+        DURATA_FASI.osserva(durata, fase=fase)
+        tempi = _tempi_richiesta.get()
+        if tempi is not None:
+            with _lock_tempi:
+                tempi[fase] = round(tempi.get(fase, 0.0) + durata, 6)
+
+
+@contextmanager
+def raccogli_tempi(attivo: bool = True) -> Iterator[Optional[Dict[str, float]]]:
+    """
+    Raccoglie i tempi delle fasi eseguite nel blocco, anche in altri thread.
+
+    Per le funzioni eseguite in un executor il contesto va propagato con
+    `contextvars.copy_context().run`.
+
+    Args:
+        attivo (bool): Se False il blocco non raccoglie nulla e restituisce None.
+
+    Yields:
+        dict | None: I secondi spesi per fase, aggiornati man mano.
+    """
+    if not attivo:
+        yield None
+        return
+    tempi: Dict[str, float] = {}
+    token = _tempi_richiesta.set(tempi)
+    try:
+        yield tempi
+    finally:
+        _tempi_richiesta.reset(token)
+
+
+class _GestoreMetriche(BaseHTTPRequestHandler):
+    registro = REGISTRO
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = self.registro.esporta().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        # Le richieste di scraping non vanno nel log dell'applicazione
+        pass
+
+
+def avvia_server_metriche(porta: int, indirizzo: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Avvia in un thread separato il server HTTP che espone `/metrics`.
+
+    Args:
+        porta (int): La porta di ascolto.
+        indirizzo (str): L'indirizzo di ascolto. Default: solo locale.
+
+    Returns:
+        ThreadingHTTPServer: Il server avviato; `shutdown()` lo ferma.
+    """
+    server = ThreadingHTTPServer((indirizzo, porta), _GestoreMetriche)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metriche", daemon=True).start()
+    return server
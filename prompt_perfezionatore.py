@@ -16,20 +16,37 @@ Data: 14/05/2025
 import os
 import re
 import json
-import gradio as gr
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-import spacy
 import time
 import logging
 import hashlib
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import threading
+import asyncio
+import contextvars
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from tenacity import retry, retry_if_exception, wait_random_exponential
+from tenacity.wait import wait_base
 from logging.handlers import RotatingFileHandler
 import html
-from typing import Dict, List, Any, Optional, Union
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from collections import Counter
+from contextlib import aclosing
+from functools import cached_property, lru_cache, partial, wraps
+from typing import Dict, Iterable, Iterator, List, Any, Literal, NamedTuple, Optional, Tuple, Union
 from pydantic import Field
 from pydantic_settings import BaseSettings
-from cachetools import TTLCache
+from cachetools import LRUCache
+from cache_risultati import BackendCache, crea_backend_cache
+from concorrenza import LimitatoreAdattivo, SingleFlight
+from lessico import LessicoChiarezza, carica_lessico_chiarezza
+from struttura import SezioneCodice, analizza_struttura, descrivi_struttura, dividi_in_sezioni
+from analisi_incrementale import AnalizzatoreIncrementale
+from metriche import REGISTRO as REGISTRO_METRICHE, cronometro, raccogli_tempi
+from similarita import FirmaMinHash, IndiceSimilarita, QuasiDuplicato, firma_minhash, normalizza_testo
 try:
     from spellchecker import SpellChecker
     spellchecker_disponibile = True
@@ -48,17 +65,54 @@ class Settings(BaseSettings):
     
     # Limiti e timeout
     max_input_length: int = 10000
-    api_timeout: int = 30
+    long_prompt_threshold: int = 4000  # Da questa lunghezza il prompt viene migliorato per sezioni (0 per disattivare)
+    long_prompt_section_size: int = 2500  # Lunghezza massima di una sezione di un prompt lungo
+    long_prompt_parallel_calls: int = 4  # Sezioni di uno stesso prompt migliorate in parallelo
+    api_timeout: int = 30  # Timeout di lettura della risposta
+    api_connect_timeout: float = 5.0  # Timeout di connessione
     max_retry_attempts: int = 3
+    deepseek_deadline: float = 60.0  # Tempo massimo per una chiamata a DeepSeek, tentativi e attese compresi
+    deepseek_rate_limit: float = 0.0  # Richieste al secondo verso DeepSeek (0 per nessun limite)
+    deepseek_rate_burst: int = 10  # Richieste che possono partire insieme dopo una pausa
+    deepseek_initial_concurrency: int = 8  # Chiamate contemporanee ammesse all'avvio
+    deepseek_max_concurrency: int = 64  # Limite massimo della concorrenza adattiva verso DeepSeek
+    http_pool_size: int = 10  # Connessioni keep-alive mantenute verso l'API
+    http_async_max_connections: int = 200  # Richieste asincrone contemporanee verso l'API
+    analysis_workers: int = 4  # Thread per l'analisi spaCy nel percorso asincrono
+    analysis_batch_size: int = 64  # Testi per batch di nlp.pipe nell'analisi in blocco
+    analysis_processes: int = 1  # Processi di nlp.pipe nell'analisi in blocco
+    analysis_profile: Literal["fast", "full"] = "full"  # "fast": solo token e frasi, senza parser né NER
+    incremental_analysis_min_chars: int = 2000  # Da questa lunghezza si rianalizzano solo i blocchi modificati (0 per disattivare)
+    incremental_cache_blocks: int = 5000  # Documenti spaCy per blocco mantenuti in memoria
+    gradio_concurrency: int = 16  # Richieste servite in parallelo dalla coda di Gradio
+    admission_slots: int = 8  # Miglioramenti eseguiti in parallelo; gli altri attendono in coda
+    admission_queue_size: int = 32  # Richieste in attesa oltre le quali le nuove vengono rifiutate
+    admission_deadline_interactive: float = 20.0  # Secondi entro cui una richiesta interattiva deve completarsi
+    admission_deadline_batch: float = 300.0  # Secondi entro cui una richiesta batch deve completarsi
+    live_analysis_debounce: float = 0.3  # Pausa di digitazione, in secondi, prima dell'analisi rapida
+    live_analysis_budget: float = 0.25  # Tempo massimo, in secondi, per l'analisi rapida
+    metrics_port: int = 0  # Porta dell'endpoint /metrics locale (0 per disattivarlo)
+    metrics_in_results: bool = False  # Aggiunge i tempi per fase all'analisi di ogni risultato
     
     # Configurazioni cache
+    cache_backend: str = "memoria"  # "memoria" (per processo) oppure "sqlite" (persistente, condivisa)
     cache_size: int = 100
     cache_ttl: int = 3600  # 1 ora in secondi
+    cache_sqlite_path: str = "cache_risultati.sqlite3"
+    cache_max_bytes: int = 50 * 1024 * 1024  # Limite di dimensione per la cache persistente
+    near_duplicate_threshold: float = 0  # Similarità minima (Jaccard) con un prompt già migliorato, ad es. 0.9 (0: disattivata)
+    near_duplicate_mode: Literal["riusa", "semina"] = "semina"  # "semina": lo passa a DeepSeek come base (non per sezioni); "riusa": ne restituisce il risultato
+    spell_cache_size: int = 10000  # Correzioni ortografiche memorizzate per lingua
     
     # Parametri API
     deepseek_model: str = "deepseek-chat"
     deepseek_temperature: float = 0.7
     deepseek_max_tokens: int = 2000
+    deepseek_streaming: bool = True  # Mostra il prompt migliorato man mano che viene generato
+    
+    # Analisi linguistica
+    spacy_model: str = "it_core_news_sm"  # Caricato al primo utilizzo, non all'import
+    clarity_lexicon_paths: List[str] = []  # File JSON con termini ambigui e vaghi aggiuntivi
     
     class Config:
         env_file = ".env"
@@ -67,7 +121,215 @@ class Settings(BaseSettings):
 # Istanza delle configurazioni
 settings = Settings()
 
-# Configurazione del logging
+# Metriche del percorso critico; le durate delle fasi sono registrate da `cronometro`
+LETTURE_CACHE = REGISTRO_METRICHE.contatore(
+    "prompt_perfezionatore_cache_letture_totale", "Letture della cache dei risultati per esito", ("esito",)
+)
+RISPOSTE_DEEPSEEK = REGISTRO_METRICHE.contatore(
+    "prompt_perfezionatore_deepseek_risposte_totale", "Risposte dell'API DeepSeek per esito", ("esito",)
+)
+TENTATIVI_DEEPSEEK = REGISTRO_METRICHE.contatore(
+    "prompt_perfezionatore_deepseek_tentativi_ripetuti_totale", "Chiamate a DeepSeek ripetute dopo un errore"
+)
+JSON_NON_VALIDI = REGISTRO_METRICHE.contatore(
+    "prompt_perfezionatore_json_non_valido_totale", "Risposte di DeepSeek con contenuto JSON non valido"
+)
+QUASI_DUPLICATI = REGISTRO_METRICHE.contatore(
+    "prompt_perfezionatore_quasi_duplicati_totale",
+    "Prompt migliorati a partire dal risultato di un prompt quasi identico, per modalità",
+    ("modalita",)
+)
+
+
+def _registra_tentativo(retry_state) -> None:
+    """Callback di tenacity: conta i tentativi ripetuti verso DeepSeek."""
+    TENTATIVI_DEEPSEEK.incrementa()
+
+# Stati HTTP per cui ha senso ripetere la richiesta; 429 e 503 indicano anche sovraccarico
+STATI_RITENTABILI = frozenset({408, 429, 500, 502, 503, 504})
+STATI_SOVRACCARICO = frozenset({429, 503})
+
+def errore_ritentabile(errore: BaseException) -> bool:
+    """
+    Classifica un errore della chiamata a DeepSeek.
+    
+    Sono ritentabili gli errori di rete, i timeout e gli stati in
+    `STATI_RITENTABILI`; gli altri errori HTTP (400, 401, 403, ...) e
+    quelli di configurazione sono definitivi.
+    
+    Args:
+        errore (BaseException): L'errore sollevato da requests o httpx.
+        
+    Returns:
+        bool: True se la richiesta può essere ripetuta.
+    """
+    if isinstance(errore, (requests.exceptions.HTTPError, httpx.HTTPStatusError)):
+        return errore.response is not None and errore.response.status_code in STATI_RITENTABILI
+    if isinstance(errore, httpx.UnsupportedProtocol):
+        return False
+    return isinstance(errore, (
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError
+    ))
+
+def secondi_retry_after(headers) -> Optional[float]:
+    """
+    Legge l'header Retry-After, espresso in secondi o come data HTTP.
+    
+    Returns:
+        float | None: I secondi da attendere, oppure None se l'header manca o non è valido.
+    """
+    valore = headers.get("Retry-After")
+    if not valore:
+        return None
+    try:
+        return max(0.0, float(valore))
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valore)
+    except (TypeError, ValueError):
+        return None
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return max(0.0, (data - datetime.now(timezone.utc)).total_seconds())
+
+def _retry_after_errore(errore: Optional[BaseException]) -> Optional[float]:
+    risposta = getattr(errore, "response", None)
+    if risposta is None:
+        return None
+    return secondi_retry_after(risposta.headers)
+
+# Istante (time.monotonic) entro cui la chiamata a DeepSeek in corso deve concludersi, tentativi compresi
+_scadenza_deepseek: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("scadenza_deepseek", default=None)
+
+def _secondi_rimanenti() -> float:
+    """Secondi che restano alla chiamata a DeepSeek in corso prima della sua scadenza."""
+    scadenza = _scadenza_deepseek.get()
+    if scadenza is None:
+        return settings.deepseek_deadline
+    return scadenza - time.monotonic()
+
+def _timeout_lettura() -> float:
+    """Timeout di lettura del tentativo corrente: mai oltre la scadenza della chiamata."""
+    return max(0.01, min(float(settings.api_timeout), _secondi_rimanenti()))
+
+def _entro_scadenza(funzione):
+    """
+    Decoratore delle chiamate a DeepSeek: fissa la scadenza `settings.deepseek_deadline`.
+    
+    Va applicato sopra `_politica_tentativi`, così la scadenza vale per
+    l'intera chiamata: attese del limitatore, tentativi e pause comprese.
+    """
+    if asyncio.iscoroutinefunction(funzione):
+        @wraps(funzione)
+        async def con_scadenza_async(*args, **kwargs):
+            token = _scadenza_deepseek.set(time.monotonic() + settings.deepseek_deadline)
+            try:
+                return await funzione(*args, **kwargs)
+            finally:
+                _scadenza_deepseek.reset(token)
+        return con_scadenza_async
+    
+    @wraps(funzione)
+    def con_scadenza(*args, **kwargs):
+        token = _scadenza_deepseek.set(time.monotonic() + settings.deepseek_deadline)
+        try:
+            return funzione(*args, **kwargs)
+        finally:
+            _scadenza_deepseek.reset(token)
+    return con_scadenza
+
+class AttesaRetryAfter(wait_base):
+    """
+    Attesa di tenacity tra i tentativi verso DeepSeek.
+    
+    Rispetta il Retry-After della risposta; in sua assenza usa un backoff
+    esponenziale con jitter completo, così i client che hanno fallito
+    insieme non riprovano tutti nello stesso istante. L'attesa non va mai
+    oltre la scadenza della chiamata (`settings.deepseek_deadline`).
+    """
+    
+    def __init__(self, riserva: wait_base = wait_random_exponential(multiplier=0.5, max=10)):
+        self.riserva = riserva
+    
+    def __call__(self, retry_state) -> float:
+        attesa = _retry_after_errore(retry_state.outcome.exception())
+        if attesa is None:
+            attesa = self.riserva(retry_state)
+        return max(0.0, min(attesa, _secondi_rimanenti()))
+
+def _interrompi_tentativi(retry_state) -> bool:
+    """
+    Condizione di arresto di tenacity: tentativi esauriti o scadenza della chiamata.
+    
+    Si rinuncia subito anche quando il Retry-After ricevuto supera il tempo
+    rimasto: attenderlo non porterebbe a una risposta entro la scadenza.
+    """
+    if retry_state.attempt_number >= settings.max_retry_attempts:
+        return True
+    rimanente = _secondi_rimanenti()
+    attesa = _retry_after_errore(retry_state.outcome.exception())
+    return rimanente <= 0 or (attesa is not None and attesa >= rimanente)
+
+def _politica_tentativi():
+    """Decoratore di tenacity condiviso dalle chiamate a DeepSeek."""
+    return retry(
+        stop=_interrompi_tentativi,
+        wait=AttesaRetryAfter(),
+        retry=retry_if_exception(errore_ritentabile),
+        before_sleep=_registra_tentativo,
+        reraise=True
+    )
+
+# Limitatore condiviso da tutte le chiamate a DeepSeek del processo
+_limitatore_deepseek: Optional[LimitatoreAdattivo] = None
+_lock_limitatore = threading.Lock()
+
+def get_limitatore_deepseek() -> LimitatoreAdattivo:
+    """
+    Restituisce il limitatore delle chiamate a DeepSeek, creandolo al primo utilizzo.
+    
+    Returns:
+        LimitatoreAdattivo: Token bucket e concorrenza adattiva configurati da `settings`.
+    """
+    global _limitatore_deepseek
+    if _limitatore_deepseek is None:
+        with _lock_limitatore:
+            if _limitatore_deepseek is None:
+                _limitatore_deepseek = LimitatoreAdattivo(
+                    richieste_al_secondo=settings.deepseek_rate_limit,
+                    raffica=settings.deepseek_rate_burst,
+                    concorrenza_iniziale=settings.deepseek_initial_concurrency,
+                    concorrenza_massima=settings.deepseek_max_concurrency
+                )
+    return _limitatore_deepseek
+
+def _rilascia_permesso(limitatore: LimitatoreAdattivo, risposta=None, errore: Optional[BaseException] = None) -> None:
+    """
+    Comunica al limitatore l'esito di una chiamata a DeepSeek.
+    
+    I 429, i 503 e i timeout dimezzano la concorrenza; un Retry-After
+    sospende tutte le nuove chiamate, non solo quella che lo ha ricevuto.
+    La sospensione non supera `settings.deepseek_deadline`: un Retry-After
+    di ore non deve bloccare il processo, e le chiamate che non possono
+    attendere tanto falliscono subito invece di restare in attesa.
+    """
+    if risposta is not None:
+        stato = risposta.status_code
+        sovraccarico = stato in STATI_SOVRACCARICO
+        pausa = secondi_retry_after(risposta.headers) if sovraccarico else None
+        limitatore.rilascia(
+            successo=stato < 400,
+            sovraccarico=sovraccarico,
+            pausa=None if pausa is None else min(pausa, settings.deepseek_deadline)
+        )
+    else:
+        limitatore.rilascia(
+            successo=False,
+            sovraccarico=isinstance(errore, (requests.exceptions.Timeout, httpx.TimeoutException))
+        )
+
+# Configurazione del logging, chiamata dagli entrypoint (app.py, batch.py) e non all'import
 def setup_logging():
     logging.basicConfig(
         level=logging.INFO,
@@ -79,35 +341,263 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-# Inizializzazione del logger
-logger = setup_logging()
+logger = logging.getLogger(__name__)
 
 # Caricamento delle variabili d'ambiente
 load_dotenv()
 
-# Caricamento del modello spaCy per l'analisi linguistica
-try:
-    nlp = spacy.load("it_core_news_sm")
-    logger.info("Modello spaCy caricato con successo.")
-except OSError:
-    logger.error("Modello spaCy per l'italiano non trovato. Installalo con 'python -m spacy download it_core_news_sm'")
-    nlp = None
+# Prompt di sistema per il miglioramento
+SYSTEM_PROMPT_MIGLIORAMENTO = """
+Sei un esperto di prompt engineering in italiano che aiuta a migliorare i prompt per modelli di linguaggio.
+Per ogni prompt che ricevi, devi:
+1. Migliorarlo in termini di chiarezza, precisione e struttura
+2. Fornire 3-5 suggerimenti specifici per rendere il prompt ancora più efficace
+3. Spiegare brevemente le modifiche principali apportate
+
+Rispondi in formato JSON con i seguenti campi:
+{
+    "prompt_migliorato": "il prompt migliorato",
+    "suggerimenti": ["suggerimento 1", "suggerimento 2", ...],
+    "spiegazione": "spiegazione delle modifiche"
+}
+
+Principi da seguire nel miglioramento:
+- Chiarezza: elimina ambiguità e vaghezza
+- Completezza: assicurati che tutti i dettagli necessari siano inclusi
+- Struttura: migliora la formattazione e l'organizzazione logica
+- Specificità: rendi più specifiche richieste e requisiti
+- Obiettivi: esplicita gli obiettivi e i risultati attesi
+- Contesto: aggiungi contesto dove utile
+
+Non modificare la lingua originale del prompt e mantieni la stessa sostanza e richiesta.
+"""
+
+SYSTEM_PROMPT_SEZIONE = SYSTEM_PROMPT_MIGLIORAMENTO + """
+Il prompt è lungo ed è stato diviso in sezioni, migliorate separatamente e poi ricomposte nell'ordine originale.
+Ricevi una sola sezione: migliora solo quella, senza aggiungere introduzioni, conclusioni o riferimenti
+alle altre sezioni, e conserva titoli, elenchi e blocchi di codice. I suggerimenti riguardano la sezione ricevuta.
+"""
+
+# Suggerimenti dell'API conservati quando i risultati delle sezioni vengono uniti
+MAX_SUGGERIMENTI_SEZIONI = 8
+
+@lru_cache(maxsize=32)
+def versione_system_prompt(system_prompt: str) -> str:
+    """
+    Restituisce un identificativo breve del contenuto di un prompt di sistema.
+    
+    Args:
+        system_prompt (str): Il prompt di sistema.
+        
+    Returns:
+        str: Il digest BLAKE2b del prompt, in esadecimale.
+    """
+    return hashlib.blake2b(system_prompt.encode("utf-8"), digest_size=8).hexdigest()
+
+# Componenti della pipeline spaCy che l'analisi non usa: servono solo frasi
+# (parser), entità (ner) e gli attributi lessicali di stopword e punteggiatura
+_COMPONENTI_SPACY_ESCLUSI = ["morphologizer", "tagger", "lemmatizer", "attribute_ruler"]
+
+# Profili di analisi: "full" esegue tutta la pipeline caricata; "fast" solo
+# la segmentazione in frasi (senter o sentencizer), senza parser né NER
+PROFILI_ANALISI = ("fast", "full")
+_COMPONENTI_FRASI_VELOCI = ("senter", "sentencizer")
+
+# Modello spaCy condiviso dal processo, caricato al primo utilizzo
+_nlp = None
+_nlp_caricato = False
+_lock_nlp = threading.Lock()
+
+def get_nlp():
+    """
+    Restituisce il modello spaCy condiviso, caricandolo al primo utilizzo.
+    
+    Il caricamento avviene una sola volta anche con più thread concorrenti;
+    se il modello non è installato l'errore viene registrato una volta sola.
+    
+    Returns:
+        spacy.Language | None: Il modello, o None se non è disponibile.
+    """
+    global _nlp, _nlp_caricato
+    if not _nlp_caricato:
+        with _lock_nlp:
+            if not _nlp_caricato:
+                import spacy
+                try:
+                    _nlp = _prepara_profili(spacy.load(settings.spacy_model, exclude=_COMPONENTI_SPACY_ESCLUSI))
+                    logger.info("Modello spaCy caricato con successo.")
+                except OSError:
+                    logger.error(f"Modello spaCy per l'italiano non trovato. Installalo con 'python -m spacy download {settings.spacy_model}'")
+                _nlp_caricato = True
+    return _nlp
+
+def imposta_nlp(modello) -> None:
+    """
+    Sostituisce il modello spaCy condiviso, ad esempio con uno già caricato altrove.
+    
+    Il modello viene preparato per i profili di analisi, come quello caricato da `get_nlp`.
+    
+    Args:
+        modello (spacy.Language | None): Il modello da usare.
+    """
+    global _nlp, _nlp_caricato
+    with _lock_nlp:
+        _nlp = _prepara_profili(modello) if modello is not None else None
+        _nlp_caricato = True
+
+def _prepara_profili(modello):
+    """
+    Rende disponibile un componente leggero di segmentazione in frasi per il profilo "fast".
+    
+    I modelli addestrati includono un `senter` disattivato, che viene attivato;
+    altrimenti si aggiunge il `sentencizer` basato sulla punteggiatura.
+    """
+    if "senter" in modello.disabled:
+        modello.enable_pipe("senter")
+    elif not any(nome in modello.pipe_names for nome in _COMPONENTI_FRASI_VELOCI):
+        modello.add_pipe("sentencizer")
+    return modello
+
+def verifica_profilo(profilo: str) -> str:
+    """
+    Verifica che il profilo di analisi esista e lo restituisce.
+    
+    Raises:
+        ValueError: Se il profilo non è tra quelli supportati.
+    """
+    if profilo not in PROFILI_ANALISI:
+        raise ValueError(f"Profilo di analisi non supportato: {profilo}. Usa uno tra {', '.join(PROFILI_ANALISI)}.")
+    return profilo
+
+def componenti_esclusi(modello, profilo: str) -> List[str]:
+    """
+    Restituisce i componenti della pipeline da saltare per un profilo di analisi.
+    
+    Args:
+        modello (spacy.Language): Il modello preparato con `_prepara_profili`.
+        profilo (str): "fast" oppure "full".
+        
+    Returns:
+        list: I nomi dei componenti da passare come `disable` a spaCy.
+        
+    Raises:
+        ValueError: Se il profilo non esiste.
+    """
+    nomi = modello.pipe_names
+    if verifica_profilo(profilo) == "fast":
+        veloce = next((nome for nome in _COMPONENTI_FRASI_VELOCI if nome in nomi), None)
+        return [nome for nome in nomi if nome != veloce]
+    # Con il parser le frasi sono già segmentate: il componente veloce è superfluo
+    if "parser" in nomi:
+        return [nome for nome in nomi if nome in _COMPONENTI_FRASI_VELOCI]
+    return []
+
+# Parola alfabetica nel testo sanitizzato. Le entità HTML prodotte da
+# `html.escape` e i token alfanumerici ("x2", "3D") vengono consumati senza
+# cattura. Il primo e il terzo gruppo riconoscono i frammenti attaccati a un
+# apostrofo, che non vanno verificati: le forme elise o troncate ("dell'",
+# "un' altra", "po'") e quelle che iniziano con l'apostrofo ("'sto").
+_RE_PAROLA = re.compile(
+    r"&#?\w+;|\w*\d\w*"
+    r"|((?<=(?<!\w)['’])|(?<=(?<!\w)&\#x27;)|(?<=(?<!\w)&\#39;))?([^\W\d_]+)(['’]|&\#x27;|&\#39;)?"
+)
+
+class ContestoAnalisi:
+    """
+    Contesto condiviso da tutti gli analizzatori di un singolo testo.
+    
+    Il parsing spaCy viene eseguito una sola volta, al primo accesso a `doc`,
+    e le viste derivate (frasi, token, conteggi) vengono calcolate una volta
+    e riutilizzate da complessità, chiarezza, struttura, leggibilità,
+    grammatica e ortografia.
+    """
+    
+    def __init__(self, testo: str, nlp_modello=None, doc=None, profilo: Optional[str] = None):
+        """
+        Inizializza il contesto.
+        
+        Args:
+            testo (str): Il testo (già sanitizzato) da analizzare.
+            nlp_modello: Il modello spaCy da usare per il parsing. Default: il modello globale.
+            doc (spacy.Doc, optional): Un documento già analizzato per lo stesso testo.
+            profilo (str, optional): Il profilo di analisi del parsing. Default: settings.analysis_profile.
+        """
+        self.testo = testo
+        self._nlp = nlp_modello
+        self._doc = doc
+        self.profilo = profilo or settings.analysis_profile
+    
+    @classmethod
+    def da(cls, testo, nlp_modello=None) -> "ContestoAnalisi":
+        """
+        Restituisce un contesto per il testo, riutilizzandolo se già costruito.
+        
+        Args:
+            testo (str | ContestoAnalisi): Il testo o un contesto esistente.
+            nlp_modello: Il modello spaCy da usare se serve creare il contesto.
+            
+        Returns:
+            ContestoAnalisi: Il contesto di analisi.
+        """
+        if isinstance(testo, cls):
+            return testo
+        return cls(testo, nlp_modello)
+    
+    @property
+    def doc(self):
+        """Documento spaCy, analizzato al primo accesso."""
+        if self._doc is None:
+            modello = self._nlp or get_nlp()
+            if modello is None:
+                raise RuntimeError("Modello spaCy non caricato.")
+            self._doc = modello(self.testo, disable=componenti_esclusi(modello, self.profilo))
+        return self._doc
+    
+    @cached_property
+    def frasi(self) -> list:
+        """Frasi del documento."""
+        return list(self.doc.sents)
+    
+    @cached_property
+    def token_parole(self) -> list:
+        """Token che non sono punteggiatura né spazi."""
+        return [token for token in self.doc if not token.is_punct and not token.is_space]
+    
+    @cached_property
+    def conteggio_parole(self) -> Counter:
+        """Conteggio delle parole minuscole, escluse punteggiatura e stopword."""
+        return Counter(token.text.lower() for token in self.token_parole if not token.is_stop)
+    
+    @cached_property
+    def parole_grezze(self) -> List[str]:
+        """Le parole separate da spazi, come in `str.split()`."""
+        return self.testo.split()
+    
+    @cached_property
+    def parole_con_offset(self) -> List[Tuple[str, int]]:
+        """Parole alfabetiche con il relativo offset, ricavate in un'unica scansione del testo."""
+        return [
+            (match.group(2), match.start(2))
+            for match in _RE_PAROLA.finditer(self.testo)
+            if match.group(2) and match.group(1) is None and match.group(3) is None
+        ]
 
-def analisi_grammatica_spacy(testo, nlp):
+def analisi_grammatica_spacy(testo, nlp=None):
     """
     Utilizza spaCy per una verifica grammaticale di base.
     
     Args:
-        testo (str): Il testo da analizzare.
-        nlp: Il modello spaCy caricato.
+        testo (str | ContestoAnalisi): Il testo o il contesto da analizzare.
+        nlp: Il modello spaCy caricato, usato solo se `testo` è una stringa.
         
     Returns:
         dict: Risultati dell'analisi grammaticale.
     """
-    doc = nlp(testo)
+    contesto = ContestoAnalisi.da(testo, nlp)
+    testo = contesto.testo
     
     # Analisi delle frasi
-    frasi = list(doc.sents)
+    frasi = contesto.frasi
     
     # Verifiche di base
     errori = []
@@ -122,18 +612,9 @@ def analisi_grammatica_spacy(testo, nlp):
                 "lunghezza": frase.end_char - frase.start_char
             })
     
-    # Controllo ripetizioni di parole
-    parole = [token.text.lower() for token in doc if not token.is_punct and not token.is_stop]
-    conteggio_parole = {}
-    for parola in parole:
-        if len(parola) > 3:  # Ignora parole molto brevi
-            if parola in conteggio_parole:
-                conteggio_parole[parola] += 1
-            else:
-                conteggio_parole[parola] = 1
-    
-    # Identifica ripetizioni eccessive
-    ripetizioni = [parola for parola, conteggio in conteggio_parole.items() if conteggio > 3]
+    # Controllo ripetizioni di parole (ignora parole molto brevi)
+    ripetizioni = [parola for parola, conteggio in contesto.conteggio_parole.items()
+                   if len(parola) > 3 and conteggio > 3]
     if ripetizioni:
         for parola in ripetizioni:
             errori.append({
@@ -171,17 +652,156 @@ def analisi_grammatica_spacy(testo, nlp):
         "servizio_disponibile": True
     }
 
-def verifica_ortografia(testo, lingua="it_IT"):
+# Lingua predefinita della verifica ortografica, per il preriscaldamento e per le richieste
+LINGUA_ORTOGRAFIA = "it"
+
+def codice_dizionario(lingua: str) -> str:
+    """
+    Converte un codice di lingua ("it_IT", "it-IT", "IT") in quello dei dizionari di PySpellChecker ("it").
+    
+    Args:
+        lingua (str): Il codice della lingua, con o senza regione.
+        
+    Returns:
+        str: Il codice della sola lingua, in minuscolo.
+    """
+    return re.split(r"[_-]", lingua.strip(), maxsplit=1)[0].lower()
+
+class MotoreOrtografico:
+    """
+    Motore ortografico per una lingua, condiviso tra chiamate e thread.
+    
+    Il dizionario di PySpellChecker viene caricato una sola volta, al primo
+    utilizzo; correzioni e candidati (la parte più lenta, basata sulla
+    distanza di edit) sono memorizzati in una cache LRU limitata.
+    """
+    
+    def __init__(self, lingua: str, dimensione_cache: Optional[int] = None):
+        """
+        Inizializza il motore senza caricare il dizionario.
+        
+        Args:
+            lingua (str): Il codice della lingua del dizionario.
+            dimensione_cache (int, optional): Numero massimo di parole in cache.
+                Default: settings.spell_cache_size.
+        """
+        self.lingua = lingua
+        self._spell = None
+        self._errore = None
+        self._lock_inizializzazione = threading.Lock()
+        self._lock_cache = threading.Lock()
+        self._cache = LRUCache(maxsize=dimensione_cache or settings.spell_cache_size)
+    
+    @property
+    def spell(self) -> "SpellChecker":
+        """
+        Restituisce il correttore, caricando il dizionario al primo accesso.
+        
+        Raises:
+            ValueError: Se il dizionario per la lingua non è disponibile.
+        """
+        if self._spell is None:
+            with self._lock_inizializzazione:
+                if self._spell is None:
+                    if self._errore is None:
+                        try:
+                            self._spell = SpellChecker(language=self.lingua)
+                        except ValueError as e:
+                            self._errore = e
+                    if self._errore is not None:
+                        raise self._errore
+        return self._spell
+    
+    def sconosciute(self, parole) -> set:
+        """
+        Restituisce le parole non presenti nel dizionario.
+        
+        Args:
+            parole (iterable): Le parole da verificare.
+            
+        Returns:
+            set: Le parole sconosciute, in minuscolo.
+        """
+        return self.spell.unknown(parole)
+    
+    def correggi(self, parola: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+        """
+        Restituisce la correzione più probabile e le alternative per una parola.
+        
+        Args:
+            parola (str): La parola da correggere.
+            
+        Returns:
+            tuple: (correzione, alternative)
+        """
+        with self._lock_cache:
+            risultato = self._cache.get(parola)
+        if risultato is not None:
+            return risultato
+        
+        spell = self.spell
+        correzione = spell.correction(parola)
+        alternative = tuple(sorted(spell.candidates(parola) or ()))
+        risultato = (correzione, alternative)
+        
+        with self._lock_cache:
+            self._cache[parola] = risultato
+        return risultato
+
+# Motori ortografici condivisi dal processo, uno per lingua
+_motori_ortografici: Dict[str, MotoreOrtografico] = {}
+_lock_motori_ortografici = threading.Lock()
+
+def get_motore_ortografico(lingua: str) -> MotoreOrtografico:
+    """
+    Restituisce il motore ortografico condiviso per la lingua indicata.
+    
+    Args:
+        lingua (str): Il codice della lingua, anche con la regione ("it_IT").
+        
+    Returns:
+        MotoreOrtografico: Il motore, creato alla prima richiesta.
+    """
+    lingua = codice_dizionario(lingua)
+    motore = _motori_ortografici.get(lingua)
+    if motore is None:
+        with _lock_motori_ortografici:
+            motore = _motori_ortografici.setdefault(lingua, MotoreOrtografico(lingua))
+    return motore
+
+def warmup(lingua: str = LINGUA_ORTOGRAFIA) -> None:
+    """
+    Carica in anticipo il modello spaCy e il dizionario ortografico.
+    
+    Pensato per i server, così la prima richiesta non paga il caricamento.
+    
+    Args:
+        lingua (str): La lingua del dizionario ortografico. Default: LINGUA_ORTOGRAFIA.
+    """
+    modello = get_nlp()
+    if modello is not None:
+        # Il primo parsing inizializza le strutture interne della pipeline
+        modello("Avvio.")
+    if spellchecker_disponibile:
+        try:
+            get_motore_ortografico(lingua).spell
+        except ValueError:
+            logger.warning(f"Dizionario ortografico per la lingua '{lingua}' non disponibile.")
+
+def verifica_ortografia(testo, lingua=LINGUA_ORTOGRAFIA):
     """
     Verifica l'ortografia utilizzando PySpellChecker.
     
     Args:
-        testo (str): Il testo da verificare.
-        lingua (str): Il codice della lingua. Default: "it_IT".
+        testo (str | ContestoAnalisi): Il testo o il contesto da verificare.
+        lingua (str): Il codice della lingua. Default: LINGUA_ORTOGRAFIA.
         
     Returns:
         dict: Risultati della verifica ortografica.
     """
+    contesto = ContestoAnalisi.da(testo)
+    testo = contesto.testo
+    
     if not spellchecker_disponibile:
         return {
             "errori": [],
@@ -192,25 +812,21 @@ def verifica_ortografia(testo, lingua="it_IT"):
         }
     
     try:
-        # Inizializza SpellChecker con la lingua italiana
-        spell = SpellChecker(language=lingua)
+        # Motore condiviso: il dizionario viene caricato una sola volta per processo
+        motore = get_motore_ortografico(lingua)
         
-        # Tokenizza il testo in parole
-        parole = testo.split()
+        # Parole e offset provengono dalla stessa scansione, senza punteggiatura attaccata
+        parole = contesto.parole_con_offset
         
-        # Trova parole non corrette
-        parole_errate = spell.unknown(parole)
+        # Un solo controllo sul dizionario per ogni parola distinta
+        parole_errate = motore.sconosciute({parola.lower() for parola, _ in parole})
         
         errori = []
-        for parola in parole_errate:
-            correzione = spell.correction(parola)
-            alternative = spell.candidates(parola)
-            
-            # Indice della parola nel testo originale
-            try:
-                indice = testo.index(parola)
-            except ValueError:
-                indice = 0
+        for parola, indice in parole:
+            minuscola = parola.lower()
+            if minuscola not in parole_errate:
+                continue
+            correzione, alternative = motore.correggi(minuscola)
             
             errori.append({
                 "tipo": "Ortografia",
@@ -224,7 +840,7 @@ def verifica_ortografia(testo, lingua="it_IT"):
         
         # Calcola un punteggio (100 - percentuale di errori)
         if parole:
-            punteggio = 100 - (len(parole_errate) / len(parole) * 100)
+            punteggio = 100 - (len(errori) / len(parole) * 100)
         else:
             punteggio = 100
         
@@ -232,7 +848,9 @@ def verifica_ortografia(testo, lingua="it_IT"):
         suggerimenti = []
         if errori:
             suggerimenti.append(f"Il testo contiene {len(errori)} errori ortografici.")
-            for errore in errori[:3]:  # Limita a 3 suggerimenti
+            # Una parola ripetuta genera un solo suggerimento
+            errori_distinti = {errore["parola"].lower(): errore for errore in reversed(errori)}
+            for errore in list(reversed(errori_distinti.values()))[:3]:  # Limita a 3 suggerimenti
                 suggerimenti.append(f"'{errore['parola']}' potrebbe essere corretto come '{errore['correzione']}'.")
         
         return {
@@ -272,23 +890,28 @@ class GrammarChecker:
         self.ultimo_controllo = None
         self.servizio_disponibile = True
     
-    def verifica_testo(self, testo: str, lingua: str = "it") -> Dict[str, Any]:
+    def verifica_testo(self, testo: Union[str, ContestoAnalisi], lingua: str = LINGUA_ORTOGRAFIA) -> Dict[str, Any]:
         """
         Verifica la grammatica e l'ortografia di un testo utilizzando strumenti locali.
         
         Args:
-            testo (str): Il testo da verificare.
-            lingua (str, optional): Il codice della lingua. Default: "it".
+            testo (str | ContestoAnalisi): Il testo o il contesto di analisi condiviso.
+            lingua (str, optional): Il codice della lingua. Default: LINGUA_ORTOGRAFIA.
             
         Returns:
             dict: Risultato dell'analisi grammaticale.
         """
         try:
+            # Il contesto condiviso evita di ripetere il parsing spaCy
+            contesto = ContestoAnalisi.da(testo)
+            
             # Utilizza spaCy per l'analisi grammaticale di base
-            risultati_spacy = analisi_grammatica_spacy(testo, nlp)
+            with cronometro("grammatica"):
+                risultati_spacy = analisi_grammatica_spacy(contesto)
             
             # Utilizza PySpellChecker per la verifica ortografica
-            risultati_spell = verifica_ortografia(testo, lingua)
+            with cronometro("ortografia"):
+                risultati_spell = verifica_ortografia(contesto, lingua)
             
             # Combina i risultati
             errori_totali = risultati_spacy["errori"] + risultati_spell["errori"]
@@ -356,6 +979,155 @@ class GrammarChecker:
         # Restituisci i suggerimenti già inclusi nei risultati
         return risultati.get("suggerimenti", [])
  
+class RisultatoMiglioramento(NamedTuple):
+    """
+    Risultato immutabile di un miglioramento, restituito a ogni richiesta.
+    
+    Resta compatibile con la tupla restituita in precedenza
+    (prompt_migliorato, suggerimenti, spiegazione, analisi).
+    """
+    prompt_migliorato: str
+    suggerimenti: Tuple[str, ...]
+    spiegazione: str
+    analisi: Dict[str, Any]
+    
+    @classmethod
+    def da_valore(cls, valore) -> "RisultatoMiglioramento":
+        """
+        Ricostruisce il risultato da un valore letto dalla cache.
+        
+        Args:
+            valore (sequence): Il risultato memorizzato, anche come lista JSON.
+            
+        Returns:
+            RisultatoMiglioramento: Il risultato.
+        """
+        prompt_migliorato, suggerimenti, spiegazione, analisi = valore
+        return cls(prompt_migliorato, tuple(suggerimenti), spiegazione, analisi)
+
+class RisultatoErrore(RisultatoMiglioramento):
+    """
+    Risultato di un miglioramento non riuscito, in tutto o in parte.
+    
+    Ha gli stessi campi di `RisultatoMiglioramento`, con un messaggio per
+    l'utente al posto del prompt migliorato; non viene mai salvato in cache
+    e chi elabora i prompt in blocco lo riconosce con `isinstance`.
+    """
+    __slots__ = ()
+
+class EstrattoreCampoJSON:
+    """
+    Estrae in modo incrementale il valore stringa di un campo da un documento
+    JSON ricevuto a frammenti, come nelle risposte in streaming di DeepSeek.
+    
+    Ogni frammento viene esaminato una sola volta: il valore decodificato
+    cresce man mano che arrivano i token, prima che il JSON sia completo.
+    """
+    
+    _ESCAPE = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    
+    def __init__(self, campo: str):
+        """
+        Inizializza l'estrattore.
+        
+        Args:
+            campo (str): Il nome del campo stringa da estrarre.
+        """
+        self._marcatore = re.compile(r'"%s"\s*:\s*"' % re.escape(campo))
+        self._frammenti: List[str] = []
+        self._buffer = ""
+        self._posizione: Optional[int] = None
+        self.valore = ""
+        self.completo = False
+    
+    @property
+    def testo(self) -> str:
+        """Il contenuto completo ricevuto finora."""
+        return "".join(self._frammenti)
+    
+    def aggiungi(self, frammento: str) -> str:
+        """
+        Aggiunge un frammento e restituisce la parte di valore decodificata in più.
+        
+        Args:
+            frammento (str): Il nuovo frammento di testo JSON.
+            
+        Returns:
+            str: I caratteri del valore decodificati grazie a questo frammento.
+        """
+        self._frammenti.append(frammento)
+        if self.completo:
+            return ""
+        self._buffer += frammento
+        
+        if self._posizione is None:
+            match = self._marcatore.search(self._buffer)
+            if not match:
+                return ""
+            self._posizione = match.end()
+        
+        buffer = self._buffer
+        i = self._posizione
+        nuovi = []
+        while i < len(buffer):
+            carattere = buffer[i]
+            if carattere == '"':
+                self.completo = True
+                i += 1
+                break
+            if carattere != '\\':
+                nuovi.append(carattere)
+                i += 1
+                continue
+            # Sequenza di escape: attende il frammento successivo se è incompleta
+            if i + 1 >= len(buffer):
+                break
+            codice_escape = buffer[i + 1]
+            if codice_escape != 'u':
+                nuovi.append(self._ESCAPE.get(codice_escape, codice_escape))
+                i += 2
+                continue
+            if i + 6 > len(buffer):
+                break
+            codice = int(buffer[i + 2:i + 6], 16)
+            if 0xD800 <= codice < 0xDC00:
+                # Coppia surrogata: servono anche i sei caratteri successivi
+                if i + 12 > len(buffer):
+                    break
+                basso = int(buffer[i + 8:i + 12], 16)
+                nuovi.append(chr(0x10000 + ((codice - 0xD800) << 10) + (basso - 0xDC00)))
+                i += 12
+            else:
+                nuovi.append(chr(codice))
+                i += 6
+        
+        # Scarta la parte già decodificata per mantenere la scansione lineare
+        self._buffer = buffer[i:]
+        self._posizione = 0
+        decodificati = "".join(nuovi)
+        self.valore += decodificati
+        return decodificati
+
+def estrai_delta_sse(riga: str) -> Optional[str]:
+    """
+    Estrae il testo generato da una riga di un flusso server-sent events
+    dell'endpoint chat-completions.
+    
+    Args:
+        riga (str): Una riga del flusso SSE.
+        
+    Returns:
+        str | None: Il frammento di contenuto, oppure None per righe senza contenuto.
+    """
+    if not riga.startswith("data:"):
+        return None
+    dati = riga[5:].strip()
+    if not dati or dati == "[DONE]":
+        return None
+    evento = json.loads(dati)
+    scelte = evento.get("choices") or [{}]
+    return scelte[0].get("delta", {}).get("content") or None
+
 class PromptPerfezionatore:
     """
     Classe principale per l'analisi e il miglioramento dei prompt.
@@ -363,67 +1135,325 @@ class PromptPerfezionatore:
     
     def __init__(self):
         """Inizializza l'assistente."""
-        self.ultima_analisi = None
-        self.ultimo_prompt_originale = None
-        self.ultimo_prompt_migliorato = None
-        self.ultimi_suggerimenti = None
-        # Utilizzo di TTLCache invece di dict standard
-        self.cache = TTLCache(maxsize=settings.cache_size, ttl=settings.cache_ttl)
+        # Nessuno stato per richiesta: l'istanza è condivisa da tutti gli utenti e i thread.
+        # Backend di cache configurabile: in memoria o persistente e condiviso tra processi
+        self.cache: BackendCache = crea_backend_cache(
+            settings.cache_backend, settings.cache_size, settings.cache_ttl,
+            percorso_sqlite=settings.cache_sqlite_path, max_byte=settings.cache_max_bytes
+        )
         self.logger = logging.getLogger(__name__)
         self.grammar_checker = GrammarChecker()
+        # Lessico compilato una volta per processo e condiviso tra le istanze
+        self.lessico_chiarezza: LessicoChiarezza = carica_lessico_chiarezza(tuple(settings.clarity_lexicon_paths))
+        # Documenti spaCy per blocco, riutilizzati quando un prompt lungo viene modificato
+        self._analizzatore_incrementale = AnalizzatoreIncrementale(settings.incremental_cache_blocks)
+        # Richieste identiche concorrenti condividono un'unica chiamata all'API
+        self._single_flight = SingleFlight()
+        # Prompt migliorati da questo processo, indicizzati per trovare quelli quasi identici
+        self._indice_simili: Optional[IndiceSimilarita] = None
+        if settings.near_duplicate_threshold > 0:
+            self._indice_simili = IndiceSimilarita(settings.near_duplicate_threshold, settings.cache_size)
+        self.session = self._crea_sessione_http()
+        # Il client asincrono vale solo nell'event loop in cui è stato creato
+        self._client_async: Optional[httpx.AsyncClient] = None
+        self._loop_client_async: Optional[asyncio.AbstractEventLoop] = None
+        self._executor_analisi = ThreadPoolExecutor(
+            max_workers=settings.analysis_workers, thread_name_prefix="analisi"
+        )
+        # Un solo thread, separato, per l'analisi live: le battute superate ancora in coda
+        # vengono annullate prima di partire e non sottraggono thread ai miglioramenti
+        self._executor_live = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analisi_live")
+    
+    def _crea_sessione_http(self) -> requests.Session:
+        """
+        Crea la sessione HTTP persistente usata per le chiamate a DeepSeek.
+        
+        La sessione mantiene un pool di connessioni keep-alive, evitando un
+        nuovo handshake TCP+TLS a ogni richiesta, e imposta gli header una volta sola.
+        
+        Returns:
+            requests.Session: La sessione configurata.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.http_pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Authorization": f"Bearer {settings.deepseek_api_key}",
+            "Content-Type": "application/json"
+        })
+        return session
+    
+    def chiudi(self) -> None:
+        """Chiude la sessione HTTP e le connessioni del pool."""
+        self.session.close()
         
-    def _get_cache_key(self, prompt: str) -> str:
+    def _get_cache_key(self, prompt: str, system_prompt: str = SYSTEM_PROMPT_MIGLIORAMENTO) -> str:
         """
-        Genera una chiave di cache basata sul prompt.
+        Genera una chiave di cache basata sul prompt e sui parametri di generazione.
+        
+        La chiave cambia quando cambiano il modello, la temperatura, il numero
+        massimo di token, il prompt di sistema, il profilo di analisi o il lessico, così un risultato prodotto con
+        una configurazione diversa non viene mai restituito.
         
         Args:
             prompt (str): Il prompt da utilizzare per generare la chiave.
+            system_prompt (str, optional): Il prompt di sistema usato per la generazione.
             
         Returns:
-            str: La chiave di cache (hash MD5 del prompt).
+            str: La chiave di cache (digest BLAKE2b della codifica canonica).
+        """
+        parametri = {
+            "prompt": prompt,
+            "model": settings.deepseek_model,
+            "temperature": settings.deepseek_temperature,
+            "max_tokens": settings.deepseek_max_tokens,
+            "system_prompt": versione_system_prompt(system_prompt),
+            # L'analisi locale fa parte del risultato e del messaggio inviato all'API
+            "profilo_analisi": settings.analysis_profile,
+            "lessico": self.lessico_chiarezza.versione
+        }
+        if self._prompt_lungo(prompt):
+            # Il risultato di un prompt lungo dipende anche da come viene diviso
+            parametri["sezioni"] = {
+                "dimensione": settings.long_prompt_section_size,
+                "system_prompt": versione_system_prompt(SYSTEM_PROMPT_SEZIONE)
+            }
+        canonico = json.dumps(parametri, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.blake2b(canonico.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def statistiche_cache(self) -> Dict[str, Any]:
+        """
+        Restituisce i contatori della cache dei risultati.
+        
+        Returns:
+            dict: hit, miss, evizioni, hit_ratio, numero di voci, richieste
+            deduplicate perché identiche a una già in corso, blocchi
+            riutilizzati dall'analisi incrementale e prompt indicizzati
+            per la ricerca dei quasi duplicati.
         """
-        return hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        statistiche = self.cache.statistiche()
+        statistiche["richieste_deduplicate"] = self._single_flight.duplicati
+        statistiche["analisi_incrementale"] = self._analizzatore_incrementale.statistiche()
+        if self._indice_simili is not None:
+            statistiche["quasi_duplicati"] = self._indice_simili.statistiche()
+        return statistiche
         
-    def analizza_prompt(self, prompt):
+    def _leggi_cache(self, cache_key: str) -> Optional[RisultatoMiglioramento]:
         """
-        Analizza il prompt dal punto di vista grammaticale e semantico.
+        Legge un risultato dalla cache.
         
         Args:
-            prompt (str): Il prompt originale da analizzare.
-        
+            cache_key (str): La chiave del risultato.
+            
         Returns:
-            dict: Dizionario contenente l'analisi del prompt.
+            RisultatoMiglioramento | None: Il risultato memorizzato, oppure None se assente o scaduto.
         """
-        # Sanitizzazione dell'input
-        prompt = self._sanitizza_input(prompt)
+        with cronometro("cache"):
+            risultato = self.cache.get(cache_key)
+        if risultato is None:
+            LETTURE_CACHE.incrementa(esito="miss")
+            return None
+        LETTURE_CACHE.incrementa(esito="hit")
+        self.logger.info("Risultato trovato in cache")
+        return RisultatoMiglioramento.da_valore(risultato)
+    
+    def cerca_in_cache(self, prompt: str) -> Optional[RisultatoMiglioramento]:
+        """
+        Restituisce il risultato già in cache per un prompt, senza analizzarlo né chiamare l'API.
         
-        if not prompt.strip():
-            return {"errore": "Il prompt è vuoto."}
+        Cerca solo lo stesso prompt: il risultato di un prompt quasi identico
+        richiede l'analisi del nuovo prompt ed è restituito da `migliora_e_analizza`.
         
+        Args:
+            prompt (str): Il prompt originale.
+            
+        Returns:
+            RisultatoMiglioramento | None: Il risultato memorizzato, se presente.
+        """
+        return self._leggi_cache(self._get_cache_key(self._sanitizza_input(prompt)))
+    
+    def _firma_prompt(self, prompt: str) -> Optional[FirmaMinHash]:
+        """
+        Calcola la firma del prompt per la ricerca dei quasi duplicati.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato.
+            
+        Returns:
+            FirmaMinHash | None: La firma, oppure None se la ricerca è disattivata o il prompt non ha parole.
+        """
+        if self._indice_simili is None:
+            return None
+        with cronometro("quasi_duplicati"):
+            return firma_minhash(normalizza_testo(prompt))
+    
+    def _cerca_quasi_duplicato(self, firma: Optional[FirmaMinHash]) -> Optional[Tuple[QuasiDuplicato, RisultatoMiglioramento]]:
+        """
+        Cerca in cache il risultato del prompt più simile, sopra la soglia configurata.
+        
+        Le voci dell'indice scadute o rimosse dalla cache vengono tolte anche dall'indice.
+        
+        Args:
+            firma (FirmaMinHash | None): La firma del prompt, da `_firma_prompt`.
+            
+        Returns:
+            tuple | None: Il prompt simile trovato e il suo risultato, se esiste.
+        """
+        if firma is None:
+            return None
+        with cronometro("quasi_duplicati"):
+            while True:
+                simile = self._indice_simili.cerca(firma)
+                if simile is None:
+                    return None
+                risultato = self.cache.get(simile.chiave, conta=False)
+                if risultato is not None:
+                    return simile, RisultatoMiglioramento.da_valore(risultato)
+                self._indice_simili.rimuovi(simile.chiave)
+    
+    def _riusa_quasi_duplicato(self, simile: Tuple[QuasiDuplicato, RisultatoMiglioramento],
+                               analisi: Dict[str, Any]) -> RisultatoMiglioramento:
+        """
+        Restituisce il risultato di un prompt quasi identico, con l'analisi del prompt richiesto.
+        
+        Il risultato non viene salvato con la chiave del nuovo prompt: una
+        sostituzione accettata per errore (ad esempio "vantaggi" e "svantaggi")
+        non sopravvive così a un cambio di soglia o di modalità, e i quasi
+        duplicati non si concatenano allontanandosi dal prompt migliorato da DeepSeek.
+        
+        Args:
+            simile (tuple): Il prompt simile e il suo risultato, da `_cerca_quasi_duplicato`.
+            analisi (dict): L'analisi del prompt richiesto.
+            
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+        """
+        quasi_duplicato, risultato = simile
+        QUASI_DUPLICATI.incrementa(modalita="riusa")
+        self.logger.info(f"Riutilizzato il risultato di un prompt simile al {quasi_duplicato.similarita:.0%}")
+        return risultato._replace(
+            analisi={**analisi, "quasi_duplicato": {"similarita": round(quasi_duplicato.similarita, 3)}}
+        )
+    
+    def _memorizza(self, cache_key: str, risultato: RisultatoMiglioramento, firma: Optional[FirmaMinHash]) -> None:
+        """Salva in cache un risultato prodotto da DeepSeek e lo indicizza per la ricerca dei quasi duplicati."""
+        self.cache.set(cache_key, risultato)
+        if firma is not None:
+            self._indice_simili.aggiungi(cache_key, firma)
+        
+    def analizza_prompt(self, prompt, profilo: Optional[str] = None):
+        """
+        Analizza il prompt dal punto di vista grammaticale e semantico.
+        
+        Args:
+            prompt (str): Il prompt originale da analizzare.
+            profilo (str, optional): "fast" (senza parser né NER, nessuna entità
+                rilevata) oppure "full". Default: settings.analysis_profile.
+        
+        Returns:
+            dict: Dizionario contenente l'analisi del prompt.
+        """
+        if profilo is not None:
+            verifica_profilo(profilo)
+        
+        # Sanitizzazione dell'input
+        prompt = self._sanitizza_input(prompt)
+        
+        with raccogli_tempi(settings.metrics_in_results) as tempi:
+            analisi = self._analizza_prompt_sanitizzato(prompt, profilo=profilo)
+        return self._con_tempi(analisi, tempi)
+    
+    def analizza_prompts(self, prompts: Iterable[str], batch_size: Optional[int] = None,
+                         n_process: Optional[int] = None, profilo: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Analizza molti prompt facendo il parsing spaCy in blocco con `nlp.pipe`.
+        
+        Restituisce gli stessi dizionari di `analizza_prompt`, nello stesso
+        ordine dei prompt in ingresso. È un generatore: i prompt vengono letti
+        e analizzati un batch alla volta, quindi la memoria resta costante
+        anche su raccolte molto grandi.
+        
+        Con `settings.metrics_in_results` i "tempi" di ogni analisi comprendono
+        solo le fasi eseguite per quel prompt: il parsing avviene per batch,
+        eventualmente in altri processi, e non è attribuibile a un singolo prompt.
+        
+        Args:
+            prompts (iterable): I prompt originali da analizzare.
+            batch_size (int, optional): Testi per batch. Default: `settings.analysis_batch_size`.
+            n_process (int, optional): Processi per il parsing. Default: `settings.analysis_processes`.
+            profilo (str, optional): Il profilo di analisi. Default: `settings.analysis_profile`.
+        
+        Yields:
+            dict: L'analisi di ciascun prompt.
+        """
+        profilo = verifica_profilo(profilo or settings.analysis_profile)
+        testi = (self._sanitizza_input(prompt) for prompt in prompts)
+        
+        nlp = get_nlp()
+        if nlp is None:
+            for testo in testi:
+                with raccogli_tempi(settings.metrics_in_results) as tempi:
+                    analisi = self._analizza_prompt_sanitizzato(testo, profilo=profilo)
+                yield self._con_tempi(analisi, tempi)
+            return
+        
+        documenti = nlp.pipe(
+            testi,
+            batch_size=batch_size or settings.analysis_batch_size,
+            n_process=n_process or settings.analysis_processes,
+            disable=componenti_esclusi(nlp, profilo)
+        )
+        for doc in documenti:
+            # spaCy conserva il testo originale, compresi spazi e righe vuote
+            with raccogli_tempi(settings.metrics_in_results) as tempi:
+                analisi = self._analizza_prompt_sanitizzato(doc.text, doc, profilo)
+            yield self._con_tempi(analisi, tempi)
+    
+    def _analizza_prompt_sanitizzato(self, prompt: str, doc=None, profilo: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Esegue l'analisi su un prompt già sanitizzato.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato da analizzare.
+            doc (spacy.Doc, optional): Il documento spaCy già analizzato per il prompt.
+            profilo (str, optional): Il profilo di analisi. Default: settings.analysis_profile.
+        
+        Returns:
+            dict: Dizionario contenente l'analisi del prompt.
+        """
+        if not prompt.strip():
+            return {"errore": "Il prompt è vuoto."}
+        
+        nlp = get_nlp()
         if nlp is None:
             return {"avviso": "Analisi grammaticale non disponibile: modello spaCy non caricato."}
         
         try:
-            # Analisi con spaCy
-            doc = nlp(prompt)
+            # Analisi con spaCy: un solo parsing condiviso da tutti gli analizzatori
+            with cronometro("spacy"):
+                contesto = self._crea_contesto(prompt, nlp, doc, profilo)
+                contesto.doc
             
             # Estrazione entità
-            entita = [(ent.text, ent.label_) for ent in doc.ents]
+            entita = [(ent.text, ent.label_) for ent in contesto.doc.ents]
             
             # Analisi di base
-            analisi = {
-                "lunghezza_caratteri": len(prompt),
-                "lunghezza_parole": len(prompt.split()),
-                "lunghezza_frasi": len(list(doc.sents)),
-                "entita_rilevate": entita,
-                "complessita": self._calcola_complessita(doc),
-                "chiarezza": self._valuta_chiarezza(prompt),
-                "struttura": self._analizza_struttura(prompt),
-                "leggibilita": self._calcola_leggibilita(prompt, doc)
-            }
+            with cronometro("metriche"):
+                analisi = {
+                    "lunghezza_caratteri": len(prompt),
+                    "lunghezza_parole": len(contesto.parole_grezze),
+                    "lunghezza_frasi": len(contesto.frasi),
+                    "entita_rilevate": entita,
+                    "complessita": self._calcola_complessita(contesto),
+                    "chiarezza": self._valuta_chiarezza(contesto),
+                    "struttura": self._analizza_struttura(contesto),
+                    "leggibilita": self._calcola_leggibilita(contesto),
+                    "profilo": contesto.profilo
+                }
             
             # Analisi grammaticale con strumenti locali
-            analisi_grammaticale = self.grammar_checker.verifica_testo(prompt)
+            analisi_grammaticale = self.grammar_checker.verifica_testo(contesto)
             
             # Se il servizio è disponibile, incorpora i risultati
             if analisi_grammaticale.get("servizio_disponibile", False):
@@ -442,7 +1472,6 @@ class PromptPerfezionatore:
                 }
                 self.logger.warning(f"Analisi grammaticale fallita: {analisi_grammaticale.get('messaggio', 'errore sconosciuto')}")
             
-            self.ultima_analisi = analisi
             self.logger.info(f"Analisi completa: {len(prompt)} caratteri, {analisi['complessita']['livello']} complessità")
             return analisi
             
@@ -450,6 +1479,115 @@ class PromptPerfezionatore:
             self.logger.error(f"Errore durante l'analisi del prompt: {str(e)}")
             return {"errore": f"Errore durante l'analisi: {str(e)}"}
     
+    def analizza_metriche(self, prompt: str) -> Dict[str, Any]:
+        """
+        Calcola solo le metriche rapide del prompt, per l'analisi durante la digitazione.
+        
+        Usa il profilo "fast" e l'analisi incrementale, e salta grammatica,
+        ortografia ed entità. Non chiama mai DeepSeek.
+        
+        Args:
+            prompt (str): Il prompt originale.
+        
+        Returns:
+            dict: Lunghezze, complessità, chiarezza, struttura e leggibilità.
+        """
+        prompt = self._sanitizza_input(prompt)
+        if not prompt.strip():
+            return {"errore": "Il prompt è vuoto."}
+        
+        nlp = get_nlp()
+        if nlp is None:
+            return {"avviso": "Analisi non disponibile: modello spaCy non caricato."}
+        
+        try:
+            # Tra una battuta e l'altra cambia un solo blocco: gli altri vengono riutilizzati
+            with cronometro("spacy"):
+                contesto = self._crea_contesto(prompt, nlp, profilo="fast", incrementale=True)
+                contesto.doc
+            with cronometro("metriche"):
+                return {
+                    "lunghezza_caratteri": len(prompt),
+                    "lunghezza_parole": len(contesto.parole_grezze),
+                    "lunghezza_frasi": len(contesto.frasi),
+                    "complessita": self._calcola_complessita(contesto),
+                    "chiarezza": self._valuta_chiarezza(contesto),
+                    "struttura": self._analizza_struttura(contesto),
+                    "leggibilita": self._calcola_leggibilita(contesto)
+                }
+        except Exception as e:
+            self.logger.error(f"Errore durante l'analisi rapida del prompt: {str(e)}")
+            return {"errore": f"Errore durante l'analisi: {str(e)}"}
+    
+    async def analizza_metriche_async(self, prompt: str) -> Dict[str, Any]:
+        """
+        Versione asincrona di `analizza_metriche`, eseguita nel thread dell'analisi live.
+        
+        Se la coroutine viene annullata prima che l'analisi parta, l'analisi
+        non viene eseguita; una già avviata non può essere interrotta e
+        termina, ma occupa solo il thread dell'analisi live.
+        
+        Args:
+            prompt (str): Il prompt originale.
+        
+        Returns:
+            dict: Le metriche rapide del prompt.
+        """
+        return await self._in_executor_analisi(self.analizza_metriche, prompt, executor=self._executor_live)
+    
+    async def _in_executor_analisi(self, funzione, *args, executor: Optional[ThreadPoolExecutor] = None):
+        """
+        Esegue una funzione nell'executor dell'analisi, nel contesto della richiesta corrente.
+        
+        `run_in_executor` non propaga le context variable: senza la copia
+        del contesto i tempi delle fasi non verrebbero attribuiti alla richiesta.
+        """
+        loop = asyncio.get_running_loop()
+        contesto = contextvars.copy_context()
+        return await loop.run_in_executor(executor or self._executor_analisi, partial(contesto.run, funzione, *args))
+    
+    def _con_tempi(self, risultato, tempi: Optional[Dict[str, float]]):
+        """
+        Aggiunge i tempi per fase a una copia dell'analisi, senza modificare quella in cache.
+        
+        Args:
+            risultato (dict | RisultatoMiglioramento): L'analisi o il risultato completo.
+            tempi (dict | None): I tempi raccolti con `raccogli_tempi`; se None il risultato è invariato.
+        
+        Returns:
+            Il risultato, con la chiave "tempi" nell'analisi.
+        """
+        if tempi is None:
+            return risultato
+        if isinstance(risultato, RisultatoMiglioramento):
+            return risultato._replace(analisi={**risultato.analisi, "tempi": dict(tempi)})
+        return {**risultato, "tempi": dict(tempi)}
+    
+    def _crea_contesto(self, prompt: str, nlp, doc=None, profilo: Optional[str] = None,
+                       incrementale: Optional[bool] = None) -> ContestoAnalisi:
+        """
+        Crea il contesto di analisi, riusando i blocchi già analizzati se conviene.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato.
+            nlp: Il modello spaCy.
+            doc (spacy.Doc, optional): Il documento già analizzato per il prompt.
+            profilo (str, optional): Il profilo di analisi. Default: settings.analysis_profile.
+            incrementale (bool, optional): Se usare l'analisi per blocchi. Default: solo
+                per i prompt lunghi almeno `settings.incremental_analysis_min_chars`.
+        
+        Returns:
+            ContestoAnalisi: Il contesto condiviso dagli analizzatori.
+        """
+        profilo = profilo or settings.analysis_profile
+        if incrementale is None:
+            soglia = settings.incremental_analysis_min_chars
+            incrementale = bool(soglia) and len(prompt) >= soglia
+        if doc is None and incrementale:
+            # Prompt lungo, spesso una versione modificata del precedente: si analizzano solo i blocchi cambiati
+            doc = self._analizzatore_incrementale.documento(prompt, nlp, componenti_esclusi(nlp, profilo))
+        return ContestoAnalisi(prompt, nlp, doc, profilo)
+    
     def _sanitizza_input(self, testo: str) -> str:
         """
         Sanitizza l'input utente per prevenire problemi di sicurezza.
@@ -473,18 +1611,20 @@ class PromptPerfezionatore:
             
         return testo
     
-    def _calcola_complessita(self, doc):
+    def _calcola_complessita(self, contesto: ContestoAnalisi):
         """
         Calcola un punteggio di complessità basato sulla lunghezza delle frasi e delle parole.
         
         Args:
-            doc (spacy.Doc): Documento spaCy analizzato.
+            contesto (ContestoAnalisi): Il contesto di analisi condiviso.
         
         Returns:
             dict: Informazioni sulla complessità del testo.
         """
+        doc = contesto.doc
+        frasi = contesto.frasi
         lunghezza_media_parole = sum(len(token.text) for token in doc) / len(doc) if len(doc) > 0 else 0
-        lunghezza_media_frasi = sum(len(list(sent)) for sent in doc.sents) / len(list(doc.sents)) if len(list(doc.sents)) > 0 else 0
+        lunghezza_media_frasi = sum(len(frase) for frase in frasi) / len(frasi) if frasi else 0
         
         punteggio = (lunghezza_media_parole * 0.5) + (lunghezza_media_frasi * 0.3)
         
@@ -501,39 +1641,27 @@ class PromptPerfezionatore:
             "lunghezza_media_frasi": round(lunghezza_media_frasi, 2)
         }
     
-    def _valuta_chiarezza(self, prompt):
+    def _valuta_chiarezza(self, contesto: ContestoAnalisi):
         """
         Valuta la chiarezza del prompt in base a vari fattori.
         
         Args:
-            prompt (str): Il prompt da valutare.
+            contesto (ContestoAnalisi): Il contesto di analisi condiviso.
         
         Returns:
             dict: Valutazione della chiarezza.
         """
-        # Parole e espressioni ambigue - lista ampliata
-        parole_ambigue = [
-            "questo", "quello", "cosa", "fare", "forse", "potrebbe", "magari",
-            "alcuni", "qualcosa", "tipo", "etc", "eccetera", "ecc", "circa",
-            "praticamente", "quasi", "probabilmente"
-        ]
+        prompt = contesto.testo
         
-        espressioni_vaghe = [
-            "in qualche modo", "più o meno", "abbastanza", "una sorta di",
-            "più o meno", "grossomodo", "all'incirca", "si suppone", 
-            "generalmente", "tendenzialmente", "in linea di massima",
-            "per così dire", "diciamo che", "si dice che"
-        ]
-        
-        # Controllo parole ambigue
-        conteggio_ambigue = sum(1 for parola in prompt.lower().split() if parola in parole_ambigue)
+        # Parole ambigue ed espressioni vaghe, cercate in un'unica scansione del testo
+        corrispondenze = self.lessico_chiarezza.cerca(prompt)
+        conteggi = self.lessico_chiarezza.conta(corrispondenze)
+        conteggio_ambigue = conteggi["parole_ambigue"]
+        conteggio_vaghe = conteggi["espressioni_vaghe"]
         
         # Controllo frasi troppo lunghe
         frasi_lunghe = len([f for f in re.split(r'[.!?]', prompt) if len(f.split()) > 25])
         
-        # Controllo espressioni generiche
-        conteggio_vaghe = sum(1 for expr in espressioni_vaghe if expr.lower() in prompt.lower())
-        
         # Calcolo punteggio di chiarezza (inversamente proporzionale ai problemi)
         punteggio_base = 10
         punteggio = punteggio_base - (conteggio_ambigue * 0.5) - (frasi_lunghe * 1) - (conteggio_vaghe * 0.7)
@@ -552,39 +1680,29 @@ class PromptPerfezionatore:
                 "parole_ambigue": conteggio_ambigue,
                 "frasi_lunghe": frasi_lunghe,
                 "espressioni_vaghe": conteggio_vaghe
-            }
+            },
+            "corrispondenze": [corrispondenza._asdict() for corrispondenza in corrispondenze]
         }
     
-    def _analizza_struttura(self, prompt):
+    def _analizza_struttura(self, contesto: ContestoAnalisi):
         """
         Analizza la struttura del prompt.
         
         Args:
-            prompt (str): Il prompt da analizzare.
+            contesto (ContestoAnalisi): Il contesto di analisi condiviso.
         
         Returns:
-            dict: Analisi della struttura.
+            dict: Analisi della struttura (indicatori, conteggi, titoli, elenchi e blocchi di codice).
         """
-        # Verifica se il prompt contiene elementi strutturali
-        ha_elenchi = bool(re.search(r'[\n\r][ \t]*[-*•][ \t]', prompt))
-        ha_numerazione = bool(re.search(r'[\n\r][ \t]*\d+\.[ \t]', prompt))
-        ha_paragrafi = len(re.split(r'[\n\r]{2,}', prompt)) > 1
-        ha_formattazione = bool(re.search(r'[_*#]', prompt))  # Markdown di base
-        
-        return {
-            "ha_elenchi": ha_elenchi,
-            "ha_numerazione": ha_numerazione,
-            "ha_paragrafi": ha_paragrafi,
-            "ha_formattazione": ha_formattazione
-        }
+        # Un'unica scansione delle righe con pattern precompilati
+        return analizza_struttura(contesto.testo)
         
-    def _calcola_leggibilita(self, testo, doc):
+    def _calcola_leggibilita(self, contesto: ContestoAnalisi):
         """
         Calcola indici di leggibilità per il testo italiano.
         
         Args:
-            testo (str): Il testo da analizzare.
-            doc (spacy.Doc): Il documento spaCy già analizzato.
+            contesto (ContestoAnalisi): Il contesto di analisi condiviso.
             
         Returns:
             dict: Dizionario contenente indici di leggibilità.
@@ -592,9 +1710,9 @@ class PromptPerfezionatore:
         # Calcolo indice Gulpease (specifico per l'italiano)
         # Formula: 89 + (300 * numero_frasi - 10 * numero_lettere) / numero_parole
         
-        num_frasi = len(list(doc.sents))
-        num_parole = len([token for token in doc if not token.is_punct and not token.is_space])
-        num_lettere = sum(len(token.text) for token in doc if not token.is_punct and not token.is_space)
+        num_frasi = len(contesto.frasi)
+        num_parole = len(contesto.token_parole)
+        num_lettere = sum(len(token.text) for token in contesto.token_parole)
         
         if num_parole == 0:
             gulpease = 0
@@ -621,15 +1739,10 @@ class PromptPerfezionatore:
             }
         }
         
-    @retry(
-        stop=stop_after_attempt(settings.max_retry_attempts), 
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type(requests.exceptions.RequestException)
-    )
-    def _chiama_api_deepseek(self, system_prompt: str, user_message: str, 
+    def _corpo_richiesta_api(self, system_prompt: str, user_message: str,
                              model: str = None, temperatura: float = None) -> Dict[str, Any]:
         """
-        Chiama l'API DeepSeek con gestione degli errori migliorata.
+        Costruisce il corpo JSON di una richiesta chat-completions.
         
         Args:
             system_prompt (str): Il prompt di sistema.
@@ -638,23 +1751,13 @@ class PromptPerfezionatore:
             temperatura (float, optional): La temperatura per la generazione. Default: settings.deepseek_temperature.
             
         Returns:
-            dict: La risposta dell'API.
-            
-        Raises:
-            requests.exceptions.RequestException: Se la richiesta all'API fallisce dopo i tentativi.
+            dict: Il corpo della richiesta.
         """
         # Usa i valori predefiniti dalle impostazioni se non specificati
         model = model or settings.deepseek_model
         temperatura = temperatura or settings.deepseek_temperature
         
-        url = settings.deepseek_api_url
-        
-        headers = {
-            "Authorization": f"Bearer {settings.deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
+        return {
             "model": model,
             "messages": [
                 {"role": "system", "content": system_prompt},
@@ -664,10 +1767,45 @@ class PromptPerfezionatore:
             "max_tokens": settings.deepseek_max_tokens
         }
         
-        self.logger.info(f"Invio richiesta a DeepSeek API. Model: {model}, Content length: {len(user_message)}")
+    @_entro_scadenza
+    @_politica_tentativi()
+    def _chiama_api_deepseek(self, system_prompt: str, user_message: str, 
+                             model: str = None, temperatura: float = None) -> Dict[str, Any]:
+        """
+        Chiama l'API DeepSeek con gestione degli errori migliorata.
+        
+        Args:
+            system_prompt (str): Il prompt di sistema.
+            user_message (str): Il messaggio dell'utente.
+            model (str, optional): Il modello da utilizzare. Default: settings.deepseek_model.
+            temperatura (float, optional): La temperatura per la generazione. Default: settings.deepseek_temperature.
+            
+        Returns:
+            dict: La risposta dell'API.
+            
+        Raises:
+            requests.exceptions.RequestException: Se la richiesta all'API fallisce dopo i tentativi.
+        """
+        data = self._corpo_richiesta_api(system_prompt, user_message, model, temperatura)
+        
+        self.logger.info(f"Invio richiesta a DeepSeek API. Model: {data['model']}, Content length: {len(user_message)}")
+        
+        limitatore = get_limitatore_deepseek()
+        with cronometro("attesa_limitatore"):
+            limitatore.acquisisci(_secondi_rimanenti())
         
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=settings.api_timeout)
+            try:
+                with cronometro("deepseek"):
+                    response = self.session.post(
+                        settings.deepseek_api_url, json=data,
+                        timeout=(settings.api_connect_timeout, _timeout_lettura())
+                    )
+            except BaseException as e:
+                _rilascia_permesso(limitatore, errore=e)
+                raise
+            _rilascia_permesso(limitatore, response)
+            RISPOSTE_DEEPSEEK.incrementa(esito=str(response.status_code))
             response.raise_for_status()
             self.logger.info("Risposta ricevuta correttamente dall'API")
             return response.json()
@@ -681,83 +1819,419 @@ class PromptPerfezionatore:
             self.logger.error(f"HTTP error: {str(e)}")
             raise
         except requests.exceptions.ConnectionError as e:
+            RISPOSTE_DEEPSEEK.incrementa(esito="errore_connessione")
             self.logger.error(f"Errore di connessione: {str(e)}")
             raise
         except requests.exceptions.Timeout as e:
+            RISPOSTE_DEEPSEEK.incrementa(esito="timeout")
             self.logger.error(f"Timeout della richiesta: {str(e)}")
             raise
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Errore API: {str(e)}")
             raise
-            
-    def migliora_prompt(self, prompt: str) -> tuple:
+    
+    def _get_client_async(self) -> httpx.AsyncClient:
         """
-        Utilizza DeepSeek per migliorare il prompt.
+        Restituisce il client HTTP asincrono dell'event loop corrente.
+        
+        Il client mantiene un pool di connessioni keep-alive condiviso dalle
+        richieste concorrenti, ma le sue connessioni appartengono all'event
+        loop in cui è stato creato. Se l'istanza viene usata da un altro loop
+        (ad esempio con un secondo `asyncio.run`), il client precedente viene
+        abbandonato e se ne crea uno nuovo: chiuderlo richiederebbe il suo loop,
+        che di solito è già chiuso.
+        
+        Returns:
+            httpx.AsyncClient: Il client configurato.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client_async is None or self._loop_client_async is not loop:
+            self._loop_client_async = loop
+            self._client_async = httpx.AsyncClient(
+                headers={
+                    "Authorization": f"Bearer {settings.deepseek_api_key}",
+                    "Content-Type": "application/json"
+                },
+                timeout=httpx.Timeout(settings.api_timeout, connect=settings.api_connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=settings.http_async_max_connections,
+                    max_keepalive_connections=settings.http_pool_size
+                )
+            )
+        return self._client_async
+    
+    async def chiudi_async(self) -> None:
+        """
+        Chiude il client HTTP asincrono e gli executor dell'analisi.
+        
+        Va chiamata nell'event loop che ha usato il client, ad esempio
+        all'arresto del server; un client di un altro loop viene solo abbandonato.
+        """
+        if self._client_async is not None and self._loop_client_async is asyncio.get_running_loop():
+            await self._client_async.aclose()
+        self._client_async = None
+        self._loop_client_async = None
+        self._executor_analisi.shutdown(wait=False)
+        self._executor_live.shutdown(wait=False, cancel_futures=True)
+    
+    def chiudi(self, timeout: float = 5.0) -> None:
+        """
+        Chiude client HTTP ed executor da un thread diverso da quello dell'event loop.
+        
+        Pensata per l'arresto di un server: il client asincrono viene chiuso
+        nel proprio event loop, se è ancora attivo.
         
         Args:
-            prompt (str): Il prompt originale da migliorare.
+            timeout (float): Secondi massimi di attesa per la chiusura del client asincrono.
+        """
+        loop = self._loop_client_async
+        if self._client_async is not None and loop is not None and loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self.chiudi_async(), loop).result(timeout)
+            except Exception as e:
+                self.logger.warning(f"Chiusura del client HTTP asincrono non riuscita: {str(e)}")
+        self._client_async = None
+        self._loop_client_async = None
+        self._executor_analisi.shutdown(wait=False)
+        self._executor_live.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+    
+    @_entro_scadenza
+    @_politica_tentativi()
+    async def _chiama_api_deepseek_async(self, system_prompt: str, user_message: str,
+                                         model: str = None, temperatura: float = None) -> Dict[str, Any]:
+        """
+        Versione asincrona di `_chiama_api_deepseek`: le attese tra i tentativi
+        e la risposta dell'API non bloccano l'event loop.
         
+        Args:
+            system_prompt (str): Il prompt di sistema.
+            user_message (str): Il messaggio dell'utente.
+            model (str, optional): Il modello da utilizzare. Default: settings.deepseek_model.
+            temperatura (float, optional): La temperatura per la generazione. Default: settings.deepseek_temperature.
+            
         Returns:
-            tuple: (prompt_migliorato, suggerimenti, spiegazione_modifiche)
+            dict: La risposta dell'API.
+            
+        Raises:
+            httpx.HTTPError: Se la richiesta all'API fallisce dopo i tentativi.
         """
-        # Sanitizzazione dell'input
-        prompt = self._sanitizza_input(prompt)
+        data = self._corpo_richiesta_api(system_prompt, user_message, model, temperatura)
         
-        self.ultimo_prompt_originale = prompt
+        self.logger.info(f"Invio richiesta asincrona a DeepSeek API. Model: {data['model']}, Content length: {len(user_message)}")
         
-        # Verifica se il prompt è nella cache
-        cache_key = self._get_cache_key(prompt)
-        if cache_key in self.cache:
-            self.logger.info("Risultato trovato in cache")
-            cached_result = self.cache[cache_key]
-            return cached_result
+        limitatore = get_limitatore_deepseek()
+        with cronometro("attesa_limitatore"):
+            await limitatore.acquisisci_async(_secondi_rimanenti())
         
-        if not settings.deepseek_api_key:
-            self.logger.error("Chiave API di DeepSeek mancante")
-            return (
-                "Impossibile migliorare il prompt: chiave API di DeepSeek mancante.",
-                ["Configura la chiave API di DeepSeek nel file .env"],
-                "Errore: chiave API mancante."
-            )
+        try:
+            try:
+                with cronometro("deepseek"):
+                    response = await self._get_client_async().post(
+                        settings.deepseek_api_url, json=data,
+                        timeout=httpx.Timeout(_timeout_lettura(), connect=settings.api_connect_timeout)
+                    )
+            except BaseException as e:
+                _rilascia_permesso(limitatore, errore=e)
+                raise
+            _rilascia_permesso(limitatore, response)
+            RISPOSTE_DEEPSEEK.incrementa(esito=str(response.status_code))
+            response.raise_for_status()
+            self.logger.info("Risposta ricevuta correttamente dall'API")
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429:
+                self.logger.warning("Rate limit raggiunto. Attesa prima di riprovare...")
+            elif e.response.status_code == 401:
+                self.logger.error("Errore di autenticazione API. Verifica la chiave API.")
+                raise
+            self.logger.error(f"HTTP error: {str(e)}")
+            raise
+        except httpx.TimeoutException as e:
+            RISPOSTE_DEEPSEEK.incrementa(esito="timeout")
+            self.logger.error(f"Timeout della richiesta: {str(e)}")
+            raise
+        except httpx.TransportError as e:
+            RISPOSTE_DEEPSEEK.incrementa(esito="errore_connessione")
+            self.logger.error(f"Errore di connessione: {str(e)}")
+            raise
+    
+    @_entro_scadenza
+    @_politica_tentativi()
+    async def _apri_stream_deepseek_async(self, system_prompt: str, user_message: str) -> httpx.Response:
+        """
+        Apre una richiesta in streaming (server-sent events) verso DeepSeek.
+        
+        I tentativi riguardano solo l'apertura del flusso: una volta ricevuti
+        gli header della risposta, gli errori vengono propagati al chiamante.
+        Il permesso del limitatore resta acquisito finché il flusso è aperto.
         
+        Args:
+            system_prompt (str): Il prompt di sistema.
+            user_message (str): Il messaggio dell'utente.
+            
+        Returns:
+            httpx.Response: La risposta aperta, da leggere e chiudere a cura del chiamante,
+            che deve anche rilasciare il permesso con `_rilascia_permesso`.
+        """
+        data = self._corpo_richiesta_api(system_prompt, user_message)
+        data["stream"] = True
+        
+        self.logger.info(f"Apertura stream DeepSeek API. Model: {data['model']}, Content length: {len(user_message)}")
+        
+        client = self._get_client_async()
+        limitatore = get_limitatore_deepseek()
+        with cronometro("attesa_limitatore"):
+            await limitatore.acquisisci_async(_secondi_rimanenti())
+        request = client.build_request(
+            "POST", settings.deepseek_api_url, json=data,
+            timeout=httpx.Timeout(_timeout_lettura(), connect=settings.api_connect_timeout)
+        )
+        # Per lo streaming si misura il tempo fino agli header della risposta
+        with cronometro("deepseek_apertura_stream"):
+            try:
+                response = await client.send(request, stream=True)
+            except BaseException as e:
+                _rilascia_permesso(limitatore, errore=e)
+                if isinstance(e, httpx.TimeoutException):
+                    RISPOSTE_DEEPSEEK.incrementa(esito="timeout")
+                elif isinstance(e, httpx.TransportError):
+                    RISPOSTE_DEEPSEEK.incrementa(esito="errore_connessione")
+                raise
+        RISPOSTE_DEEPSEEK.incrementa(esito=str(response.status_code))
         try:
-            system_prompt = """
-            Sei un esperto di prompt engineering in italiano che aiuta a migliorare i prompt per modelli di linguaggio.
-            Per ogni prompt che ricevi, devi:
-            1. Migliorarlo in termini di chiarezza, precisione e struttura
-            2. Fornire 3-5 suggerimenti specifici per rendere il prompt ancora più efficace
-            3. Spiegare brevemente le modifiche principali apportate
-            
-            Rispondi in formato JSON con i seguenti campi:
-            {
-                "prompt_migliorato": "il prompt migliorato",
-                "suggerimenti": ["suggerimento 1", "suggerimento 2", ...],
-                "spiegazione": "spiegazione delle modifiche"
-            }
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            _rilascia_permesso(limitatore, response)
+            await response.aclose()
+            self.logger.error(f"HTTP error: {str(e)}")
+            raise
+        return response
+    
+    async def _stream_contenuto_deepseek_async(self, system_prompt: str, user_message: str):
+        """
+        Restituisce i frammenti di contenuto generati da DeepSeek man mano che arrivano.
+        
+        Args:
+            system_prompt (str): Il prompt di sistema.
+            user_message (str): Il messaggio dell'utente.
             
-            Principi da seguire nel miglioramento:
-            - Chiarezza: elimina ambiguità e vaghezza
-            - Completezza: assicurati che tutti i dettagli necessari siano inclusi
-            - Struttura: migliora la formattazione e l'organizzazione logica
-            - Specificità: rendi più specifiche richieste e requisiti
-            - Obiettivi: esplicita gli obiettivi e i risultati attesi
-            - Contesto: aggiungi contesto dove utile
+        Yields:
+            str: I frammenti di testo generato.
+        """
+        response = await self._apri_stream_deepseek_async(system_prompt, user_message)
+        errore = None
+        try:
+            with cronometro("deepseek_stream"):
+                async for riga in response.aiter_lines():
+                    frammento = estrai_delta_sse(riga)
+                    if frammento:
+                        yield frammento
+        except BaseException as e:
+            errore = e
+            raise
+        finally:
+            await response.aclose()
+            if errore is None or isinstance(errore, GeneratorExit):
+                _rilascia_permesso(get_limitatore_deepseek(), response)
+            else:
+                _rilascia_permesso(get_limitatore_deepseek(), errore=errore)
+    
+    def _prompt_lungo(self, prompt: str) -> bool:
+        """Indica se il prompt supera la soglia del miglioramento per sezioni."""
+        return bool(settings.long_prompt_threshold) and len(prompt) >= settings.long_prompt_threshold
+    
+    def _sezioni_prompt(self, prompt: str, analisi: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        Divide un prompt lungo in sezioni secondo la sua struttura.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato.
+            analisi (dict): L'analisi del prompt, di cui viene riusata la struttura.
+        
+        Returns:
+            list | None: Le sezioni, oppure None se il prompt va migliorato per intero.
+        """
+        if not self._prompt_lungo(prompt):
+            return None
+        sezioni = dividi_in_sezioni(prompt, settings.long_prompt_section_size, analisi.get("struttura"))
+        if len(sezioni) < 2:
+            return None
+        self.logger.info(f"Prompt lungo ({len(prompt)} caratteri) diviso in {len(sezioni)} sezioni")
+        return sezioni
+    
+    def _costruisci_messaggio_sezione(self, sezione: str, indice: int, totale: int, analisi: Dict[str, Any]) -> str:
+        """
+        Prepara il messaggio per l'API relativo a una sezione di un prompt lungo.
+        
+        Args:
+            sezione (str): Il testo della sezione.
+            indice (int): La posizione della sezione, da 1.
+            totale (int): Il numero di sezioni.
+            analisi (dict): L'analisi del prompt completo.
             
-            Non modificare la lingua originale del prompt e mantieni la stessa sostanza e richiesta.
-            """
+        Returns:
+            str: Il messaggio dell'utente.
+        """
+        struttura = descrivi_struttura(analisi["struttura"]) if "struttura" in analisi else "N/A"
+        return f"""
+            Sezione {indice} di {totale} del prompt originale:
+            {sezione}
             
-            analisi = self.analizza_prompt(prompt)
+            Contesto del prompt completo:
+            - Lunghezza: {analisi.get('lunghezza_caratteri', 'N/A')} caratteri
+            - Struttura: {struttura}
             
-            # Prepara il messaggio per l'utente includendo anche l'analisi grammaticale se disponibile
-            analisi_grammatica_msg = ""
-            if "grammatica" in analisi and analisi["grammatica"].get("servizio_disponibile", False):
-                analisi_grammatica_msg = f"""
-                - Punteggio grammaticale: {analisi["grammatica"]["punteggio"]}/100
-                - Errori grammaticali: {analisi["grammatica"]["errori_conteggio"]}
-                """
+            Migliora solo questa sezione seguendo i principi indicati e rispondi in formato JSON.
+            """
+    
+    def _migliora_sezione(self, sezione: str, indice: int, totale: int, analisi: Dict[str, Any]) -> RisultatoMiglioramento:
+        """Migliora una sezione di un prompt lungo con una chiamata a DeepSeek."""
+        if isinstance(sezione, SezioneCodice):
+            return self._sezione_invariata(sezione)
+        user_message = self._costruisci_messaggio_sezione(sezione, indice, totale, analisi)
+        response_data = self._chiama_api_deepseek(SYSTEM_PROMPT_SEZIONE, user_message)
+        # I suggerimenti grammaticali del prompt completo vengono aggiunti una sola volta, nell'unione
+        return self._elabora_risposta_api(response_data, {})
+    
+    async def _migliora_sezione_async(self, sezione: str, indice: int, totale: int,
+                                      analisi: Dict[str, Any], semaforo: asyncio.Semaphore) -> RisultatoMiglioramento:
+        """Versione asincrona di `_migliora_sezione`."""
+        if isinstance(sezione, SezioneCodice):
+            return self._sezione_invariata(sezione)
+        async with semaforo:
+            user_message = self._costruisci_messaggio_sezione(sezione, indice, totale, analisi)
+            response_data = await self._chiama_api_deepseek_async(SYSTEM_PROMPT_SEZIONE, user_message)
+            return self._elabora_risposta_api(response_data, {})
+    
+    @staticmethod
+    def _sezione_invariata(sezione: str) -> RisultatoMiglioramento:
+        """Risultato di un blocco di codice troppo lungo, riportato senza chiamare DeepSeek."""
+        return RisultatoMiglioramento(sezione, (), "blocco di codice lasciato invariato.", {})
+    
+    def _migliora_per_sezioni(self, sezioni: List[str], analisi: Dict[str, Any]) -> Tuple[RisultatoMiglioramento, bool]:
+        """
+        Migliora le sezioni di un prompt lungo con chiamate parallele e ne unisce i risultati.
+        
+        Args:
+            sezioni (list): Le sezioni del prompt sanitizzato.
+            analisi (dict): L'analisi del prompt completo.
+        
+        Returns:
+            tuple: (risultato unito, True se tutte le sezioni sono state migliorate)
+        """
+        totale = len(sezioni)
+        with ThreadPoolExecutor(max_workers=min(totale, settings.long_prompt_parallel_calls)) as executor:
+            # Un contesto per chiamata: i tempi delle fasi restano attribuiti alla richiesta
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._migliora_sezione, sezione, indice, totale, analisi)
+                for indice, sezione in enumerate(sezioni, 1)
+            ]
+            esiti = []
+            for future in futures:
+                try:
+                    esiti.append(future.result())
+                except Exception as e:
+                    esiti.append(e)
+        return self._unisci_sezioni(sezioni, esiti, analisi)
+    
+    async def _migliora_per_sezioni_async(self, sezioni: List[str],
+                                          analisi: Dict[str, Any]) -> Tuple[RisultatoMiglioramento, bool]:
+        """Versione asincrona di `_migliora_per_sezioni`."""
+        semaforo = asyncio.Semaphore(settings.long_prompt_parallel_calls)
+        totale = len(sezioni)
+        esiti = await asyncio.gather(
+            *(self._migliora_sezione_async(sezione, indice, totale, analisi, semaforo)
+              for indice, sezione in enumerate(sezioni, 1)),
+            return_exceptions=True
+        )
+        return self._unisci_sezioni(sezioni, esiti, analisi)
+    
+    def _unisci_sezioni(self, sezioni: List[str], esiti: List[Any],
+                        analisi: Dict[str, Any]) -> Tuple[RisultatoMiglioramento, bool]:
+        """
+        Ricompone il prompt migliorato dalle sezioni, nell'ordine originale.
+        
+        Una sezione non migliorata per un errore resta com'era, e il risultato
+        non viene considerato completo; se falliscono tutte, si restituisce l'errore.
+        
+        Args:
+            sezioni (list): Le sezioni originali.
+            esiti (list): Per ogni sezione, il RisultatoMiglioramento o l'eccezione sollevata.
+            analisi (dict): L'analisi del prompt completo.
+        
+        Returns:
+            tuple: (risultato unito, True se tutte le sezioni sono state migliorate)
+        """
+        testi, suggerimenti, spiegazioni = [], [], []
+        errori = []
+        for indice, (sezione, esito) in enumerate(zip(sezioni, esiti), 1):
+            if isinstance(esito, BaseException):
+                self.logger.error(f"Sezione {indice} di {len(sezioni)} non migliorata: {str(esito)}")
+                errori.append(esito)
+                testi.append(sezione.strip())
+                spiegazioni.append(f"Sezione {indice}: non migliorata a causa di un errore.")
+                continue
+            testi.append(esito.prompt_migliorato.strip())
+            suggerimenti.extend(esito.suggerimenti)
+            spiegazioni.append(f"Sezione {indice}: {esito.spiegazione}")
+        
+        if len(errori) == len(sezioni):
+            return self._risultato_errore(errori[0], analisi), False
+        
+        # Suggerimenti senza duplicati, poi quelli grammaticali del prompt completo
+        suggerimenti = list(dict.fromkeys(suggerimenti))[:MAX_SUGGERIMENTI_SEZIONI]
+        if "grammatica" in analisi and analisi["grammatica"].get("servizio_disponibile", False):
+            for sugg in analisi["grammatica"].get("suggerimenti", []):
+                if sugg not in suggerimenti:
+                    suggerimenti.append(sugg)
+        if errori:
+            suggerimenti.append("Alcune sezioni non sono state migliorate: riprova più tardi")
+        
+        # Con sezioni non migliorate il risultato è parziale: va ripetuto, non memorizzato
+        tipo_risultato = RisultatoErrore if errori else RisultatoMiglioramento
+        return tipo_risultato(
+            "\n\n".join(testi),
+            tuple(suggerimenti),
+            "\n".join(spiegazioni),
+            analisi
+        ), not errori
+    
+    def _costruisci_messaggio_utente(self, prompt: str, analisi: Dict[str, Any],
+                                     simile: Optional[Tuple[QuasiDuplicato, RisultatoMiglioramento]] = None) -> str:
+        """
+        Prepara il messaggio per l'API includendo l'analisi locale del prompt.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato.
+            analisi (dict): L'analisi del prompt.
+            simile (tuple, optional): Un prompt quasi identico e il suo risultato,
+                proposto al modello come base da adattare.
             
-            # Aggiungiamo l'analisi al contesto per il modello
-            user_message = f"""
+        Returns:
+            str: Il messaggio dell'utente.
+        """
+        # Prepara il messaggio per l'utente includendo anche l'analisi grammaticale se disponibile
+        analisi_grammatica_msg = ""
+        if "grammatica" in analisi and analisi["grammatica"].get("servizio_disponibile", False):
+            analisi_grammatica_msg = f"""
+            - Punteggio grammaticale: {analisi["grammatica"]["punteggio"]}/100
+            - Errori grammaticali: {analisi["grammatica"]["errori_conteggio"]}
+            """
+        
+        # Il miglioramento di un prompt quasi identico orienta il modello verso un risultato coerente
+        riferimento_msg = ""
+        if simile is not None:
+            quasi_duplicato, risultato = simile
+            QUASI_DUPLICATI.incrementa(modalita="semina")
+            riferimento_msg = f"""
+            Versione migliorata di un prompt quasi identico (similarità {quasi_duplicato.similarita:.0%}),
+            da usare come base adattandola alle differenze:
+            {risultato.prompt_migliorato}
+            """
+        
+        # Aggiungiamo l'analisi al contesto per il modello
+        return f"""
             Prompt originale:
             {prompt}
             
@@ -766,64 +2240,356 @@ class PromptPerfezionatore:
             - Complessità: {analisi['complessita']['livello']} ({analisi['complessita']['punteggio']}/10)
             - Chiarezza: {analisi['chiarezza']['livello']} ({analisi['chiarezza']['punteggio']}/10)
             - Leggibilità (Gulpease): {analisi.get('leggibilita', {}).get('gulpease', 'N/A')} - {analisi.get('leggibilita', {}).get('difficolta', 'N/A')}
+            - Struttura: {descrivi_struttura(analisi['struttura'])}
             {analisi_grammatica_msg}
+            {riferimento_msg}
             
             Migliora questo prompt seguendo i principi indicati e rispondi in formato JSON.
             """
+    
+    def _elabora_risposta_api(self, response_data: Dict[str, Any], analisi: Dict[str, Any]) -> RisultatoMiglioramento:
+        """
+        Estrae il risultato JSON dalla risposta dell'API e lo combina con l'analisi.
+        
+        Args:
+            response_data (dict): La risposta dell'API.
+            analisi (dict): L'analisi del prompt.
             
-            # Chiamata API con il nuovo metodo
-            response_data = self._chiama_api_deepseek(system_prompt, user_message)
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
             
-            # Estrazione della risposta
-            risultato_json = response_data["choices"][0]["message"]["content"]
+        Raises:
+            json.JSONDecodeError: Se il contenuto della risposta non è JSON valido.
+        """
+        # Estrazione della risposta
+        return self._elabora_contenuto_api(response_data["choices"][0]["message"]["content"], analisi)
+    
+    def _elabora_contenuto_api(self, risultato_json: str, analisi: Dict[str, Any]) -> RisultatoMiglioramento:
+        """
+        Interpreta il contenuto JSON generato dal modello e lo combina con l'analisi.
+        
+        Args:
+            risultato_json (str): Il contenuto del messaggio generato.
+            analisi (dict): L'analisi del prompt.
             
-            # Pulizia dei caratteri speciali JSON
-            risultato_json = risultato_json.strip()
-            if risultato_json.startswith("```json"):
-                risultato_json = risultato_json[7:]
-            if risultato_json.endswith("```"):
-                risultato_json = risultato_json[:-3]
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+            
+        Raises:
+            json.JSONDecodeError: Se il contenuto non è JSON valido.
+        """
+        # Pulizia dei caratteri speciali JSON
+        risultato_json = risultato_json.strip()
+        if risultato_json.startswith("```json"):
+            risultato_json = risultato_json[7:]
+        if risultato_json.endswith("```"):
+            risultato_json = risultato_json[:-3]
+        
+        try:
+            with cronometro("json"):
+                risultato = json.loads(risultato_json)
+        except json.JSONDecodeError:
+            JSON_NON_VALIDI.incrementa()
+            raise
+        
+        # Combina i suggerimenti dell'API con eventuali suggerimenti grammaticali
+        suggerimenti_api = risultato["suggerimenti"]
+        suggerimenti_grammaticali = []
+        
+        if "grammatica" in analisi and analisi["grammatica"].get("servizio_disponibile", False):
+            suggerimenti_grammaticali = analisi["grammatica"].get("suggerimenti", [])
+        
+        # Combina i suggerimenti, evitando duplicati
+        tutti_suggerimenti = suggerimenti_api.copy()
+        for sugg in suggerimenti_grammaticali:
+            if sugg not in tutti_suggerimenti:
+                tutti_suggerimenti.append(sugg)
+        
+        return RisultatoMiglioramento(
+            risultato["prompt_migliorato"],
+            tuple(tutti_suggerimenti),
+            risultato["spiegazione"],
+            analisi
+        )
+    
+    def _risultato_errore(self, errore: Exception, analisi: Dict[str, Any]) -> RisultatoErrore:
+        """
+        Converte un errore del miglioramento nel risultato mostrato all'utente.
+        
+        Args:
+            errore (Exception): L'errore sollevato.
+            analisi (dict): L'analisi del prompt, restituita comunque.
             
-            risultato = json.loads(risultato_json)
+        Returns:
+            RisultatoErrore: (messaggio, suggerimenti, spiegazione, analisi)
+        """
+        if isinstance(errore, json.JSONDecodeError):
+            self.logger.error(f"Errore nel parsing JSON: {str(errore)}")
+            return RisultatoErrore(
+                "Si è verificato un errore nel formato della risposta.",
+                ("Riprova con un prompt diverso",),
+                f"Errore di formato: {str(errore)}",
+                analisi
+            )
+        self.logger.error(f"Errore durante il miglioramento del prompt: {str(errore)}")
+        return RisultatoErrore(
+            "Si è verificato un errore durante l'elaborazione.",
+            ("Riprova con un prompt diverso", "Verifica la connessione internet"),
+            f"Errore: {str(errore)}",
+            analisi
+        )
+    
+    def _risultato_chiave_mancante(self, analisi: Dict[str, Any]) -> RisultatoErrore:
+        """Risultato restituito quando la chiave API di DeepSeek non è configurata."""
+        self.logger.error("Chiave API di DeepSeek mancante")
+        return RisultatoErrore(
+            "Impossibile migliorare il prompt: chiave API di DeepSeek mancante.",
+            ("Configura la chiave API di DeepSeek nel file .env",),
+            "Errore: chiave API mancante.",
+            analisi
+        )
             
-            self.ultimo_prompt_migliorato = risultato["prompt_migliorato"]
+    def migliora_prompt(self, prompt: str) -> tuple:
+        """
+        Utilizza DeepSeek per migliorare il prompt.
+        
+        Args:
+            prompt (str): Il prompt originale da migliorare.
+        
+        Returns:
+            tuple: (prompt_migliorato, suggerimenti, spiegazione_modifiche)
+        """
+        return self.migliora_e_analizza(prompt)[:3]
+    
+    def migliora_e_analizza(self, prompt: str, analisi: Optional[Dict[str, Any]] = None) -> RisultatoMiglioramento:
+        """
+        Migliora il prompt con DeepSeek e restituisce anche l'analisi locale,
+        calcolata una sola volta e riutilizzata per costruire la richiesta all'API.
+        
+        Le richieste concorrenti per lo stesso prompt, non ancora in cache,
+        attendono il risultato della prima invece di chiamare di nuovo l'API.
+        
+        Args:
+            prompt (str): Il prompt originale da migliorare.
+            analisi (dict, optional): L'analisi già calcolata con `analizza_prompt`
+                (ad esempio in un altro processo); se assente viene calcolata qui.
+        
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+        """
+        # Sanitizzazione dell'input
+        prompt = self._sanitizza_input(prompt)
+        
+        with raccogli_tempi(settings.metrics_in_results) as tempi:
+            # Verifica se il prompt è nella cache
+            cache_key = self._get_cache_key(prompt)
+            risultato = self._leggi_cache(cache_key)
+            if risultato is None:
+                risultato = self._single_flight.esegui(
+                    cache_key, self._migliora_senza_cache, prompt, cache_key, analisi
+                )
+        return self._con_tempi(risultato, tempi)
+    
+    def _migliora_senza_cache(self, prompt: str, cache_key: str,
+                              analisi: Optional[Dict[str, Any]] = None) -> RisultatoMiglioramento:
+        """
+        Analizza e migliora un prompt sanitizzato non presente in cache.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato.
+            cache_key (str): La chiave con cui salvare il risultato.
+            analisi (dict, optional): L'analisi già calcolata per il prompt.
+        
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+        """
+        if analisi is None:
+            analisi = self._analizza_prompt_sanitizzato(prompt)
+        
+        firma = self._firma_prompt(prompt)
+        simile = self._cerca_quasi_duplicato(firma)
+        if simile is not None and settings.near_duplicate_mode == "riusa":
+            return self._riusa_quasi_duplicato(simile, analisi)
+        
+        if not settings.deepseek_api_key:
+            return self._risultato_chiave_mancante(analisi)
+        
+        sezioni = self._sezioni_prompt(prompt, analisi)
+        if sezioni is not None:
+            risultato_tuple, completo = self._migliora_per_sezioni(sezioni, analisi)
+            if completo:
+                self._memorizza(cache_key, risultato_tuple, firma)
+            return risultato_tuple
+        
+        try:
+            user_message = self._costruisci_messaggio_utente(prompt, analisi, simile)
             
-            # Combina i suggerimenti dell'API con eventuali suggerimenti grammaticali
-            suggerimenti_api = risultato["suggerimenti"]
-            suggerimenti_grammaticali = []
+            # Chiamata API con il nuovo metodo
+            response_data = self._chiama_api_deepseek(SYSTEM_PROMPT_MIGLIORAMENTO, user_message)
             
-            if "grammatica" in analisi and analisi["grammatica"].get("servizio_disponibile", False):
-                suggerimenti_grammaticali = analisi["grammatica"].get("suggerimenti", [])
+            # Salva in cache
+            risultato_tuple = self._elabora_risposta_api(response_data, analisi)
+            self._memorizza(cache_key, risultato_tuple, firma)
             
-            # Combina i suggerimenti, evitando duplicati
-            tutti_suggerimenti = suggerimenti_api.copy()
-            for sugg in suggerimenti_grammaticali:
-                if sugg not in tutti_suggerimenti:
-                    tutti_suggerimenti.append(sugg)
+            return risultato_tuple
             
-            self.ultimi_suggerimenti = tutti_suggerimenti
+        except Exception as e:
+            return self._risultato_errore(e, analisi)
+    
+    async def migliora_prompt_async(self, prompt: str) -> tuple:
+        """
+        Versione asincrona di `migliora_prompt`.
+        
+        Args:
+            prompt (str): Il prompt originale da migliorare.
+        
+        Returns:
+            tuple: (prompt_migliorato, suggerimenti, spiegazione_modifiche)
+        """
+        return (await self.migliora_e_analizza_async(prompt))[:3]
+    
+    async def migliora_e_analizza_async(self, prompt: str) -> RisultatoMiglioramento:
+        """
+        Versione asincrona di `migliora_e_analizza`.
+        
+        L'analisi spaCy, che impegna la CPU, viene eseguita nell'executor
+        dell'analisi; l'attesa della risposta di DeepSeek non occupa alcun
+        thread, così un processo può gestire molte richieste in parallelo.
+        
+        Args:
+            prompt (str): Il prompt originale da migliorare.
+        
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+        """
+        # Sanitizzazione dell'input
+        prompt = self._sanitizza_input(prompt)
+        
+        with raccogli_tempi(settings.metrics_in_results) as tempi:
+            # Verifica se il prompt è nella cache
+            cache_key = self._get_cache_key(prompt)
+            risultato = self._leggi_cache(cache_key)
+            if risultato is None:
+                risultato = await self._single_flight.esegui_async(
+                    cache_key, self._migliora_senza_cache_async, prompt, cache_key
+                )
+        return self._con_tempi(risultato, tempi)
+    
+    async def _migliora_senza_cache_async(self, prompt: str, cache_key: str) -> RisultatoMiglioramento:
+        """
+        Versione asincrona di `_migliora_senza_cache`.
+        
+        Args:
+            prompt (str): Il prompt sanitizzato.
+            cache_key (str): La chiave con cui salvare il risultato.
+        
+        Returns:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+        """
+        analisi = await self._in_executor_analisi(self._analizza_prompt_sanitizzato, prompt)
+        
+        firma = self._firma_prompt(prompt)
+        simile = self._cerca_quasi_duplicato(firma)
+        if simile is not None and settings.near_duplicate_mode == "riusa":
+            return self._riusa_quasi_duplicato(simile, analisi)
+        
+        if not settings.deepseek_api_key:
+            return self._risultato_chiave_mancante(analisi)
+        
+        sezioni = self._sezioni_prompt(prompt, analisi)
+        if sezioni is not None:
+            risultato_tuple, completo = await self._migliora_per_sezioni_async(sezioni, analisi)
+            if completo:
+                self._memorizza(cache_key, risultato_tuple, firma)
+            return risultato_tuple
+        
+        try:
+            user_message = self._costruisci_messaggio_utente(prompt, analisi, simile)
+            response_data = await self._chiama_api_deepseek_async(SYSTEM_PROMPT_MIGLIORAMENTO, user_message)
             
             # Salva in cache
-            risultato_tuple = (
-                risultato["prompt_migliorato"],
-                tutti_suggerimenti,
-                risultato["spiegazione"]
-            )
-            self.cache[cache_key] = risultato_tuple
+            risultato_tuple = self._elabora_risposta_api(response_data, analisi)
+            self._memorizza(cache_key, risultato_tuple, firma)
             
             return risultato_tuple
             
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Errore nel parsing JSON: {str(e)}")
-            return (
-                "Si è verificato un errore nel formato della risposta.",
-                ["Riprova con un prompt diverso"],
-                f"Errore di formato: {str(e)}"
-            )
         except Exception as e:
-            self.logger.error(f"Errore durante il miglioramento del prompt: {str(e)}")
-            return (
-                "Si è verificato un errore durante l'elaborazione.",
-                ["Riprova con un prompt diverso", "Verifica la connessione internet"],
-                f"Errore: {str(e)}"
+            return self._risultato_errore(e, analisi)
+    
+    async def migliora_e_analizza_stream_async(self, prompt: str):
+        """
+        Migliora il prompt in streaming, restituendo risultati parziali.
+        
+        Il campo `prompt_migliorato` viene decodificato dal JSON man mano che
+        DeepSeek genera i token; suggerimenti e spiegazione arrivano con
+        l'ultimo risultato, quando la risposta è completa. Se lo stesso prompt
+        è già in elaborazione, si attende quel risultato senza una nuova chiamata.
+        
+        Args:
+            prompt (str): Il prompt originale da migliorare.
+        
+        Yields:
+            RisultatoMiglioramento: (prompt_migliorato, suggerimenti, spiegazione_modifiche, analisi)
+        """
+        # Sanitizzazione dell'input
+        prompt = self._sanitizza_input(prompt)
+        
+        # Verifica se il prompt è nella cache
+        cache_key = self._get_cache_key(prompt)
+        cached_result = self._leggi_cache(cache_key)
+        if cached_result is not None:
+            yield cached_result
+            return
+        
+        future, guida = self._single_flight.apri(cache_key)
+        if not guida:
+            try:
+                risultato_tuple = await asyncio.wrap_future(future)
+            except Exception as e:
+                risultato_tuple = self._risultato_errore(e, {})
+            yield risultato_tuple
+            return
+        
+        try:
+            analisi = await self._in_executor_analisi(self._analizza_prompt_sanitizzato, prompt)
+            
+            firma = self._firma_prompt(prompt)
+            simile = self._cerca_quasi_duplicato(firma)
+            sezioni = self._sezioni_prompt(prompt, analisi)
+            if simile is not None and settings.near_duplicate_mode == "riusa":
+                risultato_tuple = self._riusa_quasi_duplicato(simile, analisi)
+            elif not settings.deepseek_api_key:
+                risultato_tuple = self._risultato_chiave_mancante(analisi)
+            elif sezioni is not None:
+                # Le sezioni arrivano in parallelo: il risultato è completo solo quando finisce l'ultima
+                risultato_tuple, completo = await self._migliora_per_sezioni_async(sezioni, analisi)
+                if completo:
+                    self._memorizza(cache_key, risultato_tuple, firma)
+            else:
+                try:
+                    user_message = self._costruisci_messaggio_utente(prompt, analisi, simile)
+                    estrattore = EstrattoreCampoJSON("prompt_migliorato")
+                    
+                    # Chiusura esplicita: se il consumatore si ferma, connessione e permesso
+                    # del limitatore vengono rilasciati subito e non alla garbage collection
+                    flusso = self._stream_contenuto_deepseek_async(SYSTEM_PROMPT_MIGLIORAMENTO, user_message)
+                    async with aclosing(flusso):
+                        async for frammento in flusso:
+                            if estrattore.aggiungi(frammento):
+                                yield RisultatoMiglioramento(estrattore.valore, (), "", analisi)
+                    
+                    # Salva in cache
+                    risultato_tuple = self._elabora_contenuto_api(estrattore.testo, analisi)
+                    self._memorizza(cache_key, risultato_tuple, firma)
+                    
+                except Exception as e:
+                    risultato_tuple = self._risultato_errore(e, analisi)
+            
+            # Il risultato viene condiviso prima di essere restituito al consumatore
+            self._single_flight.completa(cache_key, future, risultato_tuple)
+            yield risultato_tuple
+        finally:
+            # Stream interrotto dal consumatore: sblocca chi era in attesa
+            self._single_flight.completa(
+                cache_key, future, errore=RuntimeError("Richiesta originale interrotta prima del completamento.")
             )
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Ricerca dei prompt quasi identici tra quelli già in cache.
+
+Ogni prompt è ridotto al testo normalizzato (minuscole, senza punteggiatura
+né spazi ripetuti) e all'insieme delle sue parole e coppie di parole
+consecutive; la similarità tra due prompt è l'indice di Jaccard tra questi
+insiemi. Testi che differiscono solo per spaziatura, maiuscole o
+punteggiatura hanno similarità 1.
+
+Ogni insieme è riassunto da una firma MinHash di `VALORI_FIRMA` valori e
+l'indice LSH raggruppa le firme per bande: una ricerca confronta solo le
+voci che coincidono con il prompt in almeno una banda, non tutte. La
+larghezza delle bande è scelta in base alla soglia, così una voce con
+similarità pari alla soglia viene trovata almeno nel 95% dei casi.
+"""
+
+import html
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+VALORI_FIRMA = 64  # Funzioni hash, e valori minimi, per firma
+RICHIAMO_MINIMO = 0.95  # Probabilità di trovare una voce con similarità pari alla soglia
+
+# Una firma MinHash: `VALORI_FIRMA` interi senza segno a 64 bit
+FirmaMinHash = np.ndarray
+
+_PAROLE = re.compile(r"\w+")
+
+# Permutazioni a moltiplicazione e somma modulo 2^64, uguali in ogni istanza
+_generatore = np.random.default_rng(20250514)
+_MOLTIPLICATORI = _generatore.integers(1, 2 ** 63, VALORI_FIRMA, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_INCREMENTI = _generatore.integers(0, 2 ** 63, VALORI_FIRMA, dtype=np.uint64)
+
+
+def normalizza_testo(testo: str) -> str:
+    """
+    Riduce il testo alla forma confrontata dalla ricerca dei quasi duplicati.
+
+    Decodifica le entità HTML introdotte dalla sanitizzazione, porta il testo
+    in minuscolo e mantiene solo le parole, separate da un singolo spazio.
+
+    Args:
+        testo (str): Il testo da normalizzare.
+
+    Returns:
+        str: Il testo normalizzato.
+    """
+    testo = unicodedata.normalize("NFKC", html.unescape(testo)).casefold()
+    return " ".join(_PAROLE.findall(testo))
+
+
+def firma_minhash(testo: str) -> Optional[FirmaMinHash]:
+    """
+    Calcola la firma MinHash del testo normalizzato.
+
+    Le caratteristiche sono le parole e le coppie di parole consecutive,
+    che rendono la firma sensibile anche all'ordine. Si usa `hash` di
+    Python: è diverso tra processi, ma l'indice vive nel processo che
+    calcola le firme.
+
+    Args:
+        testo (str): Il testo, già normalizzato con `normalizza_testo`.
+
+    Returns:
+        FirmaMinHash | None: I `VALORI_FIRMA` minimi, oppure None se il testo non contiene parole.
+    """
+    parole = testo.split()
+    if not parole:
+        return None
+    caratteristiche = set(parole)
+    caratteristiche.update(map(" ".join, zip(parole, parole[1:])))
+    hash_caratteristiche = np.fromiter(
+        (hash(caratteristica) for caratteristica in caratteristiche), dtype=np.int64, count=len(caratteristiche)
+    ).view(np.uint64)
+    # L'aritmetica su uint64 è modulo 2^64
+    permutati = np.outer(hash_caratteristiche, _MOLTIPLICATORI) + _INCREMENTI
+    return permutati.min(axis=0)
+
+
+def similarita_firme(prima: FirmaMinHash, seconda: FirmaMinHash) -> float:
+    """Stima l'indice di Jaccard tra i testi di due firme: la frazione di valori uguali."""
+    return float(np.count_nonzero(prima == seconda)) / VALORI_FIRMA
+
+
+def righe_per_banda(soglia: float) -> int:
+    """
+    Sceglie quanti valori compongono una banda dell'indice LSH.
+
+    Bande più larghe producono meno candidati da confrontare, ma una voce
+    viene trovata solo se coincide in tutti i valori di almeno una banda:
+    si sceglie la larghezza maggiore che rispetta `RICHIAMO_MINIMO` alla soglia.
+
+    Args:
+        soglia (float): La similarità minima cercata.
+
+    Returns:
+        int: Il numero di valori per banda, un divisore di `VALORI_FIRMA`.
+    """
+    for righe in (16, 8, 4, 2):
+        bande = VALORI_FIRMA // righe
+        if 1 - (1 - soglia ** righe) ** bande >= RICHIAMO_MINIMO:
+            return righe
+    return 1
+
+
+class QuasiDuplicato(NamedTuple):
+    """Una voce dell'indice simile a quella cercata."""
+    chiave: str
+    similarita: float
+
+
+class IndiceSimilarita:
+    """
+    Indice LSH delle firme MinHash dei prompt in cache, condiviso tra thread.
+
+    Mantiene al più `max_voci` firme, scartando quelle inserite meno di recente.
+    """
+
+    def __init__(self, soglia: float, max_voci: int):
+        """
+        Args:
+            soglia (float): Similarità minima, tra 0 e 1, perché una voce sia restituita.
+            max_voci (int): Numero massimo di firme mantenute.
+        """
+        self.soglia = soglia
+        self.max_voci = max_voci
+        self.righe = righe_per_banda(soglia)
+        self._lock = threading.Lock()
+        self._firme: "OrderedDict[str, FirmaMinHash]" = OrderedDict()
+        # Per banda: hash dei valori della banda -> chiavi con quei valori (di solito una)
+        self._secchi: List[Dict[int, List[str]]] = [{} for _ in range(VALORI_FIRMA // self.righe)]
+
+    def _bande(self, firma: FirmaMinHash) -> List[int]:
+        return [hash(banda.tobytes()) for banda in firma.reshape(-1, self.righe)]
+
+    def aggiungi(self, chiave: str, firma: FirmaMinHash) -> None:
+        """Inserisce o aggiorna la firma associata alla chiave."""
+        bande = self._bande(firma)
+        with self._lock:
+            self._rimuovi(chiave)
+            self._firme[chiave] = firma
+            for secchi, banda in zip(self._secchi, bande):
+                secchi.setdefault(banda, []).append(chiave)
+            while len(self._firme) > self.max_voci:
+                self._rimuovi(next(iter(self._firme)))
+
+    def rimuovi(self, chiave: str) -> None:
+        """Toglie la chiave dall'indice, se presente."""
+        with self._lock:
+            self._rimuovi(chiave)
+
+    def _rimuovi(self, chiave: str) -> None:
+        """Va chiamata con il lock."""
+        firma = self._firme.pop(chiave, None)
+        if firma is None:
+            return
+        for secchi, banda in zip(self._secchi, self._bande(firma)):
+            chiavi = secchi[banda]
+            chiavi.remove(chiave)
+            if not chiavi:
+                del secchi[banda]
+
+    def cerca(self, firma: FirmaMinHash, escluse: Tuple[str, ...] = ()) -> Optional[QuasiDuplicato]:
+        """
+        Cerca la voce più simile alla firma, con similarità almeno pari alla soglia.
+
+        Args:
+            firma (FirmaMinHash): La firma del prompt cercato.
+            escluse (tuple): Chiavi da ignorare, ad esempio quelle non più in cache.
+
+        Returns:
+            QuasiDuplicato | None: La chiave più simile e la sua similarità, se esiste.
+        """
+        bande = self._bande(firma)
+        with self._lock:
+            candidati = set()
+            for secchi, banda in zip(self._secchi, bande):
+                candidati.update(secchi.get(banda, ()))
+            candidati.difference_update(escluse)
+            firme = [(chiave, self._firme[chiave]) for chiave in candidati]
+
+        migliore = None
+        for chiave, altra in firme:
+            similarita = similarita_firme(firma, altra)
+            if similarita >= self.soglia and (migliore is None or similarita > migliore.similarita):
+                migliore = QuasiDuplicato(chiave, similarita)
+        return migliore
+
+    def clear(self) -> None:
+        """Svuota l'indice."""
+        with self._lock:
+            self._firme.clear()
+            for secchi in self._secchi:
+                secchi.clear()
+
+    def statistiche(self) -> Dict[str, Any]:
+        """Restituisce il numero di firme, la soglia di similarità e i valori per banda."""
+        with self._lock:
+            return {"voci": len(self._firme), "soglia": self.soglia, "righe_per_banda": self.righe}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._firme)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Analisi della struttura dei prompt.
+
+Il testo viene letto una riga alla volta, in un'unica passata, con pattern
+compilati all'import. Riconosce titoli Markdown, elenchi puntati e numerati
+con la loro profondità, blocchi di codice, citazioni, tabelle e separatori.
+Una riga con un marcatore di elenco conta come voce solo se fa parte di un
+elenco di almeno `MIN_VOCI_ELENCO` voci: "a) sì" da sola è testo normale.
+Il testo atteso è quello già sanitizzato con `html.escape`.
+"""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+_RE_RECINTO_CODICE = re.compile(r"^[ \t]*(`{3,}|~{3,})[ \t]*([\w+#.-]*)")
+_RE_TITOLO = re.compile(r"^[ \t]{0,3}(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$")
+_RE_SEPARATORE = re.compile(r"^[ \t]*([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_RE_VOCE_ELENCO = re.compile(r"^([ \t]*)[-*•+][ \t]+\S")
+_RE_VOCE_NUMERATA = re.compile(r"^([ \t]*)(?:\d{1,3}|[a-z])[.)][ \t]+\S")
+_RE_CITAZIONE = re.compile(r"^[ \t]*(?:&gt;|>)")
+_RE_RIGA_TABELLA = re.compile(r"^[ \t]*\|.*\|[ \t]*$")
+_RE_FORMATTAZIONE_INLINE = re.compile(r"\*\*\S.*?\*\*|__\S.*?__|`[^`\n]+`|(?<![\w*])\*[^\s*][^*\n]*\*(?![\w*])")
+_RE_ENTITA = re.compile(r"&(?:#\d{1,7}|#[xX][0-9a-fA-F]{1,6}|\w{1,31});")
+
+
+class SezioneCodice(str):
+    """Sezione formata da un blocco di codice più lungo del massimo, da lasciare invariata."""
+    __slots__ = ()
+
+
+# Voci consecutive necessarie perché delle righe con marcatore formino un elenco
+MIN_VOCI_ELENCO = 2
+
+
+def _rientro(spazi: str) -> int:
+    return len(spazi.expandtabs(4))
+
+
+def _profondita_elenco(rientri: List[int]) -> int:
+    """Restituisce la profondità massima di un elenco dati i rientri delle sue voci."""
+    aperti: List[int] = []
+    profondita = 0
+    for rientro in rientri:
+        while aperti and aperti[-1] > rientro:
+            aperti.pop()
+        if not aperti or aperti[-1] < rientro:
+            aperti.append(rientro)
+        profondita = max(profondita, len(aperti))
+    return profondita
+
+
+def analizza_struttura(testo: str) -> Dict[str, Any]:
+    """
+    Analizza la struttura di un testo in un'unica scansione delle righe.
+
+    Args:
+        testo (str): Il testo da analizzare.
+
+    Returns:
+        dict: Indicatori di presenza (compatibili con l'analisi precedente),
+        conteggi per tipo di elemento, titoli, blocchi di codice e profondità
+        massima degli elenchi.
+    """
+    conteggi = {
+        "righe": 0,
+        "paragrafi": 0,
+        "titoli": 0,
+        "voci_elenco": 0,
+        "voci_numerate": 0,
+        "blocchi_codice": 0,
+        "citazioni": 0,
+        "righe_tabella": 0,
+        "separatori": 0,
+        "formattazione_inline": 0
+    }
+    titoli: List[Dict[str, Any]] = []
+    blocchi_codice: List[Dict[str, Any]] = []
+    profondita_massima = 0
+
+    # Voci dell'elenco in corso (tipo, rientro), conteggiate solo quando l'elenco si chiude
+    voci_aperte: List[Tuple[str, int]] = []
+
+    def chiudi_elenco() -> None:
+        nonlocal profondita_massima
+        if len(voci_aperte) >= MIN_VOCI_ELENCO:
+            for tipo, _ in voci_aperte:
+                conteggi[tipo] += 1
+            profondita_massima = max(profondita_massima, _profondita_elenco([r for _, r in voci_aperte]))
+        voci_aperte.clear()
+
+    blocco_aperto = None
+    recinto_aperto = ""
+    riga_precedente_vuota = True
+
+    for numero, riga in enumerate(testo.splitlines(), 1):
+        conteggi["righe"] += 1
+
+        if blocco_aperto is not None:
+            match = _RE_RECINTO_CODICE.match(riga)
+            if match and match.group(1)[0] == recinto_aperto[0] and len(match.group(1)) >= len(recinto_aperto):
+                blocco_aperto["chiuso"] = True
+                blocco_aperto = None
+            else:
+                blocco_aperto["righe"] += 1
+            continue
+
+        if not riga.strip():
+            riga_precedente_vuota = True
+            continue
+        if riga_precedente_vuota:
+            conteggi["paragrafi"] += 1
+        riga_precedente_vuota = False
+
+        match = _RE_RECINTO_CODICE.match(riga)
+        if match:
+            recinto_aperto = match.group(1)
+            blocco_aperto = {"riga": numero, "linguaggio": match.group(2) or None, "righe": 0, "chiuso": False}
+            blocchi_codice.append(blocco_aperto)
+            conteggi["blocchi_codice"] += 1
+            continue
+
+        match = _RE_TITOLO.match(riga)
+        if match:
+            titoli.append({"livello": len(match.group(1)), "testo": match.group(2), "riga": numero})
+            conteggi["titoli"] += 1
+            chiudi_elenco()
+            continue
+
+        # Prima degli elenchi: "- - -" e "***" sono separatori, non voci
+        if _RE_SEPARATORE.match(riga):
+            conteggi["separatori"] += 1
+            chiudi_elenco()
+            continue
+
+        match = _RE_VOCE_ELENCO.match(riga) or _RE_VOCE_NUMERATA.match(riga)
+        if match:
+            tipo = "voci_elenco" if match.re is _RE_VOCE_ELENCO else "voci_numerate"
+            voci_aperte.append((tipo, _rientro(match.group(1))))
+        elif _RE_CITAZIONE.match(riga):
+            conteggi["citazioni"] += 1
+        elif _RE_RIGA_TABELLA.match(riga):
+            conteggi["righe_tabella"] += 1
+        elif not riga[0].isspace():
+            # Una riga di testo non rientrata chiude gli elenchi aperti
+            chiudi_elenco()
+
+        conteggi["formattazione_inline"] += len(_RE_FORMATTAZIONE_INLINE.findall(riga))
+    chiudi_elenco()
+
+    return {
+        "ha_elenchi": conteggi["voci_elenco"] > 0,
+        "ha_numerazione": conteggi["voci_numerate"] > 0,
+        "ha_paragrafi": conteggi["paragrafi"] > 1,
+        "ha_formattazione": any(conteggi[chiave] for chiave in (
+            "titoli", "blocchi_codice", "righe_tabella", "separatori", "formattazione_inline"
+        )),
+        "conteggi": conteggi,
+        "titoli": titoli,
+        "profondita_elenchi": profondita_massima,
+        "blocchi_codice": blocchi_codice
+    }
+
+
+def descrivi_struttura(struttura: Dict[str, Any], max_titoli: int = 8) -> str:
+    """
+    Riassume la struttura in una riga leggibile, da includere nel messaggio per l'API.
+
+    Args:
+        struttura (dict): Il risultato di `analizza_struttura`.
+        max_titoli (int): Numero massimo di titoli elencati.
+
+    Returns:
+        str: La descrizione, oppure "testo semplice" se non ci sono elementi strutturali.
+    """
+    conteggi = struttura["conteggi"]
+    parti = []
+    if struttura["titoli"]:
+        titoli = ", ".join(titolo["testo"] for titolo in struttura["titoli"][:max_titoli])
+        altri = len(struttura["titoli"]) - max_titoli
+        parti.append(f"{conteggi['titoli']} sezioni ({titoli}{f', altre {altri}' if altri > 0 else ''})")
+    voci = conteggi["voci_elenco"] + conteggi["voci_numerate"]
+    if voci:
+        parti.append(f"{voci} voci di elenco su {struttura['profondita_elenchi']} livelli")
+    if conteggi["blocchi_codice"]:
+        parti.append(f"{conteggi['blocchi_codice']} blocchi di codice")
+    if conteggi["righe_tabella"]:
+        parti.append(f"tabella di {conteggi['righe_tabella']} righe")
+    if conteggi["paragrafi"] > 1:
+        parti.append(f"{conteggi['paragrafi']} paragrafi")
+    return ", ".join(parti) if parti else "testo semplice"
+
+
+def _taglio_riga(riga: str, dimensione_massima: int) -> int:
+    """Sceglie dove tagliare una riga troppo lunga: dopo l'ultimo spazio utile, mai dentro un'entità HTML."""
+    taglio = riga.rfind(" ", 0, dimensione_massima) + 1 or dimensione_massima
+    for match in _RE_ENTITA.finditer(riga, max(0, taglio - 40), taglio + 40):
+        if match.start() < taglio < match.end():
+            return match.start() or match.end()
+    return taglio
+
+
+def dividi_in_sezioni(testo: str, dimensione_massima: int, struttura: Dict[str, Any] = None) -> List[str]:
+    """
+    Divide un testo lungo in sezioni seguendo la sua struttura.
+
+    I tagli cadono prima dei titoli e tra i paragrafi (un elenco resta con il
+    proprio paragrafo), mai all'interno di un blocco di codice. I pezzi
+    consecutivi vengono raggruppati fino a `dimensione_massima` caratteri;
+    una sezione lunga almeno metà del massimo si chiude al titolo successivo.
+    Solo un singolo pezzo più lungo del massimo viene diviso: per righe, poi
+    le righe troppo lunghe sugli spazi, senza spezzare le entità HTML. Un
+    blocco di codice più lungo del massimo diventa una sola `SezioneCodice`,
+    recinti compresi, da non migliorare. La concatenazione delle sezioni
+    restituisce il testo originale.
+
+    Args:
+        testo (str): Il testo da dividere, già sanitizzato.
+        dimensione_massima (int): La lunghezza massima di una sezione.
+        struttura (dict, optional): Il risultato di `analizza_struttura` per il testo.
+
+    Returns:
+        list: Le sezioni, nell'ordine del testo.
+    """
+    if struttura is None:
+        struttura = analizza_struttura(testo)
+    righe = testo.splitlines(keepends=True)
+
+    # Righe (numerate da 1) all'interno dei blocchi di codice, recinto di chiusura compreso
+    righe_codice = set()
+    for blocco in struttura["blocchi_codice"]:
+        ultima = blocco["riga"] + blocco["righe"] + (1 if blocco["chiuso"] else 0)
+        righe_codice.update(range(blocco["riga"] + 1, ultima + 1))
+    inizi_codice = {blocco["riga"] for blocco in struttura["blocchi_codice"]}
+    righe_titolo = {titolo["riga"] for titolo in struttura["titoli"]}
+
+    # Pezzi indivisibili: (testo, inizia con un titolo, unità in cui dividerlo se troppo lungo)
+    # Le unità sono le singole righe, tranne i blocchi di codice che restano interi
+    pezzi: List[List[Any]] = []
+    precedente_vuota = False
+    for numero, riga in enumerate(righe, 1):
+        vuota = not riga.strip()
+        taglio = numero not in righe_codice and not vuota and (numero in righe_titolo or precedente_vuota)
+        if taglio or not pezzi:
+            pezzi.append(["", numero in righe_titolo, []])
+        pezzo = pezzi[-1]
+        pezzo[0] += riga
+        if numero in righe_codice and pezzo[2] and pezzo[2][-1][1]:
+            pezzo[2][-1][0] += riga
+        else:
+            pezzo[2].append([riga, numero in inizi_codice])
+        precedente_vuota = vuota and numero not in righe_codice
+
+    sezioni: List[str] = []
+    corrente = ""
+    for pezzo, inizia_con_titolo, unita in pezzi:
+        chiudi = len(corrente) + len(pezzo) > dimensione_massima or (
+            inizia_con_titolo and len(corrente) >= dimensione_massima // 2
+        )
+        if corrente and chiudi:
+            sezioni.append(corrente)
+            corrente = ""
+        if len(pezzo) <= dimensione_massima:
+            corrente += pezzo
+            continue
+        # Pezzo troppo lungo: per righe e blocchi di codice interi
+        for parte, codice in unita:
+            if len(corrente) + len(parte) > dimensione_massima and corrente:
+                sezioni.append(corrente)
+                corrente = ""
+            if len(parte) <= dimensione_massima:
+                corrente += parte
+            elif codice:
+                sezioni.append(SezioneCodice(parte))
+            else:
+                while len(parte) > dimensione_massima:
+                    taglio = _taglio_riga(parte, dimensione_massima)
+                    sezioni.append(parte[:taglio])
+                    parte = parte[taglio:]
+                corrente = parte
+    if corrente:
+        sezioni.append(corrente)
+    return sezioni
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# I moduli del progetto sono al primo livello del repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def nlp_vuoto():
+    """Sostituisce il modello spaCy condiviso con una pipeline italiana vuota, per i test senza modelli installati."""
+    import spacy
+
+    import prompt_perfezionatore
+
+    precedente = (prompt_perfezionatore._nlp, prompt_perfezionatore._nlp_caricato)
+    modello = spacy.blank("it")
+    prompt_perfezionatore.imposta_nlp(modello)
+    yield modello
+    prompt_perfezionatore._nlp, prompt_perfezionatore._nlp_caricato = precedente
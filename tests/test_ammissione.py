@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ammissione import PianificatoreRichieste, ServizioOccupato
+
+
+def _attendi_in_coda(pianificatore, numero):
+    limite = time.monotonic() + 5
+    while sum(pianificatore.statistiche()["in_coda"].values()) < numero:
+        assert time.monotonic() < limite
+        time.sleep(0.005)
+
+
+def test_priorita_e_turno_tra_utenti():
+    pianificatore = PianificatoreRichieste(posti=1, capacita_coda=10, scadenze={})
+    ordine = []
+
+    def richiesta(utente, classe, etichetta):
+        with pianificatore.turno(utente, classe):
+            ordine.append(etichetta)
+
+    richieste = [
+        ("c", "batch", "c1"),
+        ("a", "interattiva", "a1"),
+        ("a", "interattiva", "a2"),
+        ("a", "interattiva", "a3"),
+        ("b", "interattiva", "b1"),
+    ]
+    thread = []
+    with pianificatore.turno("occupante"):
+        for posizione, argomenti in enumerate(richieste, 1):
+            thread.append(threading.Thread(target=richiesta, args=argomenti))
+            thread[-1].start()
+            _attendi_in_coda(pianificatore, posizione)
+    for t in thread:
+        t.join(5)
+
+    # Prima le interattive, a turno tra gli utenti, poi le batch
+    assert ordine == ["a1", "b1", "a2", "a3", "c1"]
+    assert pianificatore.statistiche()["in_corso"] == 0
+
+
+def test_coda_piena_rifiuta_subito():
+    pianificatore = PianificatoreRichieste(posti=1, capacita_coda=0, scadenze={})
+    with pianificatore.turno("a"):
+        with pytest.raises(ServizioOccupato):
+            with pianificatore.turno("b"):
+                pass
+    with pianificatore.turno("b"):
+        pass
+
+
+def test_attesa_scaduta_lascia_la_coda():
+    pianificatore = PianificatoreRichieste(posti=1, capacita_coda=5, scadenze={"interattiva": 0.05})
+    with pianificatore.turno("a", scadenza=None):
+        with pytest.raises(ServizioOccupato):
+            with pianificatore.turno("b"):
+                pass
+    assert pianificatore.statistiche()["in_coda"] == {"interattiva": 0, "batch": 0}
+
+
+def test_turno_async_rispetta_il_turno():
+    pianificatore = PianificatoreRichieste(posti=1, capacita_coda=10, scadenze={})
+    ordine = []
+
+    async def richiesta(utente, etichetta):
+        async with pianificatore.turno_async(utente):
+            ordine.append(etichetta)
+            await asyncio.sleep(0)
+
+    async def principale():
+        async with pianificatore.turno_async("occupante"):
+            compiti = []
+            for utente, etichetta in (("a", "a1"), ("a", "a2"), ("b", "b1")):
+                compiti.append(asyncio.create_task(richiesta(utente, etichetta)))
+                await asyncio.sleep(0)
+        await asyncio.gather(*compiti)
+
+    asyncio.run(principale())
+    assert ordine == ["a1", "b1", "a2"]
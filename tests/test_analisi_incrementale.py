@@ -0,0 +1,67 @@
+import pytest
+
+from analisi_incrementale import AnalizzatoreIncrementale, dividi_in_blocchi
+from prompt_perfezionatore import PromptPerfezionatore, settings
+
+PARAGRAFI = [
+    "Scrivi una relazione sul progetto di migrazione dei server. Indica le fasi principali e i rischi.",
+    "Per ogni fase riporta la durata stimata, il responsabile e le dipendenze da altri gruppi. "
+    "Evidenzia le attività che richiedono un fermo dei servizi!",
+    "- Inventario delle macchine.\n- Copia dei dati.\n- Verifica finale.",
+    "Il documento deve essere leggibile anche da chi non conosce l'infrastruttura. Usa un tono formale?",
+]
+TESTO = "\n\n".join(PARAGRAFI)
+# Modificato un solo paragrafo, gli altri restano identici
+TESTO_MODIFICATO = TESTO.replace("la durata stimata", "la durata stimata in giorni lavorativi")
+
+
+def _token(doc):
+    return [(token.text, token.whitespace_) for token in doc]
+
+
+def _frasi(doc):
+    return [frase.text for frase in doc.sents]
+
+
+def test_blocchi_ricompongono_il_testo():
+    assert "".join(dividi_in_blocchi(TESTO, 1000)) == TESTO
+    assert len(dividi_in_blocchi(TESTO, 1000)) == len(PARAGRAFI)
+    # Oltre la dimensione massima i paragrafi vengono divisi in righe e frasi
+    piccoli = dividi_in_blocchi(TESTO, 40)
+    assert "".join(piccoli) == TESTO
+    assert len(piccoli) > len(PARAGRAFI)
+
+
+@pytest.mark.parametrize("dimensione_massima", [1000, 40])
+def test_documento_ricomposto_uguale_al_testo_intero(nlp_vuoto, dimensione_massima):
+    # imposta_nlp aggiunge il sentencizer alla pipeline vuota: le frasi sono confrontabili
+    analizzatore = AnalizzatoreIncrementale(100, dimensione_massima)
+    analizzatore.documento(TESTO, nlp_vuoto)
+    analizzati = analizzatore.statistiche()["blocchi_analizzati"]
+
+    doc = analizzatore.documento(TESTO_MODIFICATO, nlp_vuoto)
+    intero = nlp_vuoto(TESTO_MODIFICATO)
+
+    assert doc.text == TESTO_MODIFICATO
+    assert _token(doc) == _token(intero)
+    assert _frasi(doc) == _frasi(intero)
+    statistiche = analizzatore.statistiche()
+    # Solo il blocco modificato viene rianalizzato
+    assert statistiche["blocchi_analizzati"] - analizzati == 1
+    assert statistiche["blocchi_riutilizzati"] > 0
+
+
+def test_analisi_incrementale_uguale_a_quella_completa(nlp_vuoto, monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", "memoria")
+    perfezionatore = PromptPerfezionatore()
+
+    monkeypatch.setattr(settings, "incremental_analysis_min_chars", 0)
+    attese = [perfezionatore.analizza_prompt(testo) for testo in (TESTO, TESTO_MODIFICATO)]
+    monkeypatch.setattr(settings, "incremental_analysis_min_chars", 1)
+    incrementali = [perfezionatore.analizza_prompt(testo) for testo in (TESTO, TESTO_MODIFICATO)]
+
+    assert perfezionatore._analizzatore_incrementale.statistiche()["blocchi_riutilizzati"] > 0
+    for attesa, incrementale in zip(attese, incrementali):
+        assert "errore" not in incrementale
+        for chiave in ("lunghezza_parole", "lunghezza_frasi", "complessita", "leggibilita", "chiarezza", "struttura"):
+            assert incrementale[chiave] == attesa[chiave], chiave
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.stub_deepseek import RISPOSTA_PREDEFINITA, StubDeepSeek
+from prompt_perfezionatore import PromptPerfezionatore, RisultatoErrore, settings
+
+
+@pytest.fixture
+def perfezionatore(monkeypatch, nlp_vuoto):
+    with StubDeepSeek() as stub:
+        monkeypatch.setattr(settings, "deepseek_api_url", stub.url)
+        monkeypatch.setattr(settings, "deepseek_api_key", "chiave-di-test")
+        monkeypatch.setattr(settings, "cache_backend", "memoria")
+        yield PromptPerfezionatore()
+
+
+async def _ultimo(flusso):
+    risultato = None
+    async for risultato in flusso:
+        pass
+    return risultato
+
+
+def test_stessa_istanza_in_event_loop_successivi(perfezionatore):
+    # Ogni asyncio.run chiude il proprio loop: il client del primo non è più utilizzabile
+    primo = asyncio.run(perfezionatore.migliora_e_analizza_async("Scrivi una email al cliente."))
+    secondo = asyncio.run(_ultimo(perfezionatore.migliora_e_analizza_stream_async("Scrivi una lettera al fornitore.")))
+    terzo = asyncio.run(perfezionatore.migliora_e_analizza_async("Scrivi un messaggio al collega."))
+
+    for risultato in (primo, secondo, terzo):
+        assert not isinstance(risultato, RisultatoErrore)
+        assert risultato.prompt_migliorato == RISPOSTA_PREDEFINITA["prompt_migliorato"]
+
+
+def test_chiusura_nel_loop_del_client(perfezionatore):
+    async def usa_e_chiudi():
+        await perfezionatore.migliora_e_analizza_async("Riassumi il documento allegato.")
+        client = perfezionatore._client_async
+        await perfezionatore.chiudi_async()
+        return client
+
+    assert asyncio.run(usa_e_chiudi()).is_closed
+    assert perfezionatore._client_async is None
+
+
+def test_chiusura_da_un_altro_thread(perfezionatore):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(
+            perfezionatore.migliora_e_analizza_async("Traduci il testo in inglese."), loop
+        ).result(10)
+        client = perfezionatore._client_async
+        perfezionatore.chiudi()
+        assert client.is_closed
+        assert perfezionatore._client_async is None
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
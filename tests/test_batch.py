@@ -0,0 +1,60 @@
+import io
+import json
+
+import pytest
+
+from batch import analizza_in_blocco
+from prompt_perfezionatore import PromptPerfezionatore, settings
+
+# Lunghezze tutte diverse: l'analisi identifica il prompt da cui proviene
+PROMPTS = [
+    "Scrivi una email al cliente.",
+    "",
+    "Riassumi il testo in tre punti. Usa un tono neutro.",
+    "   ",
+    "Traduci.",
+    "Elenca i passaggi per configurare il server di posta, indicando per ognuno il tempo stimato.",
+    "",
+]
+
+
+@pytest.fixture
+def perfezionatore(monkeypatch, nlp_vuoto):
+    monkeypatch.setattr(settings, "cache_backend", "memoria")
+    perfezionatore = PromptPerfezionatore()
+    yield perfezionatore
+    perfezionatore.chiudi()
+
+
+def _senza_tempi(analisi):
+    return {chiave: valore for chiave, valore in analisi.items() if chiave != "tempi"}
+
+
+def test_analizza_prompts_mantiene_l_ordine(perfezionatore):
+    attese = [perfezionatore.analizza_prompt(prompt) for prompt in PROMPTS]
+    # batch_size piccolo: l'ordine va mantenuto anche tra un batch e l'altro
+    ottenute = list(perfezionatore.analizza_prompts(iter(PROMPTS), batch_size=2, n_process=1))
+
+    assert ottenute == attese
+    assert [analisi.get("lunghezza_caratteri") for analisi in ottenute] == [28, None, 51, None, 8, 92, None]
+
+
+def test_analizza_prompts_con_tempi(perfezionatore, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_in_results", True)
+    ottenute = list(perfezionatore.analizza_prompts(PROMPTS, batch_size=2, n_process=1))
+
+    assert all("tempi" in analisi for analisi in ottenute)
+    assert "metriche" in ottenute[0]["tempi"]
+    monkeypatch.setattr(settings, "metrics_in_results", False)
+    assert [_senza_tempi(analisi) for analisi in ottenute] == [perfezionatore.analizza_prompt(prompt) for prompt in PROMPTS]
+
+
+def test_analizza_in_blocco_mantiene_l_ordine(perfezionatore):
+    output = io.StringIO()
+    coppie = [(f"p{indice}", prompt) for indice, prompt in enumerate(PROMPTS)]
+
+    assert analizza_in_blocco(iter(coppie), output, processi=1, batch_size=3) == len(PROMPTS)
+
+    record = [json.loads(riga) for riga in output.getvalue().splitlines()]
+    assert [r["id"] for r in record] == [id_prompt for id_prompt, _ in coppie]
+    assert [r["analisi"] for r in record] == [perfezionatore.analizza_prompt(prompt) for prompt in PROMPTS]
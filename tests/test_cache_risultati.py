@@ -0,0 +1,69 @@
+import sqlite3
+import time
+
+import pytest
+
+from cache_risultati import BackendCache, CacheMemoriaTTL, CacheSQLite
+
+
+def _ultimo_accesso(percorso, chiave):
+    with sqlite3.connect(percorso) as connessione:
+        return connessione.execute("SELECT ultimo_accesso FROM risultati WHERE chiave = ?", (chiave,)).fetchone()[0]
+
+
+def test_lettura_ravvicinata_non_aggiorna_l_accesso(tmp_path):
+    percorso = str(tmp_path / "cache.sqlite")
+    cache = CacheSQLite(percorso, max_voci=10, ttl=3600)
+    cache.set("chiave", {"valore": 1})
+    scrittura = _ultimo_accesso(percorso, "chiave")
+
+    connessione = cache._connessione()
+    modifiche = connessione.total_changes
+    assert cache.get("chiave") == {"valore": 1}
+    assert connessione.total_changes == modifiche
+    assert _ultimo_accesso(percorso, "chiave") == scrittura
+
+
+def test_lettura_dopo_l_intervallo_aggiorna_l_accesso(tmp_path):
+    percorso = str(tmp_path / "cache.sqlite")
+    cache = CacheSQLite(percorso, max_voci=10, ttl=3600)
+    cache.set("chiave", {"valore": 1})
+    cache._connessione().execute("UPDATE risultati SET ultimo_accesso = ?", (time.time() - 400,))
+
+    assert cache.get("chiave") == {"valore": 1}
+    assert time.time() - _ultimo_accesso(percorso, "chiave") < 5
+
+
+def test_evizione_della_voce_meno_usata(tmp_path):
+    cache = CacheSQLite(str(tmp_path / "cache.sqlite"), max_voci=2, ttl=3600)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Accessi più vecchi dell'intervallo: la lettura aggiorna quello di "a"
+    cache._connessione().execute("UPDATE risultati SET ultimo_accesso = ultimo_accesso - 1000")
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_backend_incompleto_non_istanziabile():
+    class SoloLettura(BackendCache):
+        def _leggi(self, chiave):
+            return None
+
+    with pytest.raises(TypeError, match="_scrivi"):
+        SoloLettura()
+    with pytest.raises(TypeError):
+        BackendCache()
+
+
+def test_contatori_del_backend_in_memoria():
+    cache = CacheMemoriaTTL(max_voci=10, ttl=3600)
+    cache.set("chiave", "valore")
+
+    assert cache.get("chiave") == "valore"
+    assert cache.get("assente") is None
+    assert cache.get("assente", conta=False) is None
+    assert cache.statistiche()["voci"] == 1
+    assert cache.contatori.come_dict()["hit"] == 1 and cache.contatori.come_dict()["miss"] == 1
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from concorrenza import SingleFlight
+
+
+def test_single_flight_esegue_una_volta_per_chiave():
+    single_flight = SingleFlight()
+    sblocca = threading.Event()
+    chiamate = []
+
+    def lavoro():
+        chiamate.append(1)
+        sblocca.wait(5)
+        return "risultato"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(single_flight.esegui, "chiave", lavoro) for _ in range(4)]
+        while single_flight.duplicati < 3:
+            threading.Event().wait(0.01)
+        sblocca.set()
+        risultati = [future.result(5) for future in futures]
+
+    assert risultati == ["risultato"] * 4
+    assert len(chiamate) == 1
+    # Terminata la chiamata, la chiave viene eseguita di nuovo
+    assert single_flight.esegui("chiave", lambda: "nuovo") == "nuovo"
+
+
+def test_single_flight_propaga_l_errore_a_chi_attende():
+    single_flight = SingleFlight()
+    future, guida = single_flight.apri("chiave")
+    assert guida
+    attesa, guida_seconda = single_flight.apri("chiave")
+    assert attesa is future and not guida_seconda
+    single_flight.completa("chiave", future, errore=ValueError("fallito"))
+    with pytest.raises(ValueError):
+        attesa.result(1)
+
+
+def test_single_flight_async_condivide_il_risultato():
+    single_flight = SingleFlight()
+    chiamate = []
+
+    async def lavoro(valore):
+        chiamate.append(valore)
+        await asyncio.sleep(0.01)
+        return valore * 2
+
+    async def principale():
+        return await asyncio.gather(
+            *(single_flight.esegui_async("chiave", lavoro, 21) for _ in range(5)),
+            single_flight.esegui_async("altra", lavoro, 1)
+        )
+
+    assert asyncio.run(principale()) == [42] * 5 + [2]
+    assert sorted(chiamate) == [1, 21]
+    assert single_flight.duplicati == 4
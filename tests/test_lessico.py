@@ -0,0 +1,43 @@
+import html
+import json
+
+import pytest
+
+from lessico import LessicoChiarezza, carica_lessico_chiarezza
+
+
+def test_lessico_predefinito():
+    lessico = carica_lessico_chiarezza()
+    assert "forse" in lessico.termini["parole_ambigue"]
+    assert "più o meno" in lessico.termini["espressioni_vaghe"]
+    # Compilato una volta per processo
+    assert carica_lessico_chiarezza() is lessico
+
+
+def test_file_aggiuntivo_estende_il_lessico(tmp_path):
+    percorso = tmp_path / "dominio.json"
+    percorso.write_text(json.dumps({"parole_ambigue": ["Roba"], "espressioni_vaghe": ["a  occhio"]}), encoding="utf-8")
+    predefinito = carica_lessico_chiarezza()
+    lessico = carica_lessico_chiarezza((str(percorso),))
+    assert lessico.termini["parole_ambigue"] >= predefinito.termini["parole_ambigue"] | {"roba"}
+    assert "a occhio" in lessico.termini["espressioni_vaghe"]
+    assert lessico.versione != predefinito.versione
+
+
+def test_categoria_sconosciuta(tmp_path):
+    percorso = tmp_path / "errato.json"
+    percorso.write_text(json.dumps({"parole_inventate": ["x"]}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        LessicoChiarezza.da_file([str(percorso)])
+
+
+def test_cerca_parole_intere_e_apostrofi_sanitizzati():
+    lessico = LessicoChiarezza({"parole_ambigue": ["tipo"], "espressioni_vaghe": ["all'incirca", "più o meno"]})
+    testo = html.escape("Un prototipo, TIPO questo: all'incirca  più   o meno.")
+    trovate = [(c.termine, c.categoria) for c in lessico.cerca(testo)]
+    assert trovate == [
+        ("tipo", "parole_ambigue"),
+        ("all'incirca", "espressioni_vaghe"),
+        ("più o meno", "espressioni_vaghe"),
+    ]
+    assert lessico.conta(lessico.cerca(testo)) == {"parole_ambigue": 1, "espressioni_vaghe": 2}
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+import pytest
+
+import concorrenza
+from concorrenza import LimitatoreAdattivo, PermessoNonDisponibile
+
+
+class OrologioFinto:
+    def __init__(self):
+        self.adesso = 1000.0
+
+    def __call__(self):
+        return self.adesso
+
+
+@pytest.fixture
+def orologio(monkeypatch):
+    # Solo per i test in cui il limitatore non deve mai attendere davvero
+    orologio = OrologioFinto()
+    monkeypatch.setattr(concorrenza.time, "monotonic", orologio)
+    return orologio
+
+
+def test_aimd_dimezza_su_sovraccarico_e_cresce_sui_successi(orologio):
+    limitatore = LimitatoreAdattivo(concorrenza_iniziale=8, concorrenza_massima=9, intervallo_riduzione=1.0)
+
+    limitatore.acquisisci()
+    limitatore.rilascia(sovraccarico=True)
+    assert limitatore.limite == 4
+    # Errori ravvicinati contano come uno solo
+    limitatore.acquisisci()
+    limitatore.rilascia(sovraccarico=True)
+    assert limitatore.limite == 4
+
+    orologio.adesso += 1.0
+    limitatore.acquisisci()
+    limitatore.rilascia(sovraccarico=True)
+    assert limitatore.limite == 2
+
+    for atteso in (2.5, 2.9):
+        limitatore.acquisisci()
+        limitatore.rilascia(successo=True)
+        assert limitatore.limite == pytest.approx(atteso)
+    # Un errore non di sovraccarico lascia il limite invariato
+    limitatore.acquisisci()
+    limitatore.rilascia(successo=False)
+    assert limitatore.limite == pytest.approx(2.9)
+
+
+def test_aimd_rispetta_minimo_e_massimo(orologio):
+    limitatore = LimitatoreAdattivo(concorrenza_iniziale=2, concorrenza_massima=3, concorrenza_minima=1)
+    for _ in range(3):
+        orologio.adesso += 10
+        limitatore.acquisisci()
+        limitatore.rilascia(sovraccarico=True)
+    assert limitatore.limite == 1
+    for _ in range(20):
+        limitatore.acquisisci()
+        limitatore.rilascia(successo=True)
+    assert limitatore.limite == 3
+
+
+def test_token_bucket_si_ricarica_fino_alla_raffica(orologio):
+    limitatore = LimitatoreAdattivo(richieste_al_secondo=10, raffica=2, concorrenza_iniziale=10)
+    limitatore.acquisisci()
+    limitatore.acquisisci()
+    # Il prossimo gettone arriva tra 0.1 s: oltre il timeout si rinuncia subito
+    with pytest.raises(PermessoNonDisponibile):
+        limitatore.acquisisci(timeout=0.05)
+
+    orologio.adesso += 0.1
+    limitatore.acquisisci(timeout=0.05)
+
+    # Dopo una lunga pausa i gettoni non superano la raffica
+    orologio.adesso += 60
+    limitatore.acquisisci(timeout=0.05)
+    limitatore.acquisisci(timeout=0.05)
+    with pytest.raises(PermessoNonDisponibile):
+        limitatore.acquisisci(timeout=0.05)
+
+
+def test_sospensione_piu_lunga_del_timeout(orologio):
+    limitatore = LimitatoreAdattivo()
+    limitatore.acquisisci()
+    limitatore.rilascia(sovraccarico=True, pausa=30)
+    assert limitatore.statistiche()["pausa_residua"] == 30
+    with pytest.raises(PermessoNonDisponibile):
+        limitatore.acquisisci(timeout=5)
+    with pytest.raises(PermessoNonDisponibile):
+        asyncio.run(limitatore.acquisisci_async(timeout=5))
+    orologio.adesso += 30
+    limitatore.acquisisci(timeout=5)
+
+
+def test_posto_liberato_sveglia_chi_attende():
+    limitatore = LimitatoreAdattivo(concorrenza_iniziale=1, concorrenza_massima=1)
+    limitatore.acquisisci()
+    with pytest.raises(PermessoNonDisponibile):
+        limitatore.acquisisci(timeout=0.05)
+
+    acquisito = threading.Event()
+    attesa = threading.Thread(target=lambda: (limitatore.acquisisci(timeout=5), acquisito.set()))
+    attesa.start()
+    assert not acquisito.wait(0.05)
+    limitatore.rilascia()
+    assert acquisito.wait(5)
+    attesa.join(5)
+    assert limitatore.statistiche()["in_corso"] == 1
+
+
+def test_timeout_esaurito():
+    limitatore = LimitatoreAdattivo()
+    with pytest.raises(PermessoNonDisponibile):
+        limitatore.acquisisci(timeout=0)
+    assert limitatore.in_corso == 0
@@ -0,0 +1,36 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metriche
+from metriche import cronometro, raccogli_tempi
+
+
+def test_tempi_sommati_da_piu_thread(monkeypatch):
+    # Ogni misura dura esattamente un secondo fittizio, in ogni thread
+    locale = threading.local()
+
+    def orologio():
+        locale.istante = getattr(locale, "istante", 0.0) + 1.0
+        return locale.istante
+
+    monkeypatch.setattr(metriche.time, "perf_counter", orologio)
+
+    def fase():
+        for _ in range(500):
+            with cronometro("test_parallelo"):
+                pass
+
+    with raccogli_tempi() as tempi:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, fase) for _ in range(8)]
+            for future in futures:
+                future.result()
+    assert tempi == {"test_parallelo": 8 * 500}
+
+
+def test_nessuna_raccolta_se_disattivata():
+    with raccogli_tempi(attivo=False) as tempi:
+        with cronometro("test_disattivato"):
+            pass
+    assert tempi is None
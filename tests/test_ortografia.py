@@ -0,0 +1,42 @@
+import html
+import inspect
+
+import pytest
+
+from prompt_perfezionatore import (
+    LINGUA_ORTOGRAFIA, ContestoAnalisi, GrammarChecker, codice_dizionario, get_motore_ortografico, verifica_ortografia,
+    warmup
+)
+
+
+def _parole(testo):
+    return [parola for parola, _ in ContestoAnalisi.da(testo).parole_con_offset]
+
+
+@pytest.mark.parametrize("sanitizza", [False, True], ids=["testo", "sanitizzato"])
+def test_frammenti_con_apostrofo_esclusi(sanitizza):
+    testo = "Dell'acqua, l'albero e un' altra, un po' di più: quest' anno 'sto libro. E' vero"
+    if sanitizza:
+        testo = html.escape(testo)
+    assert _parole(testo) == ["acqua", "albero", "e", "altra", "un", "di", "più", "anno", "libro", "vero"]
+
+
+def test_offset_nel_testo_sanitizzato():
+    testo = html.escape("Scrivi dell'acqua fresca")
+    for parola, offset in ContestoAnalisi.da(testo).parole_con_offset:
+        assert testo[offset:offset + len(parola)] == parola
+
+
+def test_token_alfanumerici_ed_entita_ignorati():
+    assert _parole(html.escape('Modello x2 in 3D & "città"')) == ["Modello", "in", "città"]
+
+
+def test_codice_dizionario_senza_regione():
+    assert [codice_dizionario(lingua) for lingua in ("it_IT", "it-IT", " IT ", "it")] == ["it"] * 4
+    assert get_motore_ortografico("it_IT") is get_motore_ortografico("it")
+
+
+def test_stessa_lingua_per_preriscaldamento_e_richieste():
+    # Il preriscaldamento deve caricare il motore usato dalla prima richiesta reale
+    for funzione in (warmup, verifica_ortografia, GrammarChecker.verifica_testo):
+        assert inspect.signature(funzione).parameters["lingua"].default == LINGUA_ORTOGRAFIA
@@ -0,0 +1,66 @@
+import pytest
+import spacy
+
+import prompt_perfezionatore
+from prompt_perfezionatore import PromptPerfezionatore, componenti_esclusi, imposta_nlp, settings, verifica_profilo
+
+PROMPT = "Prepara l'itinerario di un viaggio a Milano per la prossima settimana."
+
+
+@pytest.fixture
+def nlp_con_entita(nlp_vuoto):
+    """Pipeline vuota con un riconoscitore di entità a regole al posto del NER addestrato."""
+    # nlp_vuoto ripristina il modello condiviso alla fine del test
+    modello = spacy.blank("it")
+    modello.add_pipe("entity_ruler", name="ner").add_patterns([{"label": "LOC", "pattern": "Milano"}])
+    imposta_nlp(modello)
+    return prompt_perfezionatore._nlp
+
+
+@pytest.fixture
+def perfezionatore(monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", "memoria")
+    perfezionatore = PromptPerfezionatore()
+    yield perfezionatore
+    perfezionatore.chiudi()
+
+
+def test_componenti_esclusi(nlp_con_entita):
+    assert nlp_con_entita.pipe_names == ["ner", "sentencizer"]
+    assert componenti_esclusi(nlp_con_entita, "fast") == ["ner"]
+    assert componenti_esclusi(nlp_con_entita, "full") == []
+
+
+def test_profilo_fast_senza_output_dei_componenti_esclusi(nlp_con_entita, perfezionatore):
+    completa = perfezionatore.analizza_prompt(PROMPT, profilo="full")
+    veloce = perfezionatore.analizza_prompt(PROMPT, profilo="fast")
+
+    assert completa["profilo"] == "full" and completa["entita_rilevate"] == [("Milano", "LOC")]
+    assert veloce["profilo"] == "fast" and veloce["entita_rilevate"] == []
+    # Le frasi vengono comunque dal componente veloce
+    assert veloce["lunghezza_frasi"] == completa["lunghezza_frasi"] == 1
+
+    in_blocco = list(perfezionatore.analizza_prompts([PROMPT, PROMPT], profilo="fast", n_process=1))
+    assert all(analisi["entita_rilevate"] == [] for analisi in in_blocco)
+
+
+def test_profilo_sconosciuto(nlp_con_entita, perfezionatore):
+    assert verifica_profilo("fast") == "fast"
+    with pytest.raises(ValueError, match="veloce"):
+        verifica_profilo("veloce")
+    with pytest.raises(ValueError):
+        componenti_esclusi(nlp_con_entita, "veloce")
+    with pytest.raises(ValueError):
+        perfezionatore.analizza_prompt(PROMPT, profilo="veloce")
+    with pytest.raises(ValueError):
+        next(perfezionatore.analizza_prompts([PROMPT], profilo="veloce"))
+
+
+def test_profilo_nella_chiave_di_cache(perfezionatore, monkeypatch):
+    monkeypatch.setattr(settings, "analysis_profile", "full")
+    completa = perfezionatore._get_cache_key(PROMPT)
+    monkeypatch.setattr(settings, "analysis_profile", "fast")
+    veloce = perfezionatore._get_cache_key(PROMPT)
+
+    assert completa != veloce
+    assert perfezionatore._get_cache_key(PROMPT) == veloce
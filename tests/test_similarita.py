@@ -0,0 +1,116 @@
+import pytest
+
+from benchmarks.stub_deepseek import RISPOSTA_PREDEFINITA, StubDeepSeek
+from prompt_perfezionatore import PromptPerfezionatore, RisultatoErrore, settings
+from similarita import IndiceSimilarita, firma_minhash, normalizza_testo, similarita_firme
+
+PROMPT = ("Scrivi una email formale al cliente per comunicare il ritardo della consegna, "
+          "scusandoti per il disagio e proponendo uno sconto sul prossimo ordine.")
+# Una parola cambiata su ventidue
+PROMPT_SIMILE = PROMPT.replace("formale", "cortese")
+PROMPT_DIVERSO = "Riassumi in tre punti l'articolo allegato sulla politica monetaria europea."
+
+
+def _firma(testo):
+    return firma_minhash(normalizza_testo(testo))
+
+
+def test_normalizzazione():
+    assert normalizza_testo("  Scrivi   UNA email,\nper favore!  ") == "scrivi una email per favore"
+    assert normalizza_testo("l&#x27;ordine &amp; la consegna") == normalizza_testo("L'ordine & la consegna")
+    assert firma_minhash(normalizza_testo("?! ...")) is None
+
+
+def test_similarita_firme():
+    assert similarita_firme(_firma(PROMPT), _firma(PROMPT.upper() + "!!")) == 1
+    assert similarita_firme(_firma(PROMPT), _firma(PROMPT_SIMILE)) > 0.7
+    assert similarita_firme(_firma(PROMPT), _firma(PROMPT_DIVERSO)) < 0.2
+
+
+def test_indice_trova_solo_i_quasi_duplicati():
+    indice = IndiceSimilarita(soglia=0.7, max_voci=10)
+    indice.aggiungi("originale", _firma(PROMPT))
+    indice.aggiungi("altro", _firma(PROMPT_DIVERSO))
+
+    trovato = indice.cerca(_firma(PROMPT_SIMILE))
+    assert trovato is not None and trovato.chiave == "originale"
+    assert trovato.similarita >= 0.7
+    assert indice.cerca(_firma(PROMPT_SIMILE), escluse=("originale",)) is None
+    assert indice.cerca(_firma("Elenca i capoluoghi di regione italiani in ordine alfabetico.")) is None
+
+
+def test_indice_scarta_le_voci_meno_recenti():
+    indice = IndiceSimilarita(soglia=0.7, max_voci=1)
+    indice.aggiungi("originale", _firma(PROMPT))
+    indice.aggiungi("altro", _firma(PROMPT_DIVERSO))
+
+    assert len(indice) == 1
+    assert indice.cerca(_firma(PROMPT_SIMILE)) is None
+    indice.rimuovi("altro")
+    assert len(indice) == 0
+
+
+@pytest.fixture
+def chiamate(monkeypatch, nlp_vuoto):
+    """Avvia lo stub e registra i messaggi utente inviati a DeepSeek."""
+    messaggi = []
+    originale = PromptPerfezionatore._chiama_api_deepseek
+
+    def registra(self, system_prompt, user_message):
+        messaggi.append(user_message)
+        return originale(self, system_prompt, user_message)
+
+    with StubDeepSeek() as stub:
+        monkeypatch.setattr(settings, "deepseek_api_url", stub.url)
+        monkeypatch.setattr(settings, "deepseek_api_key", "chiave-di-test")
+        monkeypatch.setattr(settings, "cache_backend", "memoria")
+        monkeypatch.setattr(PromptPerfezionatore, "_chiama_api_deepseek", registra)
+        yield messaggi
+
+
+def test_soglia_zero_lascia_invariata_la_cache_esatta(chiamate, monkeypatch):
+    monkeypatch.setattr(settings, "near_duplicate_threshold", 0)
+    perfezionatore = PromptPerfezionatore()
+
+    risultati = [perfezionatore.migliora_e_analizza(prompt) for prompt in (PROMPT, PROMPT, PROMPT_SIMILE)]
+
+    assert perfezionatore._indice_simili is None
+    # Il prompt ripetuto viene dalla cache, quello simile va comunque a DeepSeek
+    assert len(chiamate) == 2
+    assert all("quasi identico" not in messaggio for messaggio in chiamate)
+    for risultato in risultati:
+        assert not isinstance(risultato, RisultatoErrore)
+        assert "quasi_duplicato" not in risultato.analisi
+
+
+def test_modalita_semina(chiamate, monkeypatch):
+    monkeypatch.setattr(settings, "near_duplicate_threshold", 0.7)
+    monkeypatch.setattr(settings, "near_duplicate_mode", "semina")
+    perfezionatore = PromptPerfezionatore()
+
+    perfezionatore.migliora_e_analizza(PROMPT)
+    perfezionatore.migliora_e_analizza(PROMPT)
+    perfezionatore.migliora_e_analizza(PROMPT_SIMILE)
+    perfezionatore.migliora_e_analizza(PROMPT_DIVERSO)
+
+    # La cache esatta risponde ancora al prompt ripetuto; il simile riceve il riferimento, il diverso no
+    assert len(chiamate) == 3
+    assert "quasi identico" not in chiamate[0]
+    assert "quasi identico" in chiamate[1] and RISPOSTA_PREDEFINITA["prompt_migliorato"] in chiamate[1]
+    assert "quasi identico" not in chiamate[2]
+    assert len(perfezionatore._indice_simili) == 3
+
+
+def test_modalita_riusa(chiamate, monkeypatch):
+    monkeypatch.setattr(settings, "near_duplicate_threshold", 0.7)
+    monkeypatch.setattr(settings, "near_duplicate_mode", "riusa")
+    perfezionatore = PromptPerfezionatore()
+
+    perfezionatore.migliora_e_analizza(PROMPT)
+    riusato = perfezionatore.migliora_e_analizza(PROMPT_SIMILE)
+
+    assert len(chiamate) == 1
+    assert riusato.prompt_migliorato == RISPOSTA_PREDEFINITA["prompt_migliorato"]
+    assert riusato.analisi["quasi_duplicato"]["similarita"] >= 0.7
+    # Il risultato riusato non viene salvato con la chiave del prompt simile
+    assert perfezionatore.cerca_in_cache(PROMPT_SIMILE) is None
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+import requests
+
+from benchmarks.stub_deepseek import RISPOSTA_PREDEFINITA, StubDeepSeek
+from prompt_perfezionatore import EstrattoreCampoJSON, estrai_delta_sse
+
+
+def _estrai_a_frammenti(documento, dimensione, campo="prompt_migliorato"):
+    estrattore = EstrattoreCampoJSON(campo)
+    decodificati = [estrattore.aggiungi(documento[i:i + dimensione]) for i in range(0, len(documento), dimensione)]
+    return estrattore, "".join(decodificati)
+
+
+@pytest.mark.parametrize("dimensione", [1, 2, 5, 1000])
+def test_estrattore_decodifica_escape_e_unicode_a_ogni_taglio(dimensione):
+    valore = 'Riga "citata"\n\tcon \\ barra, città, 😀 e   fine'
+    documento = json.dumps({"altro": "x", "prompt_migliorato": valore, "suggerimenti": []})
+    estrattore, decodificati = _estrai_a_frammenti(documento, dimensione)
+    assert estrattore.completo
+    assert estrattore.valore == decodificati == valore
+    assert estrattore.testo == documento
+
+
+def test_estrattore_senza_ascii_escape():
+    valore = "Più chiaro, per favore: ☕"
+    documento = json.dumps({"prompt_migliorato": valore}, ensure_ascii=False)
+    estrattore, _ = _estrai_a_frammenti(documento, 3)
+    assert estrattore.valore == valore
+
+
+def test_estrattore_ignora_il_resto_dopo_il_valore():
+    estrattore = EstrattoreCampoJSON("prompt_migliorato")
+    assert estrattore.aggiungi('{"prompt_migliorato": "ab') == "ab"
+    assert estrattore.aggiungi('c", "spiegazione": "d"}') == "c"
+    assert estrattore.completo
+    assert estrattore.aggiungi("ignorato") == ""
+    assert estrattore.valore == "abc"
+
+
+def test_estrai_delta_sse_righe_senza_contenuto():
+    assert estrai_delta_sse("") is None
+    assert estrai_delta_sse(": commento") is None
+    assert estrai_delta_sse("data: [DONE]") is None
+    assert estrai_delta_sse('data: {"choices": [{"delta": {}}]}') is None
+    assert estrai_delta_sse('data: {"choices": [{"delta": {"content": "ciao"}}]}') == "ciao"
+
+
+@pytest.mark.parametrize("dimensione_frammento", [1, 4, 17])
+def test_flusso_dello_stub(dimensione_frammento):
+    with StubDeepSeek(dimensione_frammento=dimensione_frammento) as stub:
+        risposta = requests.post(stub.url, json={"stream": True}, stream=True, timeout=5)
+        estrattore = EstrattoreCampoJSON("prompt_migliorato")
+        for riga in risposta.iter_lines(decode_unicode=True):
+            frammento = estrai_delta_sse(riga)
+            if frammento is not None:
+                estrattore.aggiungi(frammento)
+        risposta.close()
+    assert estrattore.completo
+    assert estrattore.valore == RISPOSTA_PREDEFINITA["prompt_migliorato"]
+    assert json.loads(estrattore.testo) == RISPOSTA_PREDEFINITA
@@ -0,0 +1,65 @@
+import html
+
+from struttura import SezioneCodice, analizza_struttura, dividi_in_sezioni
+
+
+def _paragrafi(numero, parole=30):
+    return "\n\n".join(f"Paragrafo {i}: " + "testo di prova " * parole for i in range(numero))
+
+
+def test_dividi_in_sezioni_ricompone_il_testo():
+    testo = "# Introduzione\n\n" + _paragrafi(6) + "\n\n## Dettagli\n\n- primo punto\n- secondo punto\n\n" + _paragrafi(4)
+    sezioni = dividi_in_sezioni(testo, 600)
+    assert len(sezioni) > 1
+    assert "".join(sezioni) == testo
+    assert all(len(sezione) <= 600 for sezione in sezioni)
+
+
+def test_blocco_di_codice_troppo_lungo_resta_intero():
+    codice = "```python\n" + "".join(f"valore_{i} = {i}\n" for i in range(200)) + "```\n"
+    testo = _paragrafi(2) + "\n\n" + codice + "\n" + _paragrafi(2)
+    sezioni = dividi_in_sezioni(testo, 500)
+    assert "".join(sezioni) == testo
+    blocchi = [sezione for sezione in sezioni if isinstance(sezione, SezioneCodice)]
+    assert blocchi == [codice]
+    for sezione in sezioni:
+        if not isinstance(sezione, SezioneCodice):
+            assert "```" not in sezione
+            assert len(sezione) <= 500
+
+
+def test_blocco_di_codice_breve_non_viene_spezzato():
+    codice = "```\nprint('ciao')\nprint('mondo')\n```\n"
+    testo = "Introduzione senza righe vuote\n" + codice + "testo di prova " * 60
+    sezioni = dividi_in_sezioni(testo, 300)
+    assert "".join(sezioni) == testo
+    assert any(codice in sezione for sezione in sezioni)
+    assert not any(isinstance(sezione, SezioneCodice) for sezione in sezioni)
+
+
+def test_righe_lunghe_non_spezzano_le_entita_html():
+    testo = html.escape('Usa "virgolette" & <tag> ' * 80)
+    sezioni = dividi_in_sezioni(testo, 97)
+    assert "".join(sezioni) == testo
+    for sezione in sezioni:
+        assert html.escape(html.unescape(sezione)) == sezione
+
+
+def test_struttura_passata_uguale_a_quella_calcolata():
+    testo = "# Titolo\n\n" + _paragrafi(5)
+    assert dividi_in_sezioni(testo, 400, analizza_struttura(testo)) == dividi_in_sezioni(testo, 400)
+
+
+def test_riga_con_marcatore_isolata_non_e_un_elenco():
+    struttura = analizza_struttura("Rispondi così:\na) solo questa opzione\nPoi continua il testo.\nE. Fermi lo disse.")
+    assert struttura["conteggi"]["voci_numerate"] == 0
+    assert not struttura["ha_numerazione"]
+    assert struttura["profondita_elenchi"] == 0
+
+
+def test_elenchi_di_almeno_due_voci():
+    testo = "Opzioni:\na) prima\nb) seconda\n\nPassi:\n- uno\n  - dettaglio\n\n- due\n\n# Altro\n- sola voce\n"
+    struttura = analizza_struttura(testo)
+    assert struttura["conteggi"]["voci_numerate"] == 2
+    assert struttura["conteggi"]["voci_elenco"] == 3
+    assert struttura["profondita_elenchi"] == 2
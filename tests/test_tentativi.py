@@ -0,0 +1,117 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import requests
+
+import prompt_perfezionatore
+from benchmarks.stub_deepseek import StubDeepSeek
+from prompt_perfezionatore import (
+    TENTATIVI_DEEPSEEK, AttesaRetryAfter, PromptPerfezionatore, errore_ritentabile, secondi_retry_after, settings
+)
+
+
+def _errore_requests(stato, headers=None):
+    risposta = requests.Response()
+    risposta.status_code = stato
+    risposta.headers.update(headers or {})
+    return requests.exceptions.HTTPError(f"HTTP {stato}", response=risposta)
+
+
+def _errore_httpx(stato):
+    richiesta = httpx.Request("POST", "http://deepseek.invalid/v1/chat/completions")
+    return httpx.HTTPStatusError(f"HTTP {stato}", request=richiesta, response=httpx.Response(stato, request=richiesta))
+
+
+def test_retry_after_in_secondi():
+    assert secondi_retry_after({"Retry-After": "7"}) == 7
+    assert secondi_retry_after({"Retry-After": "1.5"}) == 1.5
+    assert secondi_retry_after({"Retry-After": "-3"}) == 0
+
+
+def test_retry_after_come_data_http():
+    tra_trenta_secondi = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= secondi_retry_after({"Retry-After": tra_trenta_secondi}) <= 30
+    passata = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert secondi_retry_after({"Retry-After": passata}) == 0
+
+
+@pytest.mark.parametrize("valore", ["", "domani", "Mon, 99 Foo 2024"])
+def test_retry_after_non_valido(valore):
+    assert secondi_retry_after({"Retry-After": valore}) is None
+    assert secondi_retry_after({}) is None
+
+
+@pytest.mark.parametrize("stato", [400, 401, 403, 404, 422])
+def test_errori_client_definitivi(stato):
+    assert not errore_ritentabile(_errore_requests(stato))
+    assert not errore_ritentabile(_errore_httpx(stato))
+
+
+@pytest.mark.parametrize("stato", [408, 429, 500, 502, 503, 504])
+def test_errori_ritentabili(stato):
+    assert errore_ritentabile(_errore_requests(stato))
+    assert errore_ritentabile(_errore_httpx(stato))
+
+
+def test_errori_di_rete_e_configurazione():
+    assert errore_ritentabile(requests.exceptions.ConnectionError())
+    assert errore_ritentabile(requests.exceptions.ReadTimeout())
+    assert errore_ritentabile(httpx.ConnectTimeout("timeout"))
+    assert not errore_ritentabile(httpx.UnsupportedProtocol("ftp"))
+    assert not errore_ritentabile(ValueError("JSON non valido"))
+
+
+def test_attesa_limitata_dalla_scadenza():
+    attesa = AttesaRetryAfter()
+    stato = SimpleNamespace(outcome=SimpleNamespace(exception=lambda: _errore_requests(429, {"Retry-After": "30"})))
+    token = prompt_perfezionatore._scadenza_deepseek.set(time.monotonic() + 2)
+    try:
+        assert 1.5 < attesa(stato) <= 2
+    finally:
+        prompt_perfezionatore._scadenza_deepseek.reset(token)
+
+
+@pytest.fixture
+def stub_sovraccarico(monkeypatch):
+    # Ogni risposta è un 429 con Retry-After: 0; la latenza limita i tentativi possibili entro la scadenza
+    with StubDeepSeek(latenza=0.05, tasso_errori=1.0, stato_errore=429) as stub:
+        monkeypatch.setattr(settings, "deepseek_api_url", stub.url)
+        monkeypatch.setattr(settings, "deepseek_api_key", "chiave-di-test")
+        monkeypatch.setattr(settings, "deepseek_deadline", 0.5)
+        monkeypatch.setattr(settings, "max_retry_attempts", 1000)
+        # Limitatore nuovo: i 429 dimezzano la concorrenza di quello condiviso
+        monkeypatch.setattr(prompt_perfezionatore, "_limitatore_deepseek", None)
+        yield
+
+
+def test_scadenza_interrompe_i_tentativi(stub_sovraccarico):
+    perfezionatore = PromptPerfezionatore()
+    tentativi_iniziali = TENTATIVI_DEEPSEEK.valore()
+    inizio = time.monotonic()
+    # L'ultimo tentativo può finire in timeout di lettura: la scadenza riduce anche quello
+    with pytest.raises((requests.exceptions.HTTPError, requests.exceptions.Timeout)):
+        perfezionatore._chiama_api_deepseek("sistema", "messaggio")
+    durata = time.monotonic() - inizio
+
+    assert durata < 1.5
+    assert 1 <= TENTATIVI_DEEPSEEK.valore() - tentativi_iniziali < 20
+
+
+def test_scadenza_interrompe_i_tentativi_async(stub_sovraccarico):
+    perfezionatore = PromptPerfezionatore()
+
+    async def chiama():
+        try:
+            return await perfezionatore._chiama_api_deepseek_async("sistema", "messaggio")
+        finally:
+            await perfezionatore.chiudi_async()
+
+    inizio = time.monotonic()
+    with pytest.raises((httpx.HTTPStatusError, httpx.TimeoutException)):
+        asyncio.run(chiama())
+    assert time.monotonic() - inizio < 1.5